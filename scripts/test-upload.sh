@@ -51,8 +51,10 @@ RESPONSE=$(curl -sSf -X POST "http://localhost:${PORT}/upload_file" \
 echo "Response: $RESPONSE"
 
 DETAIL=$(echo "$RESPONSE" | jq -r '.detail // empty' 2>/dev/null || true)
+STATUS=$(echo "$RESPONSE" | jq -r '.status // empty' 2>/dev/null || true)
 
-if [[ "$DETAIL" == "File uploaded successfully." ]]; then
+# Re-uploading identical bytes is a success too, reported as "unchanged"
+if [[ "$DETAIL" == "File uploaded successfully." || "$STATUS" == "unchanged" ]]; then
   echo "Upload passed."
   # Optional verification on host filesystem if LOCAL_DATABASES_DIR is provided
   if [[ -n "${LOCAL_DATABASES_DIR:-}" ]]; then
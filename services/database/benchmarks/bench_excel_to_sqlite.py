@@ -0,0 +1,86 @@
+"""
+Benchmark the pandas excel_to_sqlite path against the streaming loader.
+
+Run from services/database:
+    uv run python benchmarks/bench_excel_to_sqlite.py --sheets 4 --rows 50000
+"""
+
+import argparse
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from openpyxl import Workbook
+
+from database_pkg.excel_to_sqlite import excel_to_sqlite, excel_to_sqlite_streaming
+
+
+def build_workbook(path: Path, n_sheets: int, n_rows: int) -> None:
+    # Not write_only: that mode writes inline strings and no sheet dimensions,
+    # unlike Excel, and openpyxl is much slower to read such files back
+    workbook = Workbook()
+    workbook.remove(workbook.active)
+    start = datetime(2020, 1, 1)
+    for s in range(n_sheets):
+        sheet = workbook.create_sheet(f"Sheet {s}")
+        sheet.append(["Date", "Description", "Amount", "Currency", "QUI"])
+        for i in range(n_rows):
+            sheet.append(
+                [
+                    start + timedelta(minutes=i),
+                    f"Merchant {i % 500}",
+                    -i / 100,
+                    "EUR",
+                    "N",
+                ]
+            )
+    workbook.save(path)
+
+
+def timed(fn, *args, **kwargs) -> tuple[float, int]:
+    """Elapsed seconds and peak RSS in MiB of `fn`, run in a fresh process."""
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    # VmHWM, unlike ru_maxrss, is not inherited from the parent process (Linux)
+    with open("/proc/self/status") as f:
+        line = next(line for line in f if line.startswith("VmHWM:"))
+    return elapsed, int(line.split()[1]) // 1024
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sheets", type=int, default=4)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        excel_path = Path(tmp) / "legacy.xlsx"
+        build_workbook(excel_path, args.sheets, args.rows)
+        print(f"{args.sheets} sheets x {args.rows} rows")
+
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            elapsed, rss = pool.submit(
+                timed, excel_to_sqlite, excel_path, Path(tmp) / "pandas.db", ""
+            ).result()
+        print(f"pandas:    {elapsed:.2f}s, peak RSS {rss} MiB")
+
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            elapsed, rss = pool.submit(
+                timed,
+                excel_to_sqlite_streaming,
+                excel_path,
+                Path(tmp) / "streaming.db",
+                workers=args.workers,
+            ).result()
+        # With more than one worker, sheets are loaded in further processes
+        print(f"streaming: {elapsed:.2f}s, peak RSS {rss} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark /execute_sql result encodings against the original dict-per-row path.
+
+Run from services/database:
+    uv run python benchmarks/bench_result_formats.py --rows 100000
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import time
+
+from fastapi.encoders import jsonable_encoder
+
+from database_pkg.config.schemas import ResultFormatEnum, SQLQuery
+from database_pkg.queries import run_query
+
+QUERY = "SELECT * FROM transactions"
+
+
+def build_database(n_rows: int) -> sqlite3.Connection:
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute(
+        """
+        CREATE TABLE "transactions" (
+            "Type" TEXT, "Product" TEXT, "Started Date" TIMESTAMP,
+            "Completed Date" TIMESTAMP, "Description" TEXT, "Amount" REAL,
+            "Fee" REAL, "Currency" TEXT, "QUI" TEXT, "COMMENT" TEXT
+        )
+        """
+    )
+    rng = random.Random(0)
+    conn.executemany(
+        'INSERT INTO "transactions" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (
+            (
+                rng.choice(["CARD_PAYMENT", "TRANSFER", "TOPUP", "EXCHANGE"]),
+                "Current",
+                f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 10:00:00",
+                f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00",
+                f"Merchant {rng.randrange(500)}",
+                round(rng.uniform(-300, 300), 2),
+                0.0,
+                rng.choice(["EUR", "CAD", "USD"]),
+                rng.choice(["G", "N"]),
+                None,
+            )
+            for i in range(n_rows)
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+def dict_per_row(conn: sqlite3.Connection) -> bytes:
+    """The original path: list of dicts rendered by FastAPI's JSONResponse."""
+    cursor = conn.cursor()
+    cursor.execute(QUERY)
+    result = [dict(row) for row in cursor.fetchall()]
+    cursor.close()
+    return json.dumps(
+        jsonable_encoder({"result": result}),
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+def encoded(conn: sqlite3.Connection, result_format: ResultFormatEnum) -> bytes:
+    return run_query(conn, SQLQuery(query=QUERY, format=result_format)).body
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    conn = build_database(args.rows)
+    cases = {
+        "dict-per-row (original)": lambda: dict_per_row(conn),
+        "rows (orjson)": lambda: encoded(conn, ResultFormatEnum.ROWS),
+        "columns (orjson)": lambda: encoded(conn, ResultFormatEnum.COLUMNS),
+    }
+    try:
+        import pyarrow  # noqa: F401
+
+        cases["arrow IPC"] = lambda: encoded(conn, ResultFormatEnum.ARROW)
+    except ImportError:
+        print("pyarrow not installed, skipping the arrow format")
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'format':<26}{'seconds':>10}{'bytes':>14}")
+    for name, case in cases.items():
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            body = case()
+            timings.append(time.perf_counter() - start)
+        print(f"{name:<26}{min(timings):>10.3f}{len(body):>14,}")
+
+
+if __name__ == "__main__":
+    main()
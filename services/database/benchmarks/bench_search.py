@@ -0,0 +1,138 @@
+"""
+Benchmark /search's full-text index against LIKE scans of "Description".
+
+Run from services/database:
+    uv run python benchmarks/bench_search.py --rows 2000000
+"""
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from database_pkg.pool import connect
+from database_pkg.schema import (
+    TRANSACTION_COLUMNS,
+    ensure_search_index,
+    ensure_transactions_table,
+)
+from database_pkg.search import search_transactions
+
+# Searched merchants and how often they appear: one row in every N
+MERCHANTS = {
+    "Monoprix": 100,
+    "Uber Eats": 1_000,
+    "Picard Surgelés": 10_000,
+    "Leroy Merlin": 100_000,
+}
+
+# (search text, equivalent LIKE pattern)
+SEARCHES = [
+    ("monoprix", "%monoprix%"),
+    ("uber eats", "%uber eats%"),
+    ("picard", "%picard%"),
+    ("merl", "%merl%"),
+]
+
+
+def description(i: int, rng: random.Random) -> str:
+    for merchant, every in sorted(MERCHANTS.items(), key=lambda m: -m[1]):
+        if i % every == every - 1:
+            return f"{merchant} {rng.randrange(100_000)}"
+    return f"Merchant {rng.randrange(100_000)} ref {i}"
+
+
+def build_database(path: Path, n_rows: int) -> sqlite3.Connection:
+    conn = connect(path)
+    conn.execute("BEGIN")
+    conn.execute(
+        f'CREATE TABLE "transactions" ({", ".join(f'"{c}"' for c in TRANSACTION_COLUMNS)})'
+    )
+    rng = random.Random(0)
+    conn.executemany(
+        f'INSERT INTO "transactions" VALUES ({", ".join("?" * len(TRANSACTION_COLUMNS))})',
+        (
+            (
+                "CARD_PAYMENT",
+                "Current",
+                f"{2015 + i % 10}-{i % 12 + 1:02d}-{i % 28 + 1:02d} 10:00:00",
+                f"{2015 + i % 10}-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00",
+                description(i, rng),
+                round(rng.uniform(-300, 300), 2),
+                0.0,
+                "EUR",
+                rng.choice(["G", "N"]),
+                None,
+                "raw/bench.csv",
+            )
+            for i in range(n_rows)
+        ),
+    )
+    conn.commit()
+    return conn
+
+
+def like(conn: sqlite3.Connection, pattern: str, limit: int) -> list:
+    return conn.execute(
+        'SELECT "rowid" AS "id", * FROM "transactions" '
+        'WHERE "Description" LIKE ? OR "COMMENT" LIKE ? LIMIT ?',
+        (pattern, pattern, limit),
+    ).fetchall()
+
+
+def best_of(repeat: int, fn) -> tuple[float, object]:
+    timings, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2_000_000)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        conn = build_database(Path(directory) / "bench.db", args.rows)
+        print(f"{args.rows} rows loaded in {time.perf_counter() - start:.1f}s")
+        start = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        ensure_transactions_table(conn)
+        ensure_search_index(conn)
+        conn.commit()
+        print(f"Full-text index built in {time.perf_counter() - start:.1f}s")
+
+        print(
+            f"\nBest of {args.repeat}: first page of {args.limit} rows, then all rows"
+        )
+        print(
+            f"{'search':<12}{'matches':>9}{'LIKE page':>11}{'FTS5 page':>11}"
+            f"{'LIKE all':>10}{'FTS5 all':>10}{'speedup':>9}"
+        )
+        for text, pattern in SEARCHES:
+            like_page, _ = best_of(args.repeat, lambda: like(conn, pattern, args.limit))
+            fts_page, _ = best_of(
+                args.repeat, lambda: search_transactions(conn, text, limit=args.limit)
+            )
+            # Ranked results need every match, and LIKE then scans every row
+            like_all, _ = best_of(args.repeat, lambda: like(conn, pattern, -1))
+            fts_all, result = best_of(
+                args.repeat,
+                lambda: search_transactions(conn, text, limit=args.rows),
+            )
+            print(
+                f"{text:<12}{len(result['rows']):>9}{like_page:>11.4f}{fts_page:>11.4f}"
+                f"{like_all:>10.4f}{fts_all:>10.4f}{like_all / fts_all:>8.0f}x"
+            )
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
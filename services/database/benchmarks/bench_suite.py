@@ -0,0 +1,384 @@
+"""
+Benchmark the query, upload and ingest paths of the service on synthetic data.
+
+Queries, uploads and ingestions go through the app's HTTP routes in process
+(FastAPI's TestClient), so the timings include routing, validation and
+serialization but no network. Results can be saved as JSON and compared with
+a previous run, failing when a path got slower than the threshold allows.
+
+Run from services/database:
+    uv run python benchmarks/bench_suite.py --rows 1000000 --output results.json
+    uv run python benchmarks/bench_suite.py --rows 1000000 --compare results.json
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import logging
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable
+
+from fastapi.testclient import TestClient
+
+from datagen import build_transactions_db, legacy_workbook, write_statement
+from database_pkg.app import app
+from database_pkg.config.schemas import AppEnvEnum, BankEnum
+from database_pkg.config.settings import database_settings
+from database_pkg.excel_to_sqlite import excel_to_sqlite, excel_to_sqlite_streaming
+from database_pkg.slow_log import percentile
+
+MIN_ROWS, MAX_ROWS = 10_000, 10_000_000
+
+# Statements uploaded and ingested by the benchmark, in years the
+# generated transactions do not cover
+INGEST_YEAR = 2000
+UPLOAD_YEAR = 2001
+
+POINT_QUERY = 'SELECT "rowid" AS "id", * FROM "transactions" WHERE "rowid" = ?'
+RANGE_QUERY = (
+    'SELECT * FROM "transactions" '
+    'WHERE "Completed Date" >= ? AND "Completed Date" < ?'
+)
+AGGREGATE_QUERY = (
+    'SELECT "QUI", "Currency", count(*) AS "count", sum("Amount") AS "total" '
+    'FROM "transactions" WHERE "Completed Date" >= ? AND "Completed Date" < ? '
+    'GROUP BY "QUI", "Currency"'
+)
+
+
+def rows_in_range(value: str) -> int:
+    rows = int(value)
+    if not MIN_ROWS <= rows <= MAX_ROWS:
+        raise argparse.ArgumentTypeError(
+            f"must be between {MIN_ROWS} and {MAX_ROWS}, got {rows}"
+        )
+    return rows
+
+
+def measure(
+    repeat: int, fn: Callable[[int], Any], units: float = 0, unit: str = ""
+) -> dict[str, Any]:
+    """
+    Time `repeat` calls of fn(i), after one untimed warm-up call. `units`
+    processed per call (rows, bytes) are reported per second at the median.
+    """
+    fn(-1)
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    median = statistics.median(timings)
+    result = {
+        "runs": repeat,
+        "min": timings[0],
+        "median": median,
+        "p95": percentile(timings, 95),
+        "ops_per_sec": 1 / median,
+    }
+    if units:
+        result[f"{unit}_per_sec"] = units / median
+    return result
+
+
+def prepare_data(data_dir: Path, rows: int, statement_rows: int, seed: int) -> None:
+    """Generate the database and statements, reusing those of an earlier run."""
+    marker = data_dir / "datagen.json"
+    wanted = {"rows": rows, "statement_rows": statement_rows, "seed": seed}
+    if marker.exists() and json.loads(marker.read_text()) == wanted:
+        print(f"Reusing the data in {data_dir}")
+    else:
+        for stale in ("SQL", "statements"):
+            shutil.rmtree(data_dir / stale, ignore_errors=True)
+        start = time.perf_counter()
+        build_transactions_db(data_dir / "SQL" / "dev.db", rows, seed)
+        print(f"{rows} transactions generated in {time.perf_counter() - start:.1f}s")
+        for bank in BankEnum:
+            for ext in ("csv", "xlsx"):
+                write_statement(
+                    data_dir / "statements" / f"{bank.value}.{ext}",
+                    bank,
+                    statement_rows,
+                    INGEST_YEAR,
+                    1,
+                    seed,
+                )
+        legacy_workbook(data_dir / "statements" / "legacy.xlsx", statement_rows, seed)
+        marker.write_text(json.dumps(wanted))
+    # Uploads of earlier runs would be found unchanged instead of written
+    shutil.rmtree(data_dir / "blob", ignore_errors=True)
+
+
+def query_scenarios(
+    client: TestClient, rows: int, repeat: int, rng: random.Random
+) -> dict[str, dict[str, Any]]:
+    def execute(query: str, params: list[Any]) -> int:
+        # Not cached, to time the query itself every time
+        response = client.post(
+            "/execute_sql", json={"query": query, "params": params, "cache": False}
+        )
+        response.raise_for_status()
+        return len(response.json()["result"])
+
+    def month(i: int) -> list[str]:
+        year, month = rng.randrange(2015, 2026), rng.randrange(1, 13)
+        end = f"{year + month // 12}-{month % 12 + 1:02d}-01"
+        return [f"{year}-{month:02d}-01", end]
+
+    def year(i: int) -> list[str]:
+        year = rng.randrange(2015, 2026)
+        return [f"{year}-01-01", f"{year + 1}-01-01"]
+
+    returned: list[int] = []
+
+    def range_query(i: int) -> None:
+        returned.append(execute(RANGE_QUERY, month(i)))
+
+    results = {
+        "query.point": measure(
+            repeat, lambda i: execute(POINT_QUERY, [rng.randrange(1, rows + 1)])
+        ),
+        "query.range": measure(repeat, range_query),
+        "query.aggregate": measure(repeat, lambda i: execute(AGGREGATE_QUERY, year(i))),
+    }
+    results["query.range"]["rows"] = statistics.median(returned)
+    return results
+
+
+def upload_scenarios(
+    client: TestClient, data_dir: Path, repeat: int
+) -> dict[str, dict[str, Any]]:
+    results = {}
+    banks = list(BankEnum)
+    for ext in ("csv", "xlsx"):
+        contents = {
+            bank: (data_dir / "statements" / f"{bank.value}.{ext}").read_bytes()
+            for bank in banks
+        }
+
+        def upload(i: int) -> None:
+            # A new statement every time: the warm-up one, then one per month
+            i += 1
+            bank = banks[i % len(banks)]
+            response = client.post(
+                "/upload_file",
+                data={
+                    "owner": "G",
+                    "year": UPLOAD_YEAR + i // 12,
+                    "month": i % 12 + 1,
+                    "bank": bank.value,
+                },
+                files={"file": (f"statement.{ext}", contents[bank])},
+            )
+            response.raise_for_status()
+
+        size = statistics.mean(len(content) for content in contents.values())
+        results[f"upload.{ext}"] = measure(repeat, upload, size, "bytes")
+    return results
+
+
+def ingest_scenarios(
+    client: TestClient, data_dir: Path, repeat: int, statement_rows: int
+) -> dict[str, dict[str, Any]]:
+    results = {}
+    banks = list(BankEnum)
+    # One month per format, each with a statement from every bank
+    for month, ext in enumerate(("csv", "xlsx"), start=1):
+        for bank in banks:
+            path = data_dir / "statements" / f"{bank.value}.{ext}"
+            response = client.post(
+                "/upload_file",
+                data={
+                    "owner": "N",
+                    "year": INGEST_YEAR,
+                    "month": month,
+                    "bank": bank.value,
+                    "overwrite": "true",
+                },
+                files={"file": (path.name, path.read_bytes())},
+            )
+            response.raise_for_status()
+
+        def ingest(i: int) -> None:
+            response = client.post(
+                "/ingest_file",
+                json={
+                    "owner": "N",
+                    "year": INGEST_YEAR,
+                    "month": month,
+                    "bank": banks[i % len(banks)].value,
+                    "force": True,
+                },
+            )
+            response.raise_for_status()
+            if response.json()["rows_inserted"] != statement_rows:
+                raise RuntimeError(f"Statement not fully ingested: {response.json()}")
+
+        results[f"ingest.{ext}"] = measure(repeat, ingest, statement_rows, "rows")
+    return results
+
+
+def excel_scenarios(
+    data_dir: Path, repeat: int, statement_rows: int
+) -> dict[str, dict[str, Any]]:
+    workbook = data_dir / "statements" / "legacy.xlsx"
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        loaders = {
+            "excel_to_sqlite.pandas": lambda db: excel_to_sqlite(
+                workbook, db, "transactions"
+            ),
+            "excel_to_sqlite.streaming": lambda db: excel_to_sqlite_streaming(
+                workbook, db
+            ),
+        }
+        # Both loaders print a line per sheet
+        with contextlib.redirect_stdout(io.StringIO()):
+            for name, load in loaders.items():
+                results[name] = measure(
+                    repeat,
+                    lambda i: load(Path(tmp) / f"{name}.{i}.db"),
+                    statement_rows,
+                    "rows",
+                )
+    return results
+
+
+def compare(
+    results: dict[str, Any], baseline: dict[str, Any], threshold: float
+) -> list[str]:
+    """Print each scenario's change from `baseline`, and return the regressions."""
+    if baseline["meta"]["rows"] != results["meta"]["rows"]:
+        print(
+            f"Warning: the baseline ran on {baseline['meta']['rows']} rows, "
+            f"this run on {results['meta']['rows']}"
+        )
+    print(f"\n{'scenario':<28}{'baseline':>10}{'median':>10}{'change':>9}")
+    regressions = []
+    for name, current in results["scenarios"].items():
+        before = baseline["scenarios"].get(name)
+        if before is None:
+            print(f"{name:<28}{'-':>10}{current['median']:>10.4f}{'new':>9}")
+            continue
+        change = current["median"] / before["median"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(
+            f"{name:<28}{before['median']:>10.4f}{current['median']:>10.4f}"
+            f"{change:>+9.0%}{flag}"
+        )
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--rows",
+        type=rows_in_range,
+        default=100_000,
+        help=f"Transactions generated, from {MIN_ROWS} to {MAX_ROWS}.",
+    )
+    parser.add_argument("--statement-rows", type=int, default=5_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--data-dir",
+        type=Path,
+        help="Keep the generated data here, to reuse it in later runs.",
+    )
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    parser.add_argument(
+        "--compare", type=Path, help="JSON results of a previous run to compare with."
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="Fail when a median is this much slower than in --compare (0.2: 20%%).",
+    )
+    args = parser.parse_args()
+    # Not a log line per request
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_dir = args.data_dir or Path(tmp)
+        data_dir.mkdir(parents=True, exist_ok=True)
+        prepare_data(data_dir, args.rows, args.statement_rows, args.seed)
+
+        # The app serves the generated data, with nothing but the queries
+        # themselves timed: no result cache, slow query log or budgets
+        database_settings.LOCAL_DATABASES_DIR = str(data_dir)
+        database_settings.app_env = AppEnvEnum.LOCAL
+        database_settings.job_workers = 0
+        database_settings.result_cache_max_bytes = 0
+        database_settings.slow_query_threshold = 0
+        database_settings.query_timeout = 0
+        database_settings.query_max_steps = 0
+        database_settings.query_max_rows = 0
+        database_settings.query_max_bytes = 0
+
+        rng = random.Random(args.seed)
+        scenarios: dict[str, dict[str, Any]] = {}
+        with TestClient(app) as client:
+            scenarios |= query_scenarios(client, args.rows, args.repeat, rng)
+            scenarios |= upload_scenarios(client, data_dir, args.repeat)
+            scenarios |= ingest_scenarios(
+                client, data_dir, args.repeat, args.statement_rows
+            )
+        # Loading a workbook takes seconds, not milliseconds
+        scenarios |= excel_scenarios(data_dir, min(args.repeat, 5), args.statement_rows)
+
+    results = {
+        "meta": {
+            "rows": args.rows,
+            "statement_rows": args.statement_rows,
+            "repeat": args.repeat,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        },
+        "scenarios": scenarios,
+    }
+    print(f"\n{args.rows} transactions, statements of {args.statement_rows} rows")
+    print(f"{'scenario':<28}{'median':>10}{'p95':>10}{'ops/s':>10}  throughput")
+    for name, result in scenarios.items():
+        throughput = ", ".join(
+            f"{value:,.0f} {key.removesuffix('_per_sec')}/s"
+            for key, value in result.items()
+            if key.endswith("_per_sec") and key != "ops_per_sec"
+        )
+        print(
+            f"{name:<28}{result['median']:>10.4f}{result['p95']:>10.4f}"
+            f"{result['ops_per_sec']:>10.1f}  {throughput}"
+        )
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+    if args.compare:
+        baseline = json.loads(args.compare.read_text())
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} scenario(s) over {args.threshold:.0%} slower: "
+                f"{', '.join(regressions)}"
+            )
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
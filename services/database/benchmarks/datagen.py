@@ -0,0 +1,242 @@
+"""
+Generate synthetic data for the benchmarks: a transactions database with the
+service's schema, and per-bank statements as each bank exports them.
+
+Run from services/database:
+    uv run python benchmarks/datagen.py --rows 1000000 --out /tmp/compta-bench
+"""
+
+import argparse
+import csv
+import random
+import time
+from datetime import datetime, timedelta
+from itertools import batched
+from pathlib import Path
+from typing import Any, Iterator
+
+from openpyxl import Workbook
+
+from database_pkg.config.schemas import BankEnum
+from database_pkg.ingest import BANK_FORMATS
+from database_pkg.pool import connect
+from database_pkg.schema import (
+    TRANSACTION_COLUMNS,
+    TRANSACTIONS_DDL,
+    ensure_transactions_table,
+)
+
+OWNERS = ("G", "N")
+FIRST_YEAR, LAST_YEAR = 2015, 2025
+
+# Merchants with their usual amount, and how often they appear relative to
+# each other: a few everyday ones make up most rows, as in real statements
+MERCHANTS = [
+    ("Monoprix", 35.0, 30),
+    ("Carrefour City", 25.0, 20),
+    ("Boulangerie Paul", 6.0, 20),
+    ("Uber Eats", 28.0, 10),
+    ("SNCF Connect", 60.0, 5),
+    ("Amazon Marketplace", 45.0, 8),
+    ("Picard Surgelés", 30.0, 4),
+    ("Leroy Merlin", 120.0, 1),
+    ("Tim Hortons", 4.5, 6),
+    ("Société Générale prêt", 850.0, 1),
+]
+TYPES = [("CARD_PAYMENT", 85), ("TRANSFER", 8), ("TOPUP", 5), ("EXCHANGE", 2)]
+CURRENCIES = [("EUR", 90), ("CAD", 6), ("USD", 3), ("GBP", 1)]
+
+# Header row of each bank's export, as ingest.BANK_FORMATS reads it
+STATEMENT_HEADERS: dict[BankEnum, list[str]] = {
+    BankEnum.REVOLUT: [
+        "Type",
+        "Product",
+        "Started Date",
+        "Completed Date",
+        "Description",
+        "Amount",
+        "Fee",
+        "Currency",
+        "State",
+        "Balance",
+    ],
+    BankEnum.BNP: ["Date opération", "Libellé opération", "Montant opération"],
+    BankEnum.HSBC: ["Date", "Description", "Amount"],
+    BankEnum.BNC: ["Date", "Description", "Débit", "Crédit"],
+}
+
+# Preamble lines banks write above the header of their CSV exports
+PREAMBLES: dict[BankEnum, list[list[str]]] = {
+    BankEnum.BNP: [
+        ["Compte de chèques ****4321", "", ""],
+        ["Solde au 01/01/2025", "1 234,56", ""],
+        [],
+    ],
+    BankEnum.BNC: [
+        ["Relevé de compte", "Compte 00012-345-678", "", ""],
+        [],
+    ],
+}
+
+
+def _choice(rng: random.Random, weighted: list[tuple[Any, ...]]) -> tuple[Any, ...]:
+    return rng.choices(weighted, weights=[w[-1] for w in weighted])[0]
+
+
+def transaction_rows(n_rows: int, seed: int = 0) -> Iterator[tuple[Any, ...]]:
+    """
+    `n_rows` transactions spread over FIRST_YEAR to LAST_YEAR, in the column
+    order of TRANSACTION_COLUMNS, each from a statement named in "Source".
+    """
+    rng = random.Random(seed)
+    start = datetime(FIRST_YEAR, 1, 1)
+    span = (datetime(LAST_YEAR + 1, 1, 1) - start).total_seconds()
+    banks = list(BankEnum)
+    for _ in range(n_rows):
+        started = start + timedelta(seconds=rng.random() * span)
+        completed = started + timedelta(hours=rng.choice((0, 2, 26, 50)))
+        merchant, amount, _weight = _choice(rng, MERCHANTS)
+        kind = _choice(rng, TYPES)[0]
+        owner = rng.choice(OWNERS)
+        bank = rng.choice(banks).value
+        yield (
+            kind,
+            "Current",
+            started.strftime("%Y-%m-%d %H:%M:%S"),
+            completed.strftime("%Y-%m-%d %H:%M:%S"),
+            f"{merchant} {rng.randrange(10_000)}",
+            round(-rng.expovariate(1 / amount) if kind != "TOPUP" else amount * 10, 2),
+            0.0 if rng.random() < 0.95 else 0.5,
+            _choice(rng, CURRENCIES)[0],
+            owner,
+            "Courses" if rng.random() < 0.1 else None,
+            f"raw/{completed.year}/{completed.month}/{owner}_{bank}.csv",
+        )
+
+
+def build_transactions_db(path: Path, n_rows: int, seed: int = 0) -> None:
+    """
+    Create the database at `path` holding `n_rows` transactions, with the
+    indexes, monthly summary and search index the service keeps.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = connect(path)
+    try:
+        conn.execute("BEGIN")
+        conn.execute(TRANSACTIONS_DDL)
+        insert = (
+            f'INSERT INTO "transactions" '
+            f'VALUES ({", ".join("?" * len(TRANSACTION_COLUMNS))})'
+        )
+        for chunk in batched(transaction_rows(n_rows, seed), 50_000):
+            conn.executemany(insert, chunk)
+        conn.commit()
+        # Indexes and triggers built once the rows are in, not row by row
+        conn.execute("BEGIN IMMEDIATE")
+        ensure_transactions_table(conn)
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def statement_rows(
+    bank: BankEnum, n_rows: int, year: int, month: int, seed: int = 0
+) -> list[list[Any]]:
+    """Header then `n_rows` rows of a `bank` statement for one month."""
+    rng = random.Random(seed)
+    first = datetime(year, month, 1)
+    rows: list[list[Any]] = []
+    minutes = sorted(rng.randrange(28 * 24 * 60) for _ in range(n_rows))
+    for i, minute in enumerate(minutes):
+        when = first + timedelta(minutes=minute)
+        merchant, amount, _weight = _choice(rng, MERCHANTS)
+        description = f"{merchant} {rng.randrange(10_000)}"
+        value = round(-rng.expovariate(1 / amount), 2)
+        if bank == BankEnum.REVOLUT:
+            settled = when + timedelta(hours=2)
+            rows.append(
+                [
+                    _choice(rng, TYPES)[0],
+                    "Current",
+                    when.strftime("%Y-%m-%d %H:%M:%S"),
+                    settled.strftime("%Y-%m-%d %H:%M:%S"),
+                    description,
+                    value,
+                    0.0,
+                    "EUR",
+                    "COMPLETED",
+                    round(1000 + rng.uniform(-500, 500), 2),
+                ]
+            )
+        elif bank == BankEnum.BNP:
+            # French decimal commas, upper-case labels
+            rows.append(
+                [
+                    when.strftime("%d/%m/%Y"),
+                    f"FACTURE CARTE {description.upper()}",
+                    f"{value:.2f}".replace(".", ","),
+                ]
+            )
+        elif bank == BankEnum.HSBC:
+            rows.append([when.strftime("%d/%m/%Y"), description, f"{value:.2f}"])
+        else:
+            debit, credit = (f"{-value:.2f}", "") if i % 10 else ("", f"{-value:.2f}")
+            rows.append([when.strftime("%Y-%m-%d"), description, debit, credit])
+    return [STATEMENT_HEADERS[bank], *rows]
+
+
+def write_statement(
+    path: Path, bank: BankEnum, n_rows: int, year: int, month: int, seed: int = 0
+) -> Path:
+    """Write a CSV or XLSX statement, following the suffix of `path`."""
+    rows = statement_rows(bank, n_rows, year, month, seed)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if path.suffix.lower() == ".xlsx":
+        workbook = Workbook()
+        sheet = workbook.active
+        for row in rows:
+            sheet.append(row)
+        workbook.save(path)
+        return path
+    fmt = BANK_FORMATS[bank]
+    with path.open("w", newline="", encoding=fmt.encoding) as f:
+        writer = csv.writer(f, delimiter=fmt.delimiter)
+        writer.writerows(PREAMBLES.get(bank, []))
+        writer.writerows(rows)
+    return path
+
+
+def legacy_workbook(path: Path, n_rows: int, seed: int = 0) -> Path:
+    """A legacy Revolut export for excel_to_sqlite: one sheet of transactions."""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "transactions"
+    sheet.append(TRANSACTION_COLUMNS[:-1])
+    for row in transaction_rows(n_rows, seed):
+        sheet.append(list(row[:-1]))
+    path.parent.mkdir(parents=True, exist_ok=True)
+    workbook.save(path)
+    return path
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--statement-rows", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    db = args.out / "SQL" / "dev.db"
+    build_transactions_db(db, args.rows, args.seed)
+    print(f"{args.rows} transactions in {db} ({time.perf_counter() - start:.1f}s)")
+    for bank in BankEnum:
+        for ext in ("csv", "xlsx"):
+            path = args.out / "statements" / f"{bank.value}.{ext}"
+            write_statement(path, bank, args.statement_rows, 2025, 1, args.seed)
+            print(f"{args.statement_rows} rows in {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,473 @@
+"""
+Load test a running service with a mix of SELECTs, writes and uploads.
+
+Start the app first (`make run-app`, or a container), then run from
+services/database:
+    uv run python benchmarks/loadtest.py --url http://localhost:8000 --concurrency 16
+    uv run python benchmarks/loadtest.py --url http://localhost:8009 --rate 200 --mix select=90,write=10
+    uv run python benchmarks/loadtest.py --concurrency 1 --ramp 4 --max-p95 0.25
+
+With --concurrency, that many clients each send a request as soon as their
+previous one is answered. With --rate, requests start on a fixed schedule
+whatever the service's latency, and each latency counts from the request's
+scheduled start, so a stalled service shows as such. --ramp raises the
+concurrency or rate by that step until the service saturates.
+"""
+
+import argparse
+import json
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import anyio
+import httpx
+
+from datagen import write_statement
+from database_pkg.config.schemas import BankEnum
+from database_pkg.slow_log import percentile
+
+KINDS = ("select", "write", "upload")
+
+# Writes go to a table of their own, dropped at the end of the run
+SCRATCH_TABLE = "loadtest_writes"
+
+RECENT_QUERY = (
+    'SELECT * FROM "transactions" WHERE "Completed Date" >= ? '
+    'AND "Completed Date" < ? ORDER BY "Completed Date" DESC LIMIT 100'
+)
+TOTALS_QUERY = (
+    'SELECT "QUI", "Currency", count(*) AS "count", sum("Amount") AS "total" '
+    'FROM "transactions" WHERE "Completed Date" >= ? AND "Completed Date" < ? '
+    'GROUP BY "QUI", "Currency"'
+)
+POINT_QUERY = 'SELECT "rowid" AS "id", * FROM "transactions" WHERE "rowid" = ?'
+
+
+def parse_mix(value: str) -> dict[str, float]:
+    """Weights of each kind of request, as in "select=80,write=15,upload=5"."""
+    mix = {}
+    for part in value.split(","):
+        kind, _, weight = part.partition("=")
+        kind = kind.strip()
+        if kind not in KINDS:
+            raise argparse.ArgumentTypeError(
+                f"unknown request kind {kind!r}, expected one of {', '.join(KINDS)}"
+            )
+        try:
+            mix[kind] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f"invalid weight in {part!r}")
+    if sum(mix.values()) <= 0:
+        raise argparse.ArgumentTypeError("the mix needs a positive weight")
+    return mix
+
+
+@dataclass
+class Sample:
+    kind: str
+    # Seconds since the start of the run when the request was answered
+    finished: float
+    latency: float
+    # None if the request succeeded, else its status code or exception name
+    error: str | None
+
+
+def summarize(samples: list[Sample], seconds: float) -> dict[str, Any]:
+    """Throughput, error rate and latency percentiles of `samples`."""
+    latencies = sorted(s.latency for s in samples)
+    errors = sum(s.error is not None for s in samples)
+    summary: dict[str, Any] = {
+        "requests": len(samples),
+        "throughput": len(samples) / seconds if seconds else 0.0,
+        "error_rate": errors / len(samples) if samples else 0.0,
+    }
+    for p in (50, 95, 99):
+        summary[f"p{p}"] = percentile(latencies, p) if latencies else None
+    summary["max"] = latencies[-1] if latencies else None
+    return summary
+
+
+@dataclass
+class Workload:
+    """Sends requests of each kind to the service, recording their latency."""
+
+    client: httpx.AsyncClient
+    mix: dict[str, float]
+    upload_year: int
+    use_cache: bool
+    rng: random.Random = field(default_factory=lambda: random.Random(0))
+    samples: list[Sample] = field(default_factory=list)
+    started: float = field(default_factory=time.perf_counter)
+    in_flight: int = 0
+    # Filled by setup()
+    years: list[int] = field(default_factory=list)
+    max_rowid: int = 1
+    statements: dict[BankEnum, bytes] = field(default_factory=dict)
+    uploads: int = 0
+
+    async def setup(self) -> None:
+        """Find the data to query, and prepare the writes and uploads."""
+        result = await self.sql(
+            'SELECT min("Completed Date") AS "first", max("Completed Date") AS "last", '
+            'max("rowid") AS "max_rowid" FROM "transactions"'
+        )
+        [row] = result.json()["result"]
+        if row["first"] is None:
+            print("Warning: the transactions table is empty", file=sys.stderr)
+            self.years = [datetime.now().year]
+        else:
+            self.years = list(range(int(row["first"][:4]), int(row["last"][:4]) + 1))
+        self.max_rowid = row["max_rowid"] or 1
+        if self.mix.get("write"):
+            await self.sql(
+                f'CREATE TABLE IF NOT EXISTS "{SCRATCH_TABLE}" '
+                '("written_at" TEXT, "client" INTEGER, "payload" TEXT)'
+            )
+        if self.mix.get("upload"):
+            with tempfile.TemporaryDirectory() as tmp:
+                for bank in BankEnum:
+                    path = Path(tmp) / f"{bank.value}.csv"
+                    write_statement(path, bank, 200, self.upload_year, 1)
+                    self.statements[bank] = path.read_bytes()
+        self.started = time.perf_counter()
+
+    async def teardown(self) -> None:
+        if self.mix.get("write"):
+            await self.sql(f'DROP TABLE IF EXISTS "{SCRATCH_TABLE}"')
+
+    async def sql(self, query: str, params: list[Any] | None = None) -> httpx.Response:
+        response = await self.execute(query, params)
+        response.raise_for_status()
+        return response
+
+    async def execute(self, query: str, params: list[Any] | None) -> httpx.Response:
+        body: dict[str, Any] = {"query": query, "params": params}
+        if not self.use_cache:
+            body["cache"] = False
+        return await self.client.post("/execute_sql", json=body)
+
+    def now(self) -> float:
+        return time.perf_counter() - self.started
+
+    async def send(self, scheduled: float | None = None) -> None:
+        """
+        Send one request of a kind picked from the mix. Its latency counts
+        from `scheduled`, in seconds since the start of the run, if given.
+        """
+        kind = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        start = self.now() if scheduled is None else scheduled
+        error = None
+        self.in_flight += 1
+        try:
+            response = await getattr(self, f"send_{kind}")()
+            if response.status_code >= 400:
+                error = str(response.status_code)
+        except httpx.HTTPError as e:
+            error = type(e).__name__
+        finally:
+            self.in_flight -= 1
+        finished = self.now()
+        self.samples.append(Sample(kind, finished, finished - start, error))
+
+    async def send_select(self) -> httpx.Response:
+        year = self.rng.choice(self.years)
+        month = self.rng.randrange(1, 13)
+        query = self.rng.random()
+        if query < 0.5:
+            end = f"{year + month // 12}-{month % 12 + 1:02d}-01"
+            sql, params = RECENT_QUERY, [f"{year}-{month:02d}-01", end]
+        elif query < 0.8:
+            sql, params = TOTALS_QUERY, [f"{year}-01-01", f"{year + 1}-01-01"]
+        else:
+            sql, params = POINT_QUERY, [self.rng.randrange(1, self.max_rowid + 1)]
+        return await self.execute(sql, params)
+
+    async def send_write(self) -> httpx.Response:
+        return await self.client.post(
+            "/execute_sql",
+            json={
+                "query": f'INSERT INTO "{SCRATCH_TABLE}" VALUES (?, ?, ?)',
+                "params": [
+                    datetime.now(timezone.utc).isoformat(),
+                    self.rng.randrange(1_000_000),
+                    "x" * 200,
+                ],
+            },
+        )
+
+    async def send_upload(self) -> httpx.Response:
+        # A different month every time, so each upload is written
+        self.uploads += 1
+        bank = list(self.statements)[self.uploads % len(self.statements)]
+        return await self.client.post(
+            "/upload_file",
+            data={
+                "owner": "G",
+                "year": str(self.upload_year),
+                "month": str(self.uploads % 12 + 1),
+                "bank": bank.value,
+                "overwrite": "true",
+            },
+            files={"file": ("loadtest.csv", self.statements[bank], "text/csv")},
+        )
+
+
+async def run_closed(workload: Workload, concurrency: int, duration: float) -> None:
+    """`concurrency` clients each sending requests back to back."""
+    deadline = workload.now() + duration
+
+    async def client() -> None:
+        while workload.now() < deadline:
+            await workload.send()
+
+    async with anyio.create_task_group() as tg:
+        for _ in range(concurrency):
+            tg.start_soon(client)
+
+
+async def run_open(
+    workload: Workload, rate: float, duration: float, max_in_flight: int
+) -> None:
+    """
+    Requests started `rate` times per second on schedule. Those due while
+    `max_in_flight` are still unanswered are counted as errors, not sent.
+    """
+    start = workload.now()
+    async with anyio.create_task_group() as tg:
+        for i in range(int(rate * duration)):
+            scheduled = start + i / rate
+            await anyio.sleep(max(0.0, scheduled - workload.now()))
+            if workload.in_flight >= max_in_flight:
+                workload.samples.append(
+                    Sample("dropped", workload.now(), 0.0, "too many in flight")
+                )
+                continue
+            tg.start_soon(workload.send, scheduled)
+
+
+HEADER = f"{'req/s':>9}{'errors':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}"
+
+
+def format_stats(label: str, summary: dict[str, Any]) -> str:
+    def ms(value: float | None) -> str:
+        return f"{value * 1000:>8.1f}" if value is not None else f"{'-':>8}"
+
+    return (
+        f"{label:>8}{summary['throughput']:>9.1f}{summary['error_rate']:>8.1%}"
+        f"{ms(summary['p50'])}{ms(summary['p95'])}{ms(summary['p99'])}"
+    )
+
+
+async def report(workload: Workload, interval: float, windows: list) -> None:
+    """Print and keep the stats of each `interval` seconds, until cancelled."""
+    print(f"{'time':>8}{HEADER}{'in flight':>10}")
+    seen = 0
+    while True:
+        await anyio.sleep(interval)
+        samples = workload.samples[seen:]
+        seen += len(samples)
+        summary = summarize(samples, interval)
+        summary["time"] = round(workload.now(), 1)
+        windows.append(summary)
+        label = f"{summary['time']:.0f}s"
+        print(f"{format_stats(label, summary)}{workload.in_flight:>10}")
+
+
+async def run_level(
+    workload: Workload, args: argparse.Namespace, level: float, duration: float
+) -> dict[str, Any]:
+    """Run one concurrency or rate level, returning the stats of its samples."""
+    first = len(workload.samples)
+    start = workload.now()
+    if args.rate:
+        await run_open(workload, level, duration, args.max_in_flight)
+    else:
+        await run_closed(workload, int(level), duration)
+    samples = workload.samples[first:]
+    summary = summarize(samples, workload.now() - start)
+    summary["level"] = level
+    summary["errors"] = dict(Counter(s.error for s in samples if s.error))
+    summary["by_kind"] = {
+        kind: summarize([s for s in samples if s.kind == kind], workload.now() - start)
+        for kind in workload.mix
+    }
+    return summary
+
+
+def saturated(
+    args: argparse.Namespace, step: dict[str, Any], previous: dict[str, Any] | None
+) -> str | None:
+    """Why the service is saturated at `step`, or None if it is not."""
+    if step["error_rate"] > args.max_error_rate:
+        return f"error rate {step['error_rate']:.1%} over {args.max_error_rate:.1%}"
+    if args.max_p95 and step["p95"] is not None and step["p95"] > args.max_p95:
+        return f"p95 {step['p95'] * 1000:.0f} ms over {args.max_p95 * 1000:.0f} ms"
+    if args.rate and step["throughput"] < 0.95 * step["level"]:
+        return f"{step['throughput']:.1f} req/s served of {step['level']:g} sent"
+    if (
+        not args.rate
+        and previous is not None
+        and step["throughput"] < previous["throughput"] * (1 + args.min_gain)
+    ):
+        return (
+            f"throughput {step['throughput']:.1f} req/s, up less than "
+            f"{args.min_gain:.0%} from {previous['throughput']:.1f}"
+        )
+    return None
+
+
+async def wait_until_up(client: httpx.AsyncClient, seconds: float) -> None:
+    deadline = time.monotonic() + seconds
+    while True:
+        try:
+            (await client.get("/healthz")).raise_for_status()
+            return
+        except httpx.HTTPError:
+            if time.monotonic() > deadline:
+                raise
+            await anyio.sleep(1)
+
+
+async def main_async(args: argparse.Namespace) -> dict[str, Any]:
+    # Enough connections that the client is never the bottleneck
+    connections = args.max_in_flight if args.rate else args.concurrency
+    if args.ramp and not args.rate:
+        connections = args.max_level
+    async with httpx.AsyncClient(
+        base_url=args.url,
+        timeout=args.timeout,
+        limits=httpx.Limits(max_connections=int(connections)),
+    ) as client:
+        await wait_until_up(client, args.wait)
+        workload = Workload(client, args.mix, args.upload_year, not args.no_cache)
+        await workload.setup()
+        windows: list[dict[str, Any]] = []
+        steps: list[dict[str, Any]] = []
+        result: dict[str, Any] = {}
+        try:
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(report, workload, args.interval, windows)
+                level = args.rate or args.concurrency
+                if not args.ramp:
+                    steps.append(await run_level(workload, args, level, args.duration))
+                while args.ramp and level <= args.max_level:
+                    print(f"-- {'rate' if args.rate else 'concurrency'} {level:g}")
+                    step = await run_level(workload, args, level, args.step_duration)
+                    steps.append(step)
+                    reason = saturated(
+                        args, step, steps[-2] if len(steps) > 1 else None
+                    )
+                    if reason:
+                        good = steps[-2] if len(steps) > 1 else None
+                        result["saturation"] = {
+                            "reason": reason,
+                            "level": good["level"] if good else None,
+                            "throughput": good["throughput"] if good else None,
+                        }
+                        break
+                    level += args.ramp
+                tg.cancel_scope.cancel()
+        finally:
+            await workload.teardown()
+    return {"windows": windows, "steps": steps, **result}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().splitlines()[0],
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--url", default="http://localhost:8000")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--concurrency", type=int, default=8, help="Clients sending back to back."
+    )
+    mode.add_argument("--rate", type=float, help="Requests started per second.")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("select=90,write=8,upload=2"),
+        help="Weight of each kind of request (default: select=90,write=8,upload=2).",
+    )
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument(
+        "--interval", type=float, default=5.0, help="Seconds between reports."
+    )
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=1000,
+        help="With --rate, requests not sent while this many are unanswered.",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Bypass the SELECT result cache."
+    )
+    parser.add_argument(
+        "--upload-year",
+        type=int,
+        default=1999,
+        help="Year of the uploaded statements, one with no real statements.",
+    )
+    parser.add_argument(
+        "--wait", type=float, default=30.0, help="Seconds to wait for /healthz."
+    )
+    ramp = parser.add_argument_group("ramp mode")
+    ramp.add_argument(
+        "--ramp",
+        type=float,
+        default=0,
+        help="Raise the concurrency or rate by this step until saturation.",
+    )
+    ramp.add_argument("--step-duration", type=float, default=15.0)
+    ramp.add_argument("--max-level", type=float, default=256)
+    ramp.add_argument("--max-error-rate", type=float, default=0.01)
+    ramp.add_argument("--max-p95", type=float, help="Latency objective, in seconds.")
+    ramp.add_argument(
+        "--min-gain",
+        type=float,
+        default=0.05,
+        help="With --concurrency, saturated once a step adds less throughput.",
+    )
+    parser.add_argument("--output", type=Path, help="Write the results as JSON.")
+    args = parser.parse_args()
+
+    started_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    results = anyio.run(main_async, args)
+    print(f"\n{'level':>8}{HEADER}")
+    for step in results["steps"]:
+        print(format_stats(f"{step['level']:g}", step))
+        for kind, summary in step["by_kind"].items():
+            print(format_stats(kind, summary))
+        for error, count in step["errors"].items():
+            print(f"{'':>8}{count} x {error}")
+    if "saturation" in results:
+        saturation = results["saturation"]
+        if saturation["level"] is None:
+            print(f"\nSaturated from the first step: {saturation['reason']}")
+        else:
+            print(
+                f"\nSaturation point: {saturation['level']:g} "
+                f"({saturation['throughput']:.1f} req/s), next step {saturation['reason']}"
+            )
+    if args.output:
+        results["meta"] = {
+            "url": args.url,
+            "mode": "rate" if args.rate else "concurrency",
+            "mix": args.mix,
+            "ramp": args.ramp,
+            "started_at": started_at,
+        }
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,161 @@
-import shutil
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+from itertools import islice
 from pathlib import Path
-from fastapi import Depends, FastAPI, HTTPException, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+import anyio
+from fastapi import (
+    Depends,
+    FastAPI,
+    Header,
+    HTTPException,
+    Query,
+    UploadFile,
+    File,
+    Form,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 
 from fastapi_mcp import FastApiMCP
 
-from database_pkg.utils import get_db_connection, get_extension
+from database_pkg.backfill import BACKFILL_JOB, run_backfill_job
+from database_pkg.budget import (
+    QueryBudget,
+    QueryBudgetError,
+    QueryCancelledError,
+    QueryTimeoutError,
+    ResultTooLargeError,
+)
+from database_pkg.catalog import (
+    FileEntry,
+    describe_file,
+    file_entry,
+    get_entries,
+    get_entry,
+    hash_file,
+    is_current,
+    is_ingested,
+    list_files,
+    record_files,
+)
+from database_pkg.executor import DatabaseBusyError, DatabaseExecutor
+from database_pkg.index_advisor import IndexAdvisor, list_indexes
+from database_pkg.ingest import (
+    INGESTIBLE_EXTENSIONS,
+    IngestResult,
+    drop_staged,
+    read_statement,
+    replace_staged,
+    stage_rows,
+    staging_table,
+)
+from database_pkg.jobs import INGEST_JOB, JobQueue, ingest_job_payload
+from database_pkg.metrics import (
+    EXECUTOR_PENDING,
+    POOL_CONNECTIONS,
+    PROMETHEUS_MEDIA_TYPE,
+    WRITER_COMMITS,
+    WRITER_QUEUED,
+    WRITER_WRITES,
+    MetricsMiddleware,
+    phase,
+    registry,
+)
+from database_pkg.pool import ConnectionPool, PoolTimeoutError, statement_cache_stats
+from database_pkg.queries import (
+    NDJSON_MEDIA_TYPE,
+    cached_statement_info,
+    fetch_ndjson,
+    open_stream,
+    run_batch,
+    run_query,
+    run_write,
+    statement_info,
+    stream_header,
+)
+from database_pkg.result_cache import ResultCache, etag_matches
+from database_pkg.search import rebuild_search_index, search_transactions
+from database_pkg.slow_log import SlowQueryLog
+from database_pkg.summary import monthly_totals, rebuild_summary
+from database_pkg.uploads import (
+    UploadSizeLimitMiddleware,
+    UploadTooLargeError,
+    commit_upload,
+    discard_upload,
+    exceeds_upload_limit,
+    stage_upload,
+    too_large_message,
+)
+from database_pkg.utils import (
+    create_db_executor,
+    create_db_pool,
+    create_db_writer,
+    create_index_advisor,
+    create_job_queue,
+    create_query_budget,
+    create_reader_pool,
+    create_result_cache,
+    create_slow_query_log,
+    get_db_connection,
+    get_db_executor,
+    get_db_pool,
+    get_db_writer,
+    get_extension,
+    get_index_advisor,
+    get_job_queue,
+    get_query_budget,
+    get_reader_pool,
+    get_result_cache,
+    get_slow_query_log,
+    prepare_database,
+    statement_path,
+)
+from database_pkg.writer import DatabaseWriter
 from database_pkg.config.settings import database_settings
-from database_pkg.config.schemas import SQLQuery, OwnerEnum, BankEnum, ExtensionEnum
+from database_pkg.config.schemas import (
+    BackfillRequest,
+    IngestRequest,
+    SQLBatch,
+    SQLQuery,
+    OwnerEnum,
+    BankEnum,
+    ExtensionEnum,
+)
+
+# Status of a query aborted for going over its budget. 499 is the de facto
+# status for a request its client gave up on.
+BUDGET_STATUS = {
+    QueryTimeoutError: 408,
+    ResultTooLargeError: 413,
+    QueryCancelledError: 499,
+}
+
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.db_pool = create_db_pool()
+    await anyio.to_thread.run_sync(prepare_database, app.state.db_pool)
+    app.state.reader_pool = create_reader_pool(app.state.db_pool)
+    app.state.db_writer = create_db_writer(app.state.db_pool)
+    app.state.db_executor = create_db_executor()
+    app.state.result_cache = create_result_cache()
+    app.state.index_advisor = create_index_advisor()
+    app.state.slow_query_log = create_slow_query_log()
+    app.state.job_queue = create_job_queue(app.state.db_pool, app.state.db_executor)
+    app.state.job_queue.handlers[BACKFILL_JOB] = run_backfill_job
+    async with anyio.create_task_group() as tg:
+        tg.start_soon(app.state.job_queue.run)
+        yield
+        tg.cancel_scope.cancel()
+    app.state.job_queue.close()
+    await anyio.to_thread.run_sync(app.state.db_writer.close)
+    if app.state.result_cache is not None:
+        app.state.result_cache.close()
+    app.state.reader_pool.close()
+    app.state.db_pool.close()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 
 
 @app.get("/healthz")
@@ -18,6 +163,11 @@ async def healthz():
     return {"status": "ok"}
 
 
+# Inside catch_dependency_errors, whose receive would wrap its 413 in an
+# exception group
+app.add_middleware(UploadSizeLimitMiddleware)
+
+
 @app.middleware("http")
 async def catch_dependency_errors(request, call_next):
     try:
@@ -26,11 +176,75 @@ async def catch_dependency_errors(request, call_next):
         return JSONResponse(status_code=400, content={"detail": str(e)})
 
 
+# Outermost, to see the status actually sent
+app.add_middleware(MetricsMiddleware)
+
+
+@app.get(
+    "/stats",
+    summary="Connection pool and cache statistics",
+    description="""
+    Report usage of the read-write and read-only connection pools, the writer's queue and writes per commit, and the hit rate of the per-connection prepared-statement cache and of the SELECT result cache.
+    A low statement cache hit rate usually means clients build literal SQL instead of passing params.
+    """,
+)
+async def stats(
+    pool: ConnectionPool = Depends(get_db_pool),
+    readers: ConnectionPool = Depends(get_reader_pool),
+    writer: DatabaseWriter = Depends(get_db_writer),
+    cache: ResultCache | None = Depends(get_result_cache),
+    advisor: IndexAdvisor | None = Depends(get_index_advisor),
+    slow_log: SlowQueryLog | None = Depends(get_slow_query_log),
+):
+    connections = [*pool.connections, *readers.connections]
+    if writer.connection is not None:
+        connections.append(writer.connection)
+    return {
+        "pool": pool.stats()["pool"],
+        "reader_pool": readers.stats()["pool"],
+        "writer": writer.stats(),
+        "statement_cache": statement_cache_stats(connections),
+        "result_cache": cache.stats() if cache else None,
+        "index_advisor": advisor.stats() if advisor else None,
+        "slow_query_log": slow_log.stats() if slow_log else None,
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(
+    pool: ConnectionPool = Depends(get_db_pool),
+    readers: ConnectionPool = Depends(get_reader_pool),
+    writer: DatabaseWriter = Depends(get_db_writer),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+):
+    """
+    Metrics in Prometheus text format: latency histograms per route and per
+    phase (connect, execute, fetch, serialize, upload_write), requests in
+    flight, rows returned, bytes written, and pool and writer usage.
+    """
+    for name, p in (("read_write", pool), ("read_only", readers)):
+        for state, value in p.stats()["pool"].items():
+            POOL_CONNECTIONS.set(value, name, state)
+    writer_stats = writer.stats()
+    WRITER_QUEUED.set(writer_stats["queued"])
+    WRITER_COMMITS.set(writer_stats["commits"])
+    WRITER_WRITES.set(writer_stats["writes"])
+    EXECUTOR_PENDING.set(executor.pending)
+    return Response(registry.render(), media_type=PROMETHEUS_MEDIA_TYPE)
+
+
 @app.post(
     "/execute_sql",
     summary="Execute a SQL query",
     description="""
-    Execute a raw SQL query against the database. For SELECT queries, returns the result rows as a list of dicts. For other queries, returns the number of affected rows.
+    Execute a raw SQL query against the database. For queries returning rows without writing (SELECT, WITH ... SELECT, PRAGMA table_info...), returns the result rows as a list of dicts. For other queries, returns the number of affected rows.
+    Read-only queries run concurrently on read-only connections. Writes go through a single writer that commits queued writes together; each call is still applied all or nothing, and BEGIN/COMMIT statements are refused.
+    Pass values through params, a list for "?" placeholders or an object for ":name" placeholders, rather than building literal SQL: the prepared statement is then reused across calls.
+    Set format to "columns" to get the column names once followed by one array per row, or to "arrow" for an Apache Arrow IPC stream.
+    Large SELECTs can be paged: set page_size and page_key (a unique column of the result), then pass the returned next_cursor as cursor to get the following page.
+    Queries running for longer than a threshold are logged with their plan, see /slow_queries.
+    Each query runs within a budget: it is aborted with 408 once it runs for too long or too many SQLite steps, with 413 once its result has too many rows or bytes, and as soon as its client disconnects.
+    SELECT results are cached until the next write and carry an ETag: send it back in If-None-Match to get a 304 when the data has not changed. Set cache to false for queries using random() or the current time.
     CREATE TABLE "transactions" (
         "Type" TEXT,
         "Product" TEXT,
@@ -41,30 +255,320 @@ async def catch_dependency_errors(request, call_next):
         "Fee" REAL,
         "Currency" TEXT,
         "QUI" TEXT,
-        "COMMENT" TEXT
+        "COMMENT" TEXT,
+        "Source" TEXT
     )
+    "Source" is the statement file a row was ingested from, or NULL for rows entered otherwise.
+    "Completed Date", "Started Date", ("QUI", "Completed Date"), "Currency" and "Source" are indexed.
+    For totals per month, prefer /summary/monthly over aggregating transactions. To find transactions by description or comment, prefer /search over LIKE.
     """,
 )
 async def execute_sql(
     sql_query: SQLQuery,
     conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+    writer: DatabaseWriter = Depends(get_db_writer),
+    cache: ResultCache | None = Depends(get_result_cache),
+    advisor: IndexAdvisor | None = Depends(get_index_advisor),
+    budget: QueryBudget = Depends(get_query_budget),
+    slow_log: SlowQueryLog | None = Depends(get_slow_query_log),
+    if_none_match: str | None = Header(default=None),
+):
+    async def log_if_slow(rows: int | None, aborted: bool = False) -> None:
+        if slow_log is not None and (aborted or slow_log.is_slow(budget.elapsed)):
+            await executor.run(
+                slow_log.record,
+                conn,
+                sql_query.query,
+                sql_query.params,
+                budget.elapsed,
+                rows,
+                wait=True,
+            )
+
+    try:
+        info = cached_statement_info(sql_query.query) or await executor.run(
+            statement_info, conn, sql_query.query, sql_query.params
+        )
+        if not info.read_only:
+            response = await writer.run(run_write, sql_query, budget)
+            await log_if_slow(response.rows)
+            return Response(content=response.body, media_type=response.media_type)
+        if advisor is not None and not advisor.record(sql_query.query):
+            await executor.run(advisor.explain, conn, sql_query.query, sql_query.params)
+        if cache is None or not sql_query.cache:
+            response = await executor.run(run_query, conn, sql_query, budget)
+            await log_if_slow(response.rows)
+            return Response(content=response.body, media_type=response.media_type)
+
+        key = cache.key(sql_query)
+        version = await executor.run(cache.data_version)
+        headers = {"ETag": cache.etag(key, version)}
+        if etag_matches(if_none_match, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        cached = cache.get(key, version)
+        if cached is not None:
+            return Response(cached.body, media_type=cached.media_type, headers=headers)
+        response = await executor.run(run_query, conn, sql_query, budget)
+        await log_if_slow(response.rows)
+        cache.put(key, version, response.body, response.media_type)
+        return Response(
+            content=response.body, media_type=response.media_type, headers=headers
+        )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except QueryBudgetError as e:
+        if isinstance(e, QueryTimeoutError):
+            # Queries aborted for running too long are the first to look at
+            await log_if_slow(None, aborted=True)
+        raise HTTPException(status_code=BUDGET_STATUS[type(e)], detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get(
+    "/slow_queries",
+    summary="Slow queries, grouped by statement",
+    description="""
+    Report the queries sent to /execute_sql that ran for longer than the slow query threshold, or were aborted for going over their time budget.
+    Queries are grouped by fingerprint: their normalized text with literal values replaced by ?, so the same statement run with different values is one group.
+    Each group has its count, total, median (p50), 95th percentile (p95) and max duration in seconds, and its latest entry with its params, rows and query plan (EXPLAIN QUERY PLAN). Groups come most total time first.
+    Set recent to also list that many of the latest entries, most recent first.
+    """,
+)
+async def slow_queries(
+    recent: int = Query(0, ge=0),
+    slow_log: SlowQueryLog | None = Depends(get_slow_query_log),
+):
+    if slow_log is None:
+        return {"threshold": None, "statements": [], "recent": []}
+    return {
+        "threshold": slow_log.threshold,
+        "statements": slow_log.report(),
+        "recent": [asdict(entry) for entry in slow_log.entries()[:recent]],
+    }
+
+
+@app.get(
+    "/index_advisor",
+    summary="Indexes and queries that scan whole tables",
+    description="""
+    List the indexes of the transactions table, and the SELECTs seen by /execute_sql whose query plan (EXPLAIN QUERY PLAN) scans a whole table, most frequent first.
+    Each query comes with its execution count, the scanning plan steps, and the transactions columns it filters, joins, or sorts on: the candidates for a new index.
+    Set min_count to only report queries run at least that many times.
+    """,
+)
+async def index_advisor(
+    min_count: int = 1,
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+    advisor: IndexAdvisor | None = Depends(get_index_advisor),
+):
+    try:
+        indexes = await executor.run(list_indexes, conn)
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "indexes": indexes,
+        "queries": advisor.report(min_count) if advisor else [],
+    }
+
+
+@app.post(
+    "/execute_batch",
+    summary="Execute many SQL statements in one transaction",
+    description="""
+    Execute several write statements in a single transaction with a single commit: either a list of statements (each with optional params), or one query with a list of param_sets run through executemany.
+    All or nothing: if any statement fails, or the batch runs for too long or too many SQLite steps (408), none of the changes are kept.
+    Returns the row count of each statement and their total.
+    """,
+)
+async def execute_batch(
+    batch: SQLBatch,
+    writer: DatabaseWriter = Depends(get_db_writer),
+    budget: QueryBudget = Depends(get_query_budget),
 ):
     try:
-        cursor = conn.cursor()
-        cursor.execute(sql_query.query)
-        if sql_query.query.strip().lower().startswith("select"):
-            rows = cursor.fetchall()
-            result = [dict(row) for row in rows]
-        else:
-            conn.commit()
-            result = {"rows_affected": cursor.rowcount}
-        cursor.close()
-        conn.close()
-        return {"result": result}
+        response = await writer.run(run_batch, batch, budget)
+        return Response(content=response.body, media_type=response.media_type)
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except QueryBudgetError as e:
+        raise HTTPException(status_code=BUDGET_STATUS[type(e)], detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
+@app.post(
+    "/execute_sql/stream",
+    summary="Stream the rows of a read-only query",
+    description="""
+    Execute a read-only query and stream its rows as newline-delimited JSON, one object per line.
+    With format "columns", the first line holds the column names and each following line is one row array.
+    Rows are fetched in fixed-size chunks, so memory stays flat however many rows the query returns.
+    The query's time and step budgets apply to the whole stream, which is cut short once one is exceeded; its row and byte budgets do not apply.
+    """,
+)
+async def execute_sql_stream(
+    sql_query: SQLQuery,
+    pool: ConnectionPool = Depends(get_reader_pool),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+    advisor: IndexAdvisor | None = Depends(get_index_advisor),
+):
+    # The connection is owned by the stream rather than a dependency, since
+    # it must stay checked out until the last chunk has been sent.
+    try:
+        with phase("connect"):
+            conn = await executor.wait_for(pool.acquire)
+    except (DatabaseBusyError, PoolTimeoutError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    budget = create_query_budget()
+    try:
+        cursor = await executor.run(open_stream, conn, sql_query, budget, wait=True)
+        if advisor is not None and not advisor.record(sql_query.query):
+            await executor.run(
+                advisor.explain, conn, sql_query.query, sql_query.params, wait=True
+            )
+    except QueryBudgetError as e:
+        pool.release(conn)
+        raise HTTPException(status_code=BUDGET_STATUS[type(e)], detail=str(e))
+    except Exception as e:
+        pool.release(conn)
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def rows():
+        try:
+            yield stream_header(cursor, sql_query.format)
+            while chunk := await executor.run(
+                fetch_ndjson,
+                cursor,
+                database_settings.stream_chunk_size,
+                sql_query.format,
+                budget,
+                wait=True,
+            ):
+                yield chunk
+        finally:
+            cursor.close()
+            pool.release(conn)
+
+    return StreamingResponse(rows(), media_type=NDJSON_MEDIA_TYPE)
+
+
+def statement_target(
+    filename: str | None, owner: OwnerEnum, year: int, month: int, bank: BankEnum
+) -> Path:
+    """Validate an upload's metadata and return where the statement is saved."""
+    # Validate year and month
+    if year < 1900 or year > 2100:
+        raise HTTPException(
+            status_code=400, detail="Invalid year. Must be between 1900 and 2100."
+        )
+    if month < 1 or month > 12:
+        raise HTTPException(
+            status_code=400, detail="Invalid month. Must be between 1 and 12."
+        )
+
+    ext = get_extension(filename or "")
+    try:
+        ExtensionEnum(ext)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid file type. Only PDF, CSV, and Excel files are accepted.",
+        )
+    return statement_path(
+        database_settings.blob_path, owner.value, bank.value, year, month, ext
+    )
+
+
+async def store_statement(
+    file: UploadFile,
+    save_path: Path,
+    owner: OwnerEnum,
+    year: int,
+    month: int,
+    bank: BankEnum,
+    overwrite: bool,
+    stored: dict | None,
+) -> tuple[str, FileEntry]:
+    """
+    Save an upload to `save_path` and return its status ("created",
+    "replaced" or "unchanged") and files catalog entry. `stored` is the
+    path's current catalog entry. Raises HTTPException 409 or 413.
+    """
+    if exceeds_upload_limit(file.size):
+        raise HTTPException(status_code=413, detail=too_large_message())
+    save_path.parent.mkdir(parents=True, exist_ok=True)
+    # Written, hashed and fsynced off the event loop in a single pass, to a
+    # temporary file that only replaces the statement once complete
+    try:
+        staged = await run_in_threadpool(stage_upload, file.file, save_path.parent)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    status = "created"
+    try:
+        if save_path.exists():
+            # The catalog tells an identical re-upload apart without rewriting it
+            stat = save_path.stat()
+            if is_current(stored, stat.st_size, stat.st_mtime):
+                current = stored["sha256"]
+            else:
+                current = await run_in_threadpool(hash_file, save_path)
+            if current == staged.sha256:
+                status = "unchanged"
+            elif not overwrite:
+                raise HTTPException(
+                    status_code=409,
+                    detail="File already exists. Set overwrite=True to replace it.",
+                )
+            else:
+                status = "replaced"
+        if status != "unchanged":
+            await run_in_threadpool(commit_upload, staged, save_path)
+    finally:
+        discard_upload(staged)
+    entry = file_entry(
+        database_settings.blob_path,
+        save_path,
+        owner.value,
+        bank.value,
+        year,
+        month,
+        staged.sha256,
+    )
+    return status, entry
+
+
+async def ingest_through_writer(
+    writer: DatabaseWriter,
+    executor: DatabaseExecutor,
+    path: Path,
+    owner: OwnerEnum,
+    bank: BankEnum,
+    entry: FileEntry,
+    chunk_size: int,
+) -> IngestResult:
+    """
+    Load a statement through the database writer. Rows are parsed on the
+    executor and staged `chunk_size` at a time, each batch in a write of its
+    own, then swapped in by a last write: the writer is never held while the
+    file is parsed, and the statement's rows still change all at once.
+    """
+    table = staging_table()
+    rows = read_statement(path, owner, bank, entry.path)
+    try:
+        while chunk := await executor.run(list, islice(rows, chunk_size)):
+            await writer.run(stage_rows, table, chunk)
+        return await writer.run(replace_staged, table, entry.path, chunk_size, entry)
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await writer.run(drop_staged, table)
+        raise
+    finally:
+        rows.close()
+
+
 @app.post(
     "/upload_file",
     summary="Upload a bank statement file",
@@ -72,6 +576,9 @@ async def execute_sql(
     Upload a bank statement file (PDF, CSV, XLSX, or XLS) for a given owner, year, month, and bank. 
     The file is saved in a structured directory based on year and month. 
     Allowed owners: G, N. Allowed banks: BNP, REVOLUT, HSBC, BNC.
+    The upload is written to a temporary file and atomically renamed into place once complete, so a failed upload never leaves a truncated statement. Files over the configured size limit are refused with 413.
+    The file's SHA-256 is recorded in the files catalog. Uploading the same bytes again leaves the file untouched and returns status "unchanged"; otherwise status is "created" or "replaced".
+    Set ingest to load a CSV or XLSX statement into transactions in the background: the response then carries a job_id to follow on /jobs/{job_id}.
     """,
 )
 async def upload_file(
@@ -94,36 +601,425 @@ async def upload_file(
         description="If true, overwrite the file if it exists. If false, return 409 if file exists.",
         examples=[False],
     ),
+    ingest: bool = Form(
+        False,
+        description="If true, queue the ingestion of a CSV or XLSX file and return its job_id.",
+        examples=[False],
+    ),
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+    writer: DatabaseWriter = Depends(get_db_writer),
+    queue: JobQueue | None = Depends(get_job_queue),
 ):
-    # Validate year and month
-    if year < 1900 or year > 2100:
+    save_path = statement_target(file.filename, owner, year, month, bank)
+    ingestible = save_path.suffix.lstrip(".") in INGESTIBLE_EXTENSIONS
+    if ingest and ingestible and queue is None:
+        raise HTTPException(status_code=503, detail="The job queue is not running.")
+    relative = save_path.relative_to(database_settings.blob_path).as_posix()
+    try:
+        stored = await executor.run(get_entry, conn, relative)
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    status, entry = await store_statement(
+        file, save_path, owner, year, month, bank, overwrite, stored
+    )
+    try:
+        await writer.run(record_files, [entry])
+        job_id = None
+        if ingest and ingestible:
+            job_id = await queue.submit(writer, INGEST_JOB, ingest_job_payload(entry))
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {
+        "detail": (
+            "File unchanged."
+            if status == "unchanged"
+            else "File uploaded successfully."
+        ),
+        "path": str(save_path),
+        "status": status,
+        "sha256": entry.sha256,
+        "job_id": job_id,
+    }
+
+
+@app.post(
+    "/upload_files",
+    summary="Upload many bank statement files at once",
+    description="""
+    Upload several statement files in one multipart request. The i-th file goes with the i-th value of owners, years, months, and banks, so all five lists must have the same length.
+    Files are written concurrently, each like /upload_file, and recorded in the files catalog together.
+    Each file gets its own status: "created", "replaced", "unchanged" (same bytes already stored), "conflict" (a different file exists and overwrite is false, or the same target appears twice), or "error" with a detail.
+    Set ingest to queue one ingestion job per CSV and XLSX file of the request; each such file then has a job_id to follow on /jobs/{job_id}.
+    """,
+)
+async def upload_files(
+    files: list[UploadFile] = File(..., description="The statement files."),
+    owners: list[OwnerEnum] = Form(..., description="Owner of each file."),
+    years: list[int] = Form(..., description="Year of each statement."),
+    months: list[int] = Form(..., description="Month of each statement (1-12)."),
+    banks: list[BankEnum] = Form(..., description="Bank of each statement."),
+    overwrite: bool = Form(
+        False, description="If true, replace existing files with different content."
+    ),
+    ingest: bool = Form(
+        False, description="If true, queue the ingestion of the CSV and XLSX files."
+    ),
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+    writer: DatabaseWriter = Depends(get_db_writer),
+    queue: JobQueue | None = Depends(get_job_queue),
+):
+    if not len(files) == len(owners) == len(years) == len(months) == len(banks):
         raise HTTPException(
-            status_code=400, detail="Invalid year. Must be between 1900 and 2100."
+            status_code=400,
+            detail="files, owners, years, months, and banks must have the same length.",
         )
-    if month < 1 or month > 12:
-        raise HTTPException(
-            status_code=400, detail="Invalid month. Must be between 1 and 12."
+    results: list[dict] = [{"filename": file.filename} for file in files]
+    targets: dict[int, Path] = {}
+    for i, file in enumerate(files):
+        try:
+            path = statement_target(
+                file.filename, owners[i], years[i], months[i], banks[i]
+            )
+        except HTTPException as e:
+            results[i].update(status="error", detail=e.detail)
+            continue
+        if path in targets.values():
+            results[i].update(
+                status="conflict",
+                detail="Another file of this request has the same target.",
+            )
+            continue
+        targets[i] = path
+    if ingest and queue is None:
+        if any(p.suffix.lstrip(".") in INGESTIBLE_EXTENSIONS for p in targets.values()):
+            raise HTTPException(status_code=503, detail="The job queue is not running.")
+    try:
+        stored = await executor.run(
+            get_entries,
+            conn,
+            [
+                p.relative_to(database_settings.blob_path).as_posix()
+                for p in targets.values()
+            ],
         )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+    entries: dict[int, FileEntry] = {}
+    limiter = anyio.Semaphore(database_settings.upload_concurrency)
+
+    async def store(i: int, path: Path) -> None:
+        async with limiter:
+            try:
+                status, entry = await store_statement(
+                    files[i],
+                    path,
+                    owners[i],
+                    years[i],
+                    months[i],
+                    banks[i],
+                    overwrite,
+                    stored.get(
+                        path.relative_to(database_settings.blob_path).as_posix()
+                    ),
+                )
+            except HTTPException as e:
+                status = "conflict" if e.status_code == 409 else "error"
+                results[i].update(status=status, detail=e.detail)
+                return
+        entries[i] = entry
+        results[i].update(path=str(path), status=status, sha256=entry.sha256)
+
+    async with anyio.create_task_group() as tg:
+        for i, path in targets.items():
+            tg.start_soon(store, i, path)
 
-    ext = get_extension(file.filename)
     try:
-        ext_enum = ExtensionEnum(ext)
-    except ValueError:
-        raise HTTPException(
-            status_code=400,
-            detail="Invalid file type. Only PDF, CSV, and Excel files are accepted.",
+        await writer.run(record_files, list(entries.values()))
+        if ingest:
+            for i in sorted(entries):
+                if entries[i].ext in INGESTIBLE_EXTENSIONS:
+                    results[i]["job_id"] = await queue.submit(
+                        writer, INGEST_JOB, ingest_job_payload(entries[i])
+                    )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"files": results}
+
+
+@app.post(
+    "/ingest_file",
+    summary="Load an uploaded statement into the transactions table",
+    description="""
+    Parse a previously uploaded CSV or XLSX statement for a given owner, year, month, and bank, and insert its rows into transactions.
+    Rows are parsed in fixed-size batches, each staged by the database writer, then swapped in by a single write, so other writes are not held up while the file is parsed and the statement's rows change all at once.
+    Ingesting the same statement again replaces the rows it loaded the previous time.
+    If the files catalog shows this exact content was already ingested, nothing is done and skipped is true; set force to ingest it anyway.
+    """,
+)
+async def ingest_file(
+    statement: IngestRequest,
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+    writer: DatabaseWriter = Depends(get_db_writer),
+):
+    blob_path = Path(database_settings.blob_path)
+    candidates = [
+        statement_path(
+            blob_path,
+            statement.owner.value,
+            statement.bank.value,
+            statement.year,
+            statement.month,
+            ext,
         )
-    save_dir = Path(database_settings.blob_path) / "raw" / str(year) / str(month)
-    save_dir.mkdir(parents=True, exist_ok=True)
-    save_path = save_dir / f"{owner.value}_{bank.value}.{ext}"
-    if not overwrite and save_path.exists():
+        for ext in (ExtensionEnum.CSV.value, ExtensionEnum.XLSX.value)
+    ]
+    path = next((p for p in candidates if p.exists()), None)
+    if path is None:
         raise HTTPException(
-            status_code=409,
-            detail="File already exists. Set overwrite=True to replace it.",
+            status_code=404,
+            detail="No CSV or XLSX statement uploaded for this owner, bank, and month.",
+        )
+    try:
+        entry = await executor.run(
+            describe_file,
+            conn,
+            blob_path,
+            path,
+            statement.owner.value,
+            statement.bank.value,
+            statement.year,
+            statement.month,
+        )
+        if not statement.force and await executor.run(is_ingested, conn, entry):
+            return {
+                "detail": "File unchanged since it was last ingested.",
+                "path": str(path),
+                "rows_inserted": 0,
+                "rows_replaced": 0,
+                "skipped": True,
+            }
+        result = await ingest_through_writer(
+            writer,
+            executor,
+            path,
+            statement.owner,
+            statement.bank,
+            entry,
+            database_settings.ingest_chunk_size,
+        )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "detail": "File ingested successfully.",
+        "path": str(path),
+        **result._asdict(),
+        "skipped": False,
+    }
+
+
+@app.get(
+    "/files",
+    summary="List uploaded statement files",
+    description="""
+    List uploaded statement files from the files catalog, optionally filtered by year, month, owner, and bank, without walking the upload directory.
+    Each entry has the file's path relative to the blob directory, size, mtime, SHA-256, upload time, and the hash and time of its last ingestion (null if never ingested).
+    """,
+)
+async def files(
+    year: int | None = None,
+    month: int | None = None,
+    owner: OwnerEnum | None = None,
+    bank: BankEnum | None = None,
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+):
+    try:
+        entries = await executor.run(
+            list_files,
+            conn,
+            year=year,
+            month=month,
+            owner=owner.value if owner else None,
+            bank=bank.value if bank else None,
+        )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"files": entries}
+
+
+@app.get(
+    "/jobs/{job_id}",
+    summary="Status of a background job",
+    description="""
+    Report a background job: its status (queued, running, done, or failed), rows parsed and inserted so far, duration in seconds, and its result or error once finished.
+    """,
+)
+async def job_status(
+    job_id: int,
+    conn=Depends(get_db_connection),
+    queue: JobQueue | None = Depends(get_job_queue),
+):
+    try:
+        job = await queue.get(conn, job_id) if queue is not None else None
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found.")
+    return job
+
+
+@app.get(
+    "/summary/monthly",
+    summary="Monthly totals per owner, currency, and type",
+    description="""
+    Transaction count and totals of "Amount" and "Fee" per year, month, owner (QUI), currency, and type, optionally filtered on any of them.
+    Read from a summary table kept up to date by triggers on every write to transactions, so the cost depends on the number of months, not of transactions.
+    Set by_type to false to add up all types of a month, owner, and currency.
+    Months come from "Completed Date"; rows without one are counted in year 0, month 0.
+    """,
+)
+async def summary_monthly(
+    year: int | None = None,
+    month: int | None = None,
+    owner: str | None = None,
+    currency: str | None = None,
+    type: str | None = None,
+    by_type: bool = True,
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+):
+    try:
+        rows = await executor.run(
+            monthly_totals,
+            conn,
+            year=year,
+            month=month,
+            owner=owner,
+            currency=currency,
+            type_=type,
+            by_type=by_type,
+        )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"rows": rows}
+
+
+@app.post(
+    "/admin/rebuild_summary",
+    summary="Recompute the monthly summary",
+    description="""
+    Recompute the monthly summary table from transactions, and recreate its triggers if they were dropped (e.g. when the table was replaced by excel_to_sqlite).
+    Returns the number of summary rows.
+    """,
+)
+async def admin_rebuild_summary(
+    writer: DatabaseWriter = Depends(get_db_writer),
+):
+    try:
+        rows = await writer.run_alone(rebuild_summary)
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"detail": "Monthly summary rebuilt.", "rows": rows}
+
+
+@app.get(
+    "/search",
+    summary="Full-text search of transactions",
+    description="""
+    Find transactions whose Description or COMMENT contain every word of q, ignoring case and accents; the last word also matches as a prefix. Best matches come first.
+    Uses a full-text index kept in sync by triggers, instead of a LIKE scan of every row.
+    Optionally filter on owner (QUI) and on a date_from/date_to range of "Completed Date" (YYYY-MM-DD, inclusive).
+    Each row has its rowid as id and a score (lower is better). Pass next_offset back as offset to get the next page; it is null on the last page.
+    Set raw to use q as an FTS5 query as is, e.g. 'uber NOT eats' or '"carte bancaire"'.
+    """,
+)
+async def search(
+    q: str,
+    owner: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limit: int = Query(50, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+    raw: bool = False,
+    conn=Depends(get_db_connection),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+):
+    try:
+        return await executor.run(
+            search_transactions,
+            conn,
+            q,
+            owner=owner,
+            date_from=date_from,
+            date_to=date_to,
+            limit=limit,
+            offset=offset,
+            raw=raw,
+        )
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.post(
+    "/admin/rebuild_search",
+    summary="Rebuild the full-text search index",
+    description="""
+    Rebuild the full-text index of transactions, and recreate its triggers if they were dropped. Needed after a VACUUM, which may renumber transaction rowids.
+    Returns the number of rows indexed.
+    """,
+)
+async def admin_rebuild_search(
+    writer: DatabaseWriter = Depends(get_db_writer),
+):
+    try:
+        rows = await writer.run_alone(rebuild_search_index)
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"detail": "Search index rebuilt.", "rows": rows}
+
+
+@app.post(
+    "/admin/backfill",
+    summary="Re-ingest every uploaded statement",
+    description="""
+    Rebuild the transactions table from every CSV and XLSX statement under raw/<year>/<month>/, or only those from since_year/since_month on.
+    Files are parsed in parallel worker processes and written by a single writer committing in large batches. Each statement replaces the rows it loaded before.
+    The backfill runs as a background job: follow it on /jobs/{job_id}, whose result has the number of statements and rows loaded, and the statements that could not be parsed.
+    """,
+)
+async def admin_backfill(
+    request: BackfillRequest,
+    writer: DatabaseWriter = Depends(get_db_writer),
+    queue: JobQueue | None = Depends(get_job_queue),
+):
+    if queue is None:
+        raise HTTPException(status_code=503, detail="The job queue is not running.")
+    since = (
+        [request.since_year, request.since_month]
+        if request.since_year is not None
+        else None
+    )
+    try:
+        job_id = await queue.submit(
+            writer, BACKFILL_JOB, {"since": since, "force": request.force}
         )
-    with save_path.open("wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-    return {"detail": "File uploaded successfully.", "path": str(save_path)}
+    except DatabaseBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return {"detail": "Backfill queued.", "job_id": job_id}
 
 
 # Integrate MCP server
@@ -0,0 +1,311 @@
+import argparse
+import logging
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Iterator, NamedTuple
+
+from database_pkg.catalog import (
+    FileEntry,
+    file_entry,
+    hash_file,
+    is_current,
+    list_files,
+    mark_ingested,
+    record_file,
+)
+from database_pkg.config.schemas import BankEnum, OwnerEnum
+from database_pkg.config.settings import database_settings
+from database_pkg.ingest import (
+    INGESTIBLE_EXTENSIONS,
+    IngestProgress,
+    Row,
+    parse_statement_file,
+    replace_rows,
+)
+from database_pkg.pool import connect
+from database_pkg.schema import ensure_files_table, ensure_transactions_table
+from database_pkg.utils import raw_dir, statement_dir
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_JOB = "backfill"
+
+
+class StatementFile(NamedTuple):
+    path: Path
+    owner: OwnerEnum
+    bank: BankEnum
+    year: int
+    month: int
+    # Path relative to the blob directory, stored in transactions."Source"
+    source: str
+
+
+class BackfillResult(NamedTuple):
+    files: int
+    # Statements whose content was already ingested, per the files catalog
+    skipped: int
+    rows_inserted: int
+    rows_replaced: int
+    commits: int
+    seconds: float
+    # Source of each statement that could not be parsed, with the reason
+    failed: dict[str, str]
+
+
+def parse_since(value: str) -> tuple[int, int]:
+    """Parse a "YYYY-MM" (or "YYYY") lower bound."""
+    year, _, month = value.partition("-")
+    try:
+        since = (int(year), int(month or 1))
+    except ValueError:
+        raise ValueError(f"Invalid since {value!r}. Expected YYYY-MM.")
+    if not 1 <= since[1] <= 12:
+        raise ValueError(f"Invalid since {value!r}. Month must be between 1 and 12.")
+    return since
+
+
+def discover_statements(
+    blob_path: Path | str, since: tuple[int, int] | None = None
+) -> Iterator[StatementFile]:
+    """
+    Yield every ingestible statement under raw/<year>/<month>/, oldest first.
+    Files not named <owner>_<bank>.<csv|xlsx> are skipped.
+    """
+    blob_path = Path(blob_path)
+    raw = raw_dir(blob_path)
+    if not raw.is_dir():
+        return
+    months = sorted(
+        (int(y.name), int(m.name))
+        for y in raw.iterdir()
+        if y.is_dir() and y.name.isdigit()
+        for m in y.iterdir()
+        if m.is_dir() and m.name.isdigit()
+    )
+    for year, month in months:
+        if since is not None and (year, month) < since:
+            continue
+        for path in sorted(statement_dir(blob_path, year, month).iterdir()):
+            if path.suffix.lower().lstrip(".") not in INGESTIBLE_EXTENSIONS:
+                continue
+            owner, _, bank = path.stem.partition("_")
+            try:
+                owner_enum, bank_enum = OwnerEnum(owner), BankEnum(bank)
+            except ValueError:
+                logger.warning(f"Skipping {path}: not an <owner>_<bank> statement")
+                continue
+            yield StatementFile(
+                path,
+                owner_enum,
+                bank_enum,
+                year,
+                month,
+                path.relative_to(blob_path).as_posix(),
+            )
+
+
+def _parse(
+    statement: StatementFile, blob_path: Path | str
+) -> tuple[FileEntry, list[Row]]:
+    entry = file_entry(
+        blob_path,
+        statement.path,
+        statement.owner.value,
+        statement.bank.value,
+        statement.year,
+        statement.month,
+        hash_file(statement.path),
+    )
+    rows = parse_statement_file(
+        statement.path, statement.owner, statement.bank, statement.source
+    )
+    return entry, rows
+
+
+class _Written(NamedTuple):
+    rows_inserted: int
+    rows_replaced: int
+    unchanged: int
+
+
+def _write(
+    conn: sqlite3.Connection,
+    ready: list[tuple[FileEntry, list[Row]]],
+    catalog: dict[str, dict],
+    force: bool,
+    chunk_size: int,
+) -> _Written:
+    """Replace the rows of parsed statements, in one write transaction."""
+    inserted = replaced = unchanged = 0
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for entry, rows in ready:
+            stored = catalog.get(entry.path)
+            if not force and stored and stored["ingested_sha256"] == entry.sha256:
+                # Touched but identical: only refresh size and mtime
+                record_file(conn, entry)
+                unchanged += 1
+                continue
+            result = replace_rows(conn, entry.path, rows, chunk_size)
+            mark_ingested(conn, entry)
+            inserted += result.rows_inserted
+            replaced += result.rows_replaced
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return _Written(inserted, replaced, unchanged)
+
+
+def run_backfill_job(
+    conn: sqlite3.Connection, payload: dict[str, Any], progress: IngestProgress
+) -> dict[str, Any]:
+    """Job handler re-ingesting every statement from the payload's since on."""
+    result = backfill(
+        conn,
+        database_settings.blob_path,
+        since=tuple(payload["since"]) if payload["since"] else None,
+        force=payload["force"],
+        progress=progress,
+    )
+    return result._asdict()
+
+
+def backfill(
+    conn: sqlite3.Connection,
+    blob_path: Path | str,
+    since: tuple[int, int] | None = None,
+    workers: int | None = None,
+    force: bool = False,
+    commit_rows: int | None = None,
+    chunk_size: int | None = None,
+    progress: IngestProgress | None = None,
+) -> BackfillResult:
+    """
+    Re-ingest every statement under `blob_path`, optionally from `since` on.
+
+    Files are parsed concurrently in a process pool. Parsed rows funnel back
+    to this process, the single writer. Once at least `commit_rows` parsed
+    rows are pending, it replaces their statements' rows in one short write
+    transaction, so the write lock is never held while waiting for the
+    parsers. A statement
+    that fails to parse is reported in the result and the others still load.
+
+    Statements whose content is already loaded, per the files catalog, are
+    skipped unless `force` is set. Those whose size and mtime still match
+    the catalog are not even read. Settings provide the defaults of
+    `workers`, `commit_rows` and `chunk_size`. Rows parsed and written so
+    far are counted in `progress`.
+    """
+    start = time.perf_counter()
+    commit_rows = commit_rows or database_settings.backfill_commit_rows
+    chunk_size = chunk_size or database_settings.ingest_chunk_size
+    progress = progress or IngestProgress()
+    catalog = {entry["path"]: entry for entry in list_files(conn)}
+    statements: list[StatementFile] = []
+    skipped = 0
+    for statement in discover_statements(blob_path, since):
+        entry = catalog.get(statement.source)
+        stat = statement.path.stat()
+        if (
+            not force
+            and is_current(entry, stat.st_size, stat.st_mtime)
+            and entry["ingested_sha256"] == entry["sha256"]
+        ):
+            skipped += 1
+        else:
+            statements.append(statement)
+    workers = workers or database_settings.backfill_workers or os.cpu_count() or 1
+    workers = min(workers, max(len(statements), 1))
+    inserted = replaced = pending = commits = unchanged = 0
+    failed: dict[str, str] = {}
+
+    ensure_transactions_table(conn)
+    ensure_files_table(conn)
+    conn.commit()
+    # Spawned, not forked: the caller may be a multi-threaded server
+    context = multiprocessing.get_context("spawn")
+    # Parsed statements waiting for the next write transaction
+    ready: list[tuple[FileEntry, list[Row]]] = []
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+        futures = {pool.submit(_parse, s, blob_path): s for s in statements}
+        try:
+            for future in as_completed(futures):
+                source = futures[future].source
+                try:
+                    entry, rows = future.result()
+                except Exception as e:
+                    logger.warning(f"Could not parse {source}: {e}")
+                    failed[source] = str(e)
+                    continue
+                ready.append((entry, rows))
+                pending += len(rows)
+                progress.rows_parsed += len(rows)
+                if pending >= commit_rows:
+                    written = _write(conn, ready, catalog, force, chunk_size)
+                    inserted += written.rows_inserted
+                    replaced += written.rows_replaced
+                    unchanged += written.unchanged
+                    commits += 1
+                    progress.rows_inserted = inserted
+                    ready, pending = [], 0
+            if ready:
+                written = _write(conn, ready, catalog, force, chunk_size)
+                inserted += written.rows_inserted
+                replaced += written.rows_replaced
+                unchanged += written.unchanged
+                commits += 1
+                progress.rows_inserted = inserted
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    seconds = time.perf_counter() - start
+    loaded = len(statements) - len(failed) - unchanged
+    skipped += unchanged
+    logger.info(
+        f"Backfilled {loaded} statements, {inserted} rows in {seconds:.1f}s "
+        f"with {workers} workers ({skipped} unchanged statements skipped)"
+    )
+    return BackfillResult(loaded, skipped, inserted, replaced, commits, seconds, failed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Re-ingest every statement under blob/<env>/raw into the database."
+    )
+    parser.add_argument(
+        "--since", type=parse_since, default=None, help="First month, as YYYY-MM."
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-ingest statements even if the files catalog says they are loaded.",
+    )
+    args = parser.parse_args()
+
+    conn = connect(database_settings.sqlite_path)
+    try:
+        result = backfill(
+            conn,
+            database_settings.blob_path,
+            since=args.since,
+            workers=args.workers,
+            force=args.force,
+        )
+    finally:
+        conn.close()
+    print(
+        f"{result.files} statements, {result.rows_inserted} rows inserted "
+        f"({result.rows_replaced} replaced), {result.commits} commits "
+        f"in {result.seconds:.1f}s, {result.skipped} unchanged statements skipped"
+    )
+    for source, error in result.failed.items():
+        print(f"FAILED {source}: {error}")
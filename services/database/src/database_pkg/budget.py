@@ -0,0 +1,108 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+# SQLite VM instructions run between two checks of a query's budgets: a
+# check every 10000 costs under 1% of a long query, and a fraction of a ms
+PROGRESS_INTERVAL = 10_000
+
+
+class QueryBudgetError(RuntimeError):
+    """Raised when a query is aborted for going over one of its budgets."""
+
+
+class QueryTimeoutError(QueryBudgetError):
+    """The query ran for longer, or for more VM steps, than allowed."""
+
+
+class ResultTooLargeError(QueryBudgetError):
+    """The query returned more rows, or more bytes, than allowed."""
+
+
+class QueryCancelledError(QueryBudgetError):
+    """The query was cancelled, its client having gone away."""
+
+
+class QueryBudget:
+    """
+    Limits on the work done for one query; 0 disables a limit.
+
+    `timeout` bounds the time spent running statements and `max_steps` the
+    SQLite VM instructions they execute. Both are checked every
+    PROGRESS_INTERVAL instructions by a progress handler installed while
+    `applied`, which aborts the running statement once either is exceeded
+    or `cancel` has been called: cancellation is cooperative, and safe from
+    any thread. `max_rows` and `max_bytes` bound a buffered result.
+    """
+
+    def __init__(
+        self, timeout: float, max_steps: int, max_rows: int, max_bytes: int
+    ) -> None:
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.max_rows = max_rows
+        self.max_bytes = max_bytes
+        self.steps = 0
+        self.elapsed = 0.0
+        self._started: float | None = None
+        self._cancelled = False
+        self._error: QueryBudgetError | None = None
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    @contextmanager
+    def applied(self, conn: sqlite3.Connection) -> Iterator[None]:
+        """
+        Enforce the time and step budgets on statements run on `conn` in
+        this block, raising a QueryBudgetError for the one they exceed.
+        """
+        if self._cancelled:
+            raise QueryCancelledError("Query cancelled: the client went away.")
+        self._error = None
+        self._started = time.monotonic()
+        conn.set_progress_handler(self._progress, PROGRESS_INTERVAL)
+        try:
+            yield
+        except sqlite3.Error as e:
+            if self._error is not None:
+                raise self._error from e
+            raise
+        finally:
+            conn.set_progress_handler(None, 0)
+            self.elapsed += time.monotonic() - self._started
+            self._started = None
+
+    def check_rows(self, rows: int) -> None:
+        if self.max_rows and rows > self.max_rows:
+            raise ResultTooLargeError(
+                f"Query returned more than {self.max_rows} rows. "
+                "Narrow it down, or page or stream its results."
+            )
+
+    def check_bytes(self, size: int) -> None:
+        if self.max_bytes and size > self.max_bytes:
+            raise ResultTooLargeError(
+                f"Query result is larger than {self.max_bytes} bytes. "
+                "Narrow it down, or page or stream its results."
+            )
+
+    def _progress(self) -> bool:
+        # Runs on the thread executing the statement: a true return aborts it
+        self.steps += PROGRESS_INTERVAL
+        if self._cancelled:
+            self._error = QueryCancelledError("Query cancelled: the client went away.")
+        elif self.max_steps and self.steps > self.max_steps:
+            self._error = QueryTimeoutError(
+                f"Query exceeded its budget of {self.max_steps} SQLite VM steps."
+            )
+        elif (
+            self.timeout
+            and self._started is not None
+            and self.elapsed + time.monotonic() - self._started > self.timeout
+        ):
+            self._error = QueryTimeoutError(
+                f"Query exceeded its time budget of {self.timeout:g}s."
+            )
+        return self._error is not None
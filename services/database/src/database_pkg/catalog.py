@@ -0,0 +1,196 @@
+import hashlib
+import sqlite3
+from pathlib import Path
+from typing import Any, BinaryIO, Iterable, NamedTuple
+
+from database_pkg.schema import FILES_TABLE, ensure_files_table, table_exists
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+UPSERT_FILE = """
+INSERT INTO "files" (
+    "path", "owner", "bank", "year", "month", "ext", "size", "mtime", "sha256",
+    "uploaded_at"
+)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, datetime('now'))
+ON CONFLICT ("path") DO UPDATE SET
+    "owner" = excluded."owner",
+    "bank" = excluded."bank",
+    "year" = excluded."year",
+    "month" = excluded."month",
+    "ext" = excluded."ext",
+    "size" = excluded."size",
+    "mtime" = excluded."mtime",
+    "uploaded_at" = CASE
+        WHEN "sha256" = excluded."sha256" THEN "uploaded_at"
+        ELSE excluded."uploaded_at"
+    END,
+    "sha256" = excluded."sha256"
+"""
+
+
+class FileEntry(NamedTuple):
+    """A statement file as recorded in the files catalog."""
+
+    # Relative to the blob directory
+    path: str
+    owner: str
+    bank: str
+    year: int
+    month: int
+    ext: str
+    size: int
+    mtime: float
+    sha256: str
+
+
+def hash_fileobj(f: BinaryIO) -> str:
+    digest = hashlib.sha256()
+    while chunk := f.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def hash_file(path: Path) -> str:
+    with path.open("rb") as f:
+        return hash_fileobj(f)
+
+
+def get_entry(conn: sqlite3.Connection, path: str) -> dict[str, Any] | None:
+    if not table_exists(conn, FILES_TABLE):
+        return None
+    cursor = conn.execute('SELECT * FROM "files" WHERE "path" = ?', (path,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    return dict(zip([c[0] for c in cursor.description], row))
+
+
+def get_entries(
+    conn: sqlite3.Connection, paths: Iterable[str]
+) -> dict[str, dict[str, Any]]:
+    """Catalog entries of `paths` that are recorded, keyed by path."""
+    entries = {}
+    for path in paths:
+        entry = get_entry(conn, path)
+        if entry is not None:
+            entries[path] = entry
+    return entries
+
+
+def is_current(entry: dict[str, Any] | None, size: int, mtime: float) -> bool:
+    """Whether a catalog entry still describes a file of this size and mtime."""
+    return entry is not None and entry["size"] == size and entry["mtime"] == mtime
+
+
+def file_entry(
+    blob_path: Path | str,
+    path: Path,
+    owner: str,
+    bank: str,
+    year: int,
+    month: int,
+    sha256: str,
+) -> FileEntry:
+    stat = path.stat()
+    return FileEntry(
+        path.relative_to(blob_path).as_posix(),
+        owner,
+        bank,
+        year,
+        month,
+        path.suffix.lower().lstrip("."),
+        stat.st_size,
+        stat.st_mtime,
+        sha256,
+    )
+
+
+def describe_file(
+    conn: sqlite3.Connection,
+    blob_path: Path | str,
+    path: Path,
+    owner: str,
+    bank: str,
+    year: int,
+    month: int,
+) -> FileEntry:
+    """
+    Build the catalog entry of a file on disk. Its hash is taken from the
+    catalog when size and mtime have not changed, so the file is not read.
+    """
+    stat = path.stat()
+    entry = get_entry(conn, path.relative_to(blob_path).as_posix())
+    if is_current(entry, stat.st_size, stat.st_mtime):
+        sha256 = entry["sha256"]
+    else:
+        sha256 = hash_file(path)
+    return file_entry(blob_path, path, owner, bank, year, month, sha256)
+
+
+def record_file(conn: sqlite3.Connection, entry: FileEntry) -> None:
+    """Insert or update a catalog entry. Caller owns the transaction."""
+    ensure_files_table(conn)
+    conn.execute(UPSERT_FILE, entry)
+
+
+def record_files(conn: sqlite3.Connection, entries: Iterable[FileEntry]) -> None:
+    """Insert or update catalog entries. Caller owns the transaction."""
+    for entry in entries:
+        record_file(conn, entry)
+
+
+def save_entries(conn: sqlite3.Connection, entries: Iterable[FileEntry]) -> None:
+    """Insert or update catalog entries in a single transaction."""
+    try:
+        record_files(conn, entries)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def mark_ingested(conn: sqlite3.Connection, entry: FileEntry) -> None:
+    """
+    Record that `entry`'s content is now loaded in transactions.
+    Meant to run in the same transaction as the rows themselves.
+    """
+    record_file(conn, entry)
+    conn.execute(
+        """
+        UPDATE "files" SET "ingested_sha256" = ?, "ingested_at" = datetime('now')
+        WHERE "path" = ?
+        """,
+        (entry.sha256, entry.path),
+    )
+
+
+def is_ingested(conn: sqlite3.Connection, entry: FileEntry) -> bool:
+    """Whether this exact content was already loaded into transactions."""
+    stored = get_entry(conn, entry.path)
+    return stored is not None and stored["ingested_sha256"] == entry.sha256
+
+
+def list_files(
+    conn: sqlite3.Connection,
+    year: int | None = None,
+    month: int | None = None,
+    owner: str | None = None,
+    bank: str | None = None,
+) -> list[dict[str, Any]]:
+    """Catalog entries matching the given filters, oldest month first."""
+    if not table_exists(conn, FILES_TABLE):
+        return []
+    filters = {"year": year, "month": month, "owner": owner, "bank": bank}
+    where = [
+        f'"{column}" = ?' for column, value in filters.items() if value is not None
+    ]
+    params = [value for value in filters.values() if value is not None]
+    cursor = conn.execute(
+        'SELECT * FROM "files"'
+        + (" WHERE " + " AND ".join(where) if where else "")
+        + ' ORDER BY "year", "month", "path"',
+        params,
+    )
+    names = [c[0] for c in cursor.description]
+    return [dict(zip(names, row)) for row in cursor.fetchall()]
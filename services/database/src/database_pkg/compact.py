@@ -0,0 +1,183 @@
+import argparse
+import logging
+import sqlite3
+from typing import Any
+
+from database_pkg.config.settings import database_settings
+from database_pkg.pool import connect
+from database_pkg.schema import (
+    COMPACT_SUMMARY_TRIGGERS,
+    DICTIONARIES,
+    MINOR_UNITS,
+    MONTHLY_SUMMARY_DDL,
+    REBUILD_MONTHLY_SUMMARY,
+    SEARCH_TABLE,
+    TRANSACTION_COLUMNS,
+    compact_insert_select,
+    count_view_changes,
+    create_compact_schema,
+    ensure_search_index,
+    ensure_transactions_indexes,
+    ensure_transactions_table,
+    is_compact,
+    is_partitioned,
+    table_exists,
+)
+
+logger = logging.getLogger(__name__)
+
+# Values the compact schema cannot store: dates SQLite does not parse, and
+# amounts or fees that are not numbers. Each would be stored as NULL or 0.
+UNCONVERTIBLE = """
+SELECT "rowid" FROM "transactions"
+WHERE ("Started Date" IS NOT NULL AND strftime('%s', "Started Date") IS NULL)
+    OR ("Completed Date" IS NOT NULL AND strftime('%s', "Completed Date") IS NULL)
+    OR typeof("Amount") NOT IN ('integer', 'real', 'null')
+    OR typeof("Fee") NOT IN ('integer', 'real', 'null')
+ORDER BY "rowid"
+"""
+
+# Values the compact schema would change: dates not read back as the same
+# text (without a time, with a time zone or fractions of a second), and
+# amounts or fees that are not whole cents, which would be rounded
+INEXACT = f"""
+SELECT "rowid" FROM "transactions"
+WHERE ("Started Date" IS NOT NULL AND datetime("Started Date") IS NOT "Started Date")
+    OR ("Completed Date" IS NOT NULL
+        AND datetime("Completed Date") IS NOT "Completed Date")
+    OR abs("Amount" * {MINOR_UNITS} - round("Amount" * {MINOR_UNITS})) > 1e-6
+    OR abs("Fee" * {MINOR_UNITS} - round("Fee" * {MINOR_UNITS})) > 1e-6
+ORDER BY "rowid"
+"""
+
+# Rowids listed in the error of a refused migration
+MAX_LISTED_ROWS = 10
+
+
+def _check_rows(conn: sqlite3.Connection, query: str, problem: str) -> None:
+    rowids = [row[0] for row in conn.execute(query)]
+    if rowids:
+        listed = ", ".join(str(rowid) for rowid in rowids[:MAX_LISTED_ROWS])
+        more = "..." if len(rowids) > MAX_LISTED_ROWS else ""
+        raise ValueError(
+            f"{len(rowids)} transactions have {problem} (rowids {listed}{more})."
+        )
+
+
+def migrate_to_compact(conn: sqlite3.Connection, force: bool = False) -> dict[str, Any]:
+    """
+    Move the transactions table to the compact schema in one transaction.
+    Rows keep their rowid, which only the transaction_rows view shows, and
+    the full-text index is rebuilt to read them through it. Refuses
+    tables with other columns than TRANSACTION_COLUMNS, or with values the
+    compact schema cannot store. Unless `force` is set, also refuses values
+    it would read back differently: amounts in fractions of a cent, and
+    dates not formatted as "YYYY-MM-DD HH:MM:SS". Returns the number of
+    rows and of names in each dictionary table.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if is_compact(conn):
+            raise ValueError("The database already uses the compact schema.")
+        if is_partitioned(conn):
+            raise ValueError("Partitioned databases cannot use the compact schema.")
+        if not table_exists(conn, "transactions"):
+            raise ValueError("There is no transactions table to migrate.")
+        ensure_transactions_table(conn)
+        columns = [row[1] for row in conn.execute('PRAGMA table_info("transactions")')]
+        if columns != TRANSACTION_COLUMNS:
+            raise ValueError(
+                f"The transactions table has columns {columns}, "
+                f"expected {TRANSACTION_COLUMNS}."
+            )
+        _check_rows(
+            conn,
+            UNCONVERTIBLE,
+            "dates, amounts or fees the compact schema cannot store",
+        )
+        if not force:
+            _check_rows(
+                conn,
+                INEXACT,
+                "dates or amounts the compact schema would change; "
+                "use force to round them",
+            )
+        rows = conn.execute('SELECT count(*) FROM "transactions"').fetchone()[0]
+
+        conn.execute('ALTER TABLE "transactions" RENAME TO "transactions_old"')
+        # The old table's triggers and indexes follow it, and go with it
+        create_compact_schema(conn)
+        for column, (table, _) in DICTIONARIES.items():
+            conn.execute(
+                f'INSERT OR IGNORE INTO "{table}" ("name") '
+                f'SELECT DISTINCT "{column}" FROM "transactions_old" '
+                f'WHERE "{column}" IS NOT NULL ORDER BY "{column}"'
+            )
+        conn.execute(
+            compact_insert_select('"t"')
+            + ' FROM (SELECT "rowid" AS "rowid", * FROM "transactions_old") AS "t"'
+        )
+        conn.execute('DROP TABLE "transactions_old"')
+
+        migrated = conn.execute('SELECT count(*) FROM "transactions"').fetchone()[0]
+        if migrated != rows:
+            raise RuntimeError(f"Migrated {migrated} of {rows} transactions.")
+
+        ensure_transactions_indexes(conn)
+        # Amounts are now rounded to cents: recount the summary from them
+        conn.execute(MONTHLY_SUMMARY_DDL)
+        for ddl in COMPACT_SUMMARY_TRIGGERS.values():
+            conn.execute(ddl)
+        conn.execute('DELETE FROM "monthly_summary"')
+        conn.execute(REBUILD_MONTHLY_SUMMARY)
+        # The index reads its text from transactions, which has no rowid now
+        conn.execute(f'DROP TABLE IF EXISTS "{SEARCH_TABLE}"')
+        ensure_search_index(conn)
+        stats = {
+            "rows": rows,
+            **{
+                table: conn.execute(f'SELECT count(*) FROM "{table}"').fetchone()[0]
+                for table, _ in DICTIONARIES.values()
+            },
+        }
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    count_view_changes(conn)
+    logger.info(f"Migrated {rows} transactions to the compact schema")
+    return stats
+
+
+def database_size(conn: sqlite3.Connection) -> int:
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return page_size * conn.execute("PRAGMA page_count").fetchone()[0]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Move transactions to the compact schema. Stop the service first."
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Round amounts to the cent and dates to the second instead of refusing.",
+    )
+    parser.add_argument(
+        "--no-vacuum",
+        action="store_true",
+        help="Leave the space freed by the old table to be reused, unreturned.",
+    )
+    args = parser.parse_args()
+
+    conn = connect(database_settings.sqlite_path)
+    try:
+        before = database_size(conn)
+        stats = migrate_to_compact(conn, force=args.force)
+        if not args.no_vacuum:
+            conn.execute("VACUUM")
+        after = database_size(conn)
+    finally:
+        conn.close()
+    print(f"Migrated to the compact schema: {stats}")
+    print(f"Database size: {before / 1e6:.1f} MB -> {after / 1e6:.1f} MB")
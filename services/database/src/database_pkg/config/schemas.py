@@ -1,5 +1,7 @@
 from enum import Enum
-from pydantic import BaseModel, ConfigDict
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict, Field, model_validator
 
 
 # Enum for allowed APP_ENV values
@@ -32,10 +34,94 @@ class ExtensionEnum(str, Enum):
     XLS = "xls"
 
 
+# Enum for allowed /execute_sql result formats
+class ResultFormatEnum(str, Enum):
+    ROWS = "rows"
+    COLUMNS = "columns"
+    ARROW = "arrow"
+
+
+# Enum for background job states
+class JobStatusEnum(str, Enum):
+    QUEUED = "queued"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
 # Pydantic schemas
 class SQLQuery(BaseModel):
     query: str
+    # Values bound to "?" (list) or ":name" (dict) placeholders in `query`
+    params: list[Any] | dict[str, Any] | None = None
+    # Keyset pagination: rows are ordered by `page_key` and each page resumes
+    # after the last key of the previous one, passed back as `cursor`.
+    page_size: int | None = Field(default=None, ge=1)
+    page_key: str | None = None
+    cursor: str | None = None
+    # "rows": one dict per row. "columns": column names once, then row arrays.
+    # "arrow": Apache Arrow IPC stream (requires the optional pyarrow extra).
+    format: ResultFormatEnum = ResultFormatEnum.ROWS
+    # Set to false for SELECTs whose result is not a function of the data
+    # alone (random(), date('now'), ...) so they are never served from cache.
+    cache: bool = True
     # For documentation purposes, provides example values
     model_config = ConfigDict(
-        json_schema_extra={"example": {"query": "SELECT * FROM my_table"}}
+        json_schema_extra={
+            "example": {
+                "query": 'SELECT * FROM transactions WHERE "Completed Date" >= ?',
+                "params": ["2025-08-01"],
+            }
+        }
+    )
+
+
+class SQLStatement(BaseModel):
+    query: str
+    params: list[Any] | dict[str, Any] | None = None
+
+
+class SQLBatch(BaseModel):
+    # Either a list of statements, each run once...
+    statements: list[SQLStatement] | None = None
+    # ...or one statement run once per parameter set with executemany
+    query: str | None = None
+    param_sets: list[list[Any] | dict[str, Any]] | None = None
+    model_config = ConfigDict(
+        json_schema_extra={
+            "example": {
+                "query": 'UPDATE transactions SET "QUI" = ? WHERE rowid = ?',
+                "param_sets": [["G", 1], ["N", 2]],
+            }
+        }
     )
+
+    @model_validator(mode="after")
+    def check_one_mode(self) -> "SQLBatch":
+        if (self.statements is None) == (self.query is None):
+            raise ValueError("Provide either statements or query, not both.")
+        if self.query is not None and self.param_sets is None:
+            raise ValueError("param_sets is required with query.")
+        return self
+
+
+class StatementRef(BaseModel):
+    """Identifies an uploaded statement file."""
+
+    owner: OwnerEnum
+    year: int = Field(ge=1900, le=2100)
+    month: int = Field(ge=1, le=12)
+    bank: BankEnum
+
+
+class IngestRequest(StatementRef):
+    # Re-ingest even if the files catalog records this content as loaded
+    force: bool = False
+
+
+class BackfillRequest(BaseModel):
+    # Only statements from this month on are re-ingested; all when omitted
+    since_year: int | None = Field(default=None, ge=1900, le=2100)
+    since_month: int = Field(default=1, ge=1, le=12)
+    # Re-ingest statements the files catalog already records as loaded
+    force: bool = False
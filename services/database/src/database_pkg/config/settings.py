@@ -13,6 +13,67 @@ class DatabaseSettings(BaseSettings):
     LOCAL_DATABASES_DIR: str
     app_env: AppEnvEnum = Field(default=AppEnvEnum.LOCAL)
 
+    # SQLite connection pool and per-connection tuning
+    db_pool_size: int = Field(default=4, ge=1)
+    db_pool_timeout: float = Field(default=10.0, gt=0)
+    sqlite_synchronous: str = Field(
+        default="NORMAL", pattern="^(OFF|NORMAL|FULL|EXTRA)$"
+    )
+    sqlite_cache_size_kib: int = Field(default=16384, ge=0)
+    sqlite_mmap_size: int = Field(default=268435456, ge=0)
+    sqlite_statement_cache_size: int = Field(default=256, ge=0)
+
+    # Read-only connections serving queries (None: one per core), and the
+    # single writer: writes grouped per commit and writes allowed to wait
+    db_reader_pool_size: int | None = Field(default=None, ge=1)
+    db_writer_max_batch: int = Field(default=100, ge=1)
+    db_writer_queue_depth: int = Field(default=1000, ge=1)
+
+    # Thread pool running blocking database work off the event loop (None:
+    # one per reader connection and per job worker)
+    db_executor_workers: int | None = Field(default=None, ge=1)
+    db_executor_queue_depth: int = Field(default=32, ge=0)
+
+    # Size of the in-process SELECT result cache, 0 disables it
+    result_cache_max_bytes: int = Field(default=64 * 1024 * 1024, ge=0)
+
+    # Distinct SELECTs whose query plan is kept by the index advisor, 0 disables it
+    index_advisor_max_queries: int = Field(default=500, ge=0)
+
+    # Budgets of each /execute_sql query, 0 disables one: seconds spent
+    # running, SQLite VM steps, and rows and bytes of a buffered result
+    query_timeout: float = Field(default=30.0, ge=0)
+    query_max_steps: int = Field(default=1_000_000_000, ge=0)
+    query_max_rows: int = Field(default=1_000_000, ge=0)
+    query_max_bytes: int = Field(default=256 * 1024 * 1024, ge=0)
+
+    # /execute_sql queries running for at least this many seconds are logged
+    # with their plan (0 disables the log); the last slow_query_log_size are
+    # kept in memory, and all appended to slow_query_log_path
+    slow_query_threshold: float = Field(default=0.5, ge=0)
+    slow_query_log_size: int = Field(default=1000, ge=1)
+
+    # Rows fetched per chunk when streaming results
+    stream_chunk_size: int = Field(default=1000, ge=1)
+
+    # Rows parsed and inserted per executemany batch when ingesting statements
+    ingest_chunk_size: int = Field(default=5000, ge=1)
+
+    # Uploads are copied in chunks of this size; larger ones are refused (413)
+    upload_chunk_size: int = Field(default=1024 * 1024, ge=1)
+    upload_max_bytes: int = Field(default=50 * 1024 * 1024, ge=1)
+    # Files of one bulk upload written at the same time
+    upload_concurrency: int = Field(default=4, ge=1)
+    # Largest /upload_files request, all files included
+    upload_request_max_bytes: int = Field(default=200 * 1024 * 1024, ge=1)
+
+    # Background workers running queued ingestion jobs
+    job_workers: int = Field(default=2, ge=0)
+
+    # Backfill: parser processes (None: one per core) and rows per commit
+    backfill_workers: int | None = Field(default=None, ge=1)
+    backfill_commit_rows: int = Field(default=50000, ge=1)
+
     model_config = SettingsConfigDict(env_file=".env", extra="ignore")
 
     @property
@@ -43,6 +104,10 @@ class DatabaseSettings(BaseSettings):
         else:
             return self.db_path / "SQL" / "dev.db"
 
+    @property
+    def slow_query_log_path(self) -> Path:
+        return self.sqlite_path.with_suffix(".slow_queries.jsonl")
+
     @property
     def excel_path(self) -> Path:
         return self.blob_path / "Legacy" / "REVOLUT AVRIL 2025.xlsx"
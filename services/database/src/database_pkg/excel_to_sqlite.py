@@ -1,8 +1,21 @@
+import argparse
+import multiprocessing
+import os
 import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time
+from itertools import batched, chain, islice
 from pathlib import Path
+from typing import Any, Iterable, Iterator
+
 import pandas as pd
 
 from database_pkg.config.settings import database_settings
+from database_pkg.pool import connect
+from database_pkg.queries import quote_identifier
+
+# Rows read from the top of each sheet to pick the column types
+TYPE_SAMPLE_ROWS = 1000
 
 
 def excel_to_sqlite(excel_path: Path, sqlite_path: Path, table_name: str) -> None:
@@ -26,10 +39,172 @@ def excel_to_sqlite(excel_path: Path, sqlite_path: Path, table_name: str) -> Non
     conn.close()
 
 
+def column_headers(row: Iterable[Any]) -> list[str]:
+    """Header names as pandas would build them: "Unnamed: i" and ".1" suffixes."""
+    headers: list[str] = []
+    seen: dict[str, int] = {}
+    for i, value in enumerate(row):
+        name = f"Unnamed: {i}" if value is None or value == "" else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        headers.append(name)
+    return headers
+
+
+def infer_column_type(values: Iterable[Any]) -> str:
+    """SQLite column type for a sample of cell values, as pandas' to_sql picks it."""
+    found = {type(v) for v in values if v is not None}
+    if not found:
+        return "TEXT"
+    if found <= {bool, int}:
+        return "INTEGER"
+    if found <= {bool, int, float}:
+        return "REAL"
+    if found <= {datetime, date}:
+        return "TIMESTAMP"
+    return "TEXT"
+
+
+def to_sqlite_value(value: Any) -> Any:
+    # Dates are stored as text, in the same format pandas writes
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d 00:00:00")
+    if isinstance(value, time):
+        return value.strftime("%H:%M:%S")
+    return value
+
+
+def _sheet_rows(excel_path: Path, sheet: str) -> Iterator[tuple[Any, ...]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(excel_path, read_only=True, data_only=True)
+    try:
+        yield from workbook[sheet].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def load_sheet(excel_path: Path, sqlite_path: Path, sheet: str, chunk_size: int) -> int:
+    """
+    Stream one sheet into a table of the same name and return its row count.
+
+    Rows go to a staging table in `chunk_size` executemany batches, each in
+    its own short write transaction so that sheets loaded by other processes
+    can interleave. The staging table then replaces the old one in a single
+    transaction, so readers never see a half-loaded table.
+    """
+    rows = _sheet_rows(excel_path, sheet)
+    header = next(rows, None)
+    if header is None:
+        return 0
+    headers = column_headers(header)
+    width = len(headers)
+    # Trailing blank rows are common in hand-edited workbooks
+    rows = (row for row in rows if any(v is not None for v in row))
+    sample = list(islice(rows, TYPE_SAMPLE_ROWS))
+    types = [
+        infer_column_type(row[i] for row in sample if i < len(row))
+        for i in range(width)
+    ]
+
+    table = quote_identifier(sheet)
+    staging = quote_identifier(f"{sheet}__loading")
+    columns = ", ".join(
+        f"{quote_identifier(name)} {type_}" for name, type_ in zip(headers, types)
+    )
+    insert = f"INSERT INTO {staging} VALUES ({', '.join('?' * width)})"
+
+    conn = connect(sqlite_path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.execute(f"CREATE TABLE {staging} ({columns})")
+        conn.commit()
+        loaded = 0
+        for chunk in batched(chain(sample, rows), chunk_size):
+            values = [
+                tuple(to_sqlite_value(v) for v in (row + (None,) * width)[:width])
+                for row in chunk
+            ]
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(insert, values)
+            conn.commit()
+            loaded += len(values)
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute(f"DROP TABLE IF EXISTS {table}")
+        conn.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        conn.execute(f"DROP TABLE IF EXISTS {staging}")
+        conn.commit()
+        raise
+    finally:
+        conn.close()
+    return loaded
+
+
+def excel_to_sqlite_streaming(
+    excel_path: Path,
+    sqlite_path: Path,
+    chunk_size: int = database_settings.ingest_chunk_size,
+    workers: int | None = None,
+) -> dict[str, int]:
+    """
+    Load all sheets from an Excel file into a SQLite database, in constant
+    memory. Sheets are read with openpyxl in read-only mode and loaded in
+    parallel worker processes. Returns the row count of each sheet.
+    """
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(excel_path, read_only=True)
+    sheets = workbook.sheetnames
+    workbook.close()
+
+    workers = min(workers or os.cpu_count() or 1, len(sheets))
+    if workers <= 1:
+        counts = [load_sheet(excel_path, sqlite_path, s, chunk_size) for s in sheets]
+    else:
+        # Spawned, not forked: the caller may be a multi-threaded server
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            futures = [
+                pool.submit(load_sheet, excel_path, sqlite_path, s, chunk_size)
+                for s in sheets
+            ]
+            counts = [future.result() for future in futures]
+
+    for sheet, count in zip(sheets, counts):
+        print(
+            f"Sheet '{sheet}' from {excel_path} loaded into {sqlite_path} "
+            f"(table: {sheet}, {count} rows)"
+        )
+    return dict(zip(sheets, counts))
+
+
 if __name__ == "__main__":
-    # table_name argument is ignored when loading all sheets
-    excel_to_sqlite(
-        database_settings.excel_path,
-        database_settings.sqlite_path,
-        database_settings.table_name,
+    parser = argparse.ArgumentParser(description="Load a legacy workbook into SQLite.")
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Stream sheets with openpyxl in parallel processes instead of pandas.",
     )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.stream:
+        excel_to_sqlite_streaming(
+            database_settings.excel_path,
+            database_settings.sqlite_path,
+            workers=args.workers,
+        )
+    else:
+        # table_name argument is ignored when loading all sheets
+        excel_to_sqlite(
+            database_settings.excel_path,
+            database_settings.sqlite_path,
+            database_settings.table_name,
+        )
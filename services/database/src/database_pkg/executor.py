@@ -0,0 +1,75 @@
+import logging
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+import anyio
+import anyio.to_thread
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class DatabaseBusyError(RuntimeError):
+    """Raised when the database executor has no room left for new work."""
+
+
+class DatabaseExecutor:
+    """
+    Bounded executor for blocking database work.
+    At most `max_workers` calls run at once on worker threads, and at most
+    `queue_depth` more wait for a slot; anything beyond that is rejected.
+    Calls that only wait, such as checking out a pooled connection, run with
+    wait_for() on threads of their own instead.
+    A call that is cancelled still waits for its thread to finish, so the
+    connection it was using is never handed back while still in use.
+    """
+
+    def __init__(self, max_workers: int, queue_depth: int) -> None:
+        self.max_workers = max_workers
+        self.queue_depth = queue_depth
+        self._limiter = anyio.CapacityLimiter(max_workers)
+        self._waiters = anyio.CapacityLimiter(max_workers + queue_depth)
+        self._pending = 0
+
+    @property
+    def pending(self) -> int:
+        """Calls currently running or waiting for a worker."""
+        return self._pending
+
+    @property
+    def saturated(self) -> bool:
+        return self._pending >= self.max_workers + self.queue_depth
+
+    async def run(
+        self, fn: Callable[..., T], *args: Any, wait: bool = False, **kwargs: Any
+    ) -> T:
+        """
+        Run `fn(*args, **kwargs)` on a database worker thread.
+        Raise DatabaseBusyError when saturated, unless `wait` is set.
+        """
+        return await self._run(partial(fn, *args, **kwargs), self._limiter, wait)
+
+    async def wait_for(
+        self, fn: Callable[..., T], *args: Any, wait: bool = False, **kwargs: Any
+    ) -> T:
+        """
+        Like run(), but for a call that blocks waiting on other database
+        work, such as checking a connection out of a pool: it must not hold
+        a worker, or the work that would end the wait could never run.
+        """
+        return await self._run(partial(fn, *args, **kwargs), self._waiters, wait)
+
+    async def _run(
+        self, call: Callable[[], T], limiter: anyio.CapacityLimiter, wait: bool
+    ) -> T:
+        if not wait and self.saturated:
+            logger.warning(
+                f"Database executor saturated ({self._pending} calls pending)"
+            )
+            raise DatabaseBusyError("Database is busy. Retry later.")
+        self._pending += 1
+        try:
+            return await anyio.to_thread.run_sync(call, limiter=limiter)
+        finally:
+            self._pending -= 1
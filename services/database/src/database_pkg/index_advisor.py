@@ -0,0 +1,186 @@
+import logging
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any
+
+from database_pkg.schema import (
+    COMPACT_TABLE,
+    TRANSACTION_COLUMNS,
+    TRANSACTIONS_TABLE,
+    compact_indexed_column,
+    transactions_schemas,
+    transactions_storage,
+)
+from database_pkg.sql_text import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# Plan steps that read a whole table: full scans, and automatic indexes
+# SQLite builds for the duration of a single query
+SCAN_STEP = re.compile(r"^SCAN [^\s(]+$")
+AUTOMATIC_INDEX_STEP = re.compile(r"USING AUTOMATIC (PARTIAL )?(COVERING )?INDEX")
+
+# Clauses whose columns an index can serve
+FILTER_CLAUSE = re.compile(
+    r"\b(WHERE|ON|ORDER BY|GROUP BY)\b(.*?)(?=\b(LIMIT|HAVING|UNION|WINDOW)\b|$)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+@dataclass
+class ObservedQuery:
+    query: str
+    count: int = 0
+    plan: list[str] | None = None
+    # Plan steps reading a whole table
+    scans: list[str] = field(default_factory=list)
+
+
+def filter_columns(query: str, columns: list[str] = TRANSACTION_COLUMNS) -> list[str]:
+    """Known columns used in the WHERE, ON, ORDER BY and GROUP BY clauses."""
+    clauses = " ".join(m.group(2) for m in FILTER_CLAUSE.finditer(query))
+    found = []
+    for column in columns:
+        quoted = re.escape(f'"{column}"')
+        bare = r"\b" + re.escape(column) + r"\b" if " " not in column else None
+        pattern = quoted if bare is None else f"{quoted}|{bare}"
+        match = re.search(pattern, clauses, re.IGNORECASE)
+        if match:
+            found.append((match.start(), column))
+    return [column for _, column in sorted(found)]
+
+
+def full_scans(plan: list[str]) -> list[str]:
+    return [
+        step
+        for step in plan
+        if SCAN_STEP.match(step) or AUTOMATIC_INDEX_STEP.search(step)
+    ]
+
+
+def index_terms(sql: str) -> list[str]:
+    """Indexed columns and expressions of a CREATE INDEX statement, in order."""
+    start = sql.index("(", sql.upper().index(" ON "))
+    terms, depth, term = [], 0, ""
+    for char in sql[start + 1 :]:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            if depth == 0:
+                break
+            depth -= 1
+        elif char == "," and depth == 0:
+            terms.append(term.strip())
+            term = ""
+            continue
+        term += char
+    terms.append(term.strip())
+    return [re.sub(r"\s+(ASC|DESC)$", "", t, flags=re.IGNORECASE) for t in terms]
+
+
+def list_indexes(
+    conn: sqlite3.Connection, table: str | None = None
+) -> list[dict[str, Any]]:
+    """
+    Indexes of `table`, by default the table storing the transactions, with
+    the attached database holding them and their indexed columns in order.
+    On a partitioned database, those of the transactions table of each
+    partition. Indexed expressions come back as their SQL text, or on the
+    compact schema as the transactions column they read, so that they
+    compare with the columns queries filter on.
+    """
+    if table is None:
+        table = transactions_storage(conn) or TRANSACTIONS_TABLE
+    schemas = transactions_schemas(conn) if table == TRANSACTIONS_TABLE else ["main"]
+    indexes = []
+    for schema in schemas:
+        for name, sql in conn.execute(
+            f'SELECT name, sql FROM "{schema}".sqlite_master '
+            "WHERE type = 'index' AND tbl_name = ? ORDER BY name",
+            (table,),
+        ).fetchall():
+            # Indexes SQLite creates for constraints have no SQL, nor expressions
+            terms = index_terms(sql) if sql else []
+            columns = [
+                column if column is not None else terms[seqno]
+                for seqno, _, column in conn.execute(
+                    "SELECT * FROM pragma_index_info(?, ?) ORDER BY seqno",
+                    (name, schema),
+                )
+            ]
+            if table == COMPACT_TABLE:
+                columns = [compact_indexed_column(c) or c for c in columns]
+            indexes.append({"schema": schema, "name": name, "columns": columns})
+    return indexes
+
+
+class IndexAdvisor:
+    """
+    Counts incoming SELECTs by normalized text and keeps the query plan of
+    each, from EXPLAIN QUERY PLAN run the first time the query is seen.
+    Queries whose plan scans a whole table are reported with the columns
+    they filter or sort on, the candidates for a new index.
+    At most `max_queries` distinct queries are kept, least recent dropped first.
+    """
+
+    def __init__(self, max_queries: int) -> None:
+        self.max_queries = max_queries
+        self._queries: OrderedDict[str, ObservedQuery] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, query: str) -> bool:
+        """Count one execution of `query` and return whether its plan is known."""
+        key = normalize_sql(query)
+        with self._lock:
+            observed = self._queries.get(key)
+            if observed is None:
+                observed = self._queries[key] = ObservedQuery(key)
+                if len(self._queries) > self.max_queries:
+                    self._queries.popitem(last=False)
+            else:
+                self._queries.move_to_end(key)
+            observed.count += 1
+            return observed.plan is not None
+
+    def explain(self, conn: sqlite3.Connection, query: str, params: Any) -> None:
+        """Record the plan of `query`. Blocking: run it on the database executor."""
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ()).fetchall()
+        except Exception as e:
+            # The query itself reports its errors to the client
+            logger.debug(f"Could not explain query: {e}")
+            return
+        plan = [row[3] for row in rows]
+        with self._lock:
+            observed = self._queries.get(normalize_sql(query))
+            if observed is not None:
+                observed.plan = plan
+                observed.scans = full_scans(plan)
+
+    def report(self, min_count: int = 1) -> list[dict[str, Any]]:
+        """Queries with full table scans, most frequent first."""
+        with self._lock:
+            observed = [
+                q for q in self._queries.values() if q.scans and q.count >= min_count
+            ]
+        return [
+            {
+                "query": q.query,
+                "count": q.count,
+                "scans": q.scans,
+                "plan": q.plan,
+                "candidate_columns": filter_columns(q.query),
+            }
+            for q in sorted(observed, key=lambda q: q.count, reverse=True)
+        ]
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {
+                "queries": len(self._queries),
+                "with_scans": sum(1 for q in self._queries.values() if q.scans),
+                "max_queries": self.max_queries,
+            }
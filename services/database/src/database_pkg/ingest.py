@@ -0,0 +1,469 @@
+import csv
+import logging
+import sqlite3
+import unicodedata
+from dataclasses import dataclass
+from datetime import date, datetime
+from itertools import batched, count
+from pathlib import Path
+from typing import Any, Iterable, Iterator, NamedTuple
+
+from database_pkg.catalog import FileEntry, is_ingested, mark_ingested
+from database_pkg.config.schemas import BankEnum, ExtensionEnum, OwnerEnum
+from database_pkg.schema import (
+    TRANSACTION_COLUMNS,
+    changed_rows,
+    ensure_transactions_table,
+    transactions_by_rowid,
+    view_changes,
+)
+
+logger = logging.getLogger(__name__)
+
+INGESTIBLE_EXTENSIONS = {ExtensionEnum.CSV.value, ExtensionEnum.XLSX.value}
+
+# Rows scanned at the top of a statement while looking for its header line
+MAX_PREAMBLE_ROWS = 20
+
+INSERT_TRANSACTION = (
+    'INSERT INTO "transactions" ('
+    + ", ".join(f'"{c}"' for c in TRANSACTION_COLUMNS)
+    + ") VALUES ("
+    + ", ".join("?" for _ in TRANSACTION_COLUMNS)
+    + ")"
+)
+
+Row = tuple[Any, ...]
+
+# Parsed rows kept on the writer connection until swapped in, see stage_rows
+STAGING_DDL = (
+    'CREATE TEMP TABLE IF NOT EXISTS "{table}" ('
+    + ", ".join(f'"{c}"' for c in TRANSACTION_COLUMNS)
+    + ")"
+)
+STAGE_ROWS = (
+    'INSERT INTO temp."{table}" VALUES ('
+    + ", ".join("?" for _ in TRANSACTION_COLUMNS)
+    + ")"
+)
+
+_staging_ids = count(1)
+
+# Rows of a source in load order, with what identifies them from one
+# ingestion to the next, and the columns users edit
+ANNOTATIONS = """
+SELECT "rowid", "Completed Date", "Description", "Amount",
+    row_number() OVER (
+        PARTITION BY "Completed Date", "Description", "Amount" ORDER BY "rowid"
+    ),
+    "QUI", "COMMENT"
+FROM "{table}"
+WHERE "Source" = ?
+"""
+
+
+@dataclass(frozen=True)
+class BankFormat:
+    """
+    How to read one bank's statement export.
+    `columns` maps transactions columns to the statement's header names,
+    compared case- and accent-insensitively.
+    """
+
+    columns: dict[str, str]
+    # Banks exporting debits and credits as two positive columns
+    debit: str | None = None
+    credit: str | None = None
+    # Used when the statement has no currency column
+    currency: str | None = None
+    date_formats: tuple[str, ...] = ("%Y-%m-%d %H:%M:%S", "%Y-%m-%d")
+    delimiter: str = ","
+    encoding: str = "utf-8-sig"
+    required: tuple[str, ...] = ("Completed Date", "Description")
+
+
+BANK_FORMATS: dict[BankEnum, BankFormat] = {
+    BankEnum.REVOLUT: BankFormat(
+        columns={
+            "Type": "Type",
+            "Product": "Product",
+            "Started Date": "Started Date",
+            "Completed Date": "Completed Date",
+            "Description": "Description",
+            "Amount": "Amount",
+            "Fee": "Fee",
+            "Currency": "Currency",
+        },
+    ),
+    BankEnum.BNP: BankFormat(
+        columns={
+            "Completed Date": "Date operation",
+            "Description": "Libelle operation",
+            "Amount": "Montant operation",
+        },
+        currency="EUR",
+        date_formats=("%d/%m/%Y",),
+        delimiter=";",
+        encoding="latin-1",
+    ),
+    BankEnum.HSBC: BankFormat(
+        columns={
+            "Completed Date": "Date",
+            "Description": "Description",
+            "Amount": "Amount",
+        },
+        currency="EUR",
+        date_formats=("%d/%m/%Y", "%d %b %Y"),
+    ),
+    BankEnum.BNC: BankFormat(
+        columns={
+            "Completed Date": "Date",
+            "Description": "Description",
+        },
+        debit="Debit",
+        credit="Credit",
+        currency="CAD",
+        date_formats=("%Y-%m-%d",),
+        delimiter=";",
+    ),
+}
+
+
+class IngestResult(NamedTuple):
+    rows_inserted: int
+    rows_replaced: int
+
+
+@dataclass
+class IngestProgress:
+    """Counters updated while a statement is ingested, readable from any thread."""
+
+    rows_parsed: int = 0
+    rows_inserted: int = 0
+
+    def count_parsed(self, rows: Iterable[Row]) -> Iterator[Row]:
+        for row in rows:
+            self.rows_parsed += 1
+            yield row
+
+
+def _normalize_header(value: Any) -> str:
+    text = unicodedata.normalize("NFKD", str(value or "")).encode("ascii", "ignore")
+    return " ".join(text.decode().lower().split())
+
+
+def parse_amount(value: Any) -> float | None:
+    """Parse amounts such as -12.5, "1 234,56" or "1,234.56"."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    # split() also drops the (narrow) no-break spaces used as thousands separators
+    text = "".join(str(value).split())
+    if "," in text and "." in text:
+        # The last separator is the decimal one
+        if text.rfind(",") > text.rfind("."):
+            text = text.replace(".", "").replace(",", ".")
+        else:
+            text = text.replace(",", "")
+    else:
+        text = text.replace(",", ".")
+    return float(text) if text else None
+
+
+def parse_date(value: Any, formats: tuple[str, ...]) -> str | None:
+    """Return dates as "YYYY-MM-DD HH:MM:SS", the format pandas stores."""
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, date):
+        return value.strftime("%Y-%m-%d 00:00:00")
+    text = str(value).strip()
+    for fmt in formats:
+        try:
+            return datetime.strptime(text, fmt).strftime("%Y-%m-%d %H:%M:%S")
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognized date: {text!r}")
+
+
+def read_csv_rows(path: Path, fmt: BankFormat) -> Iterator[list[Any]]:
+    with path.open(newline="", encoding=fmt.encoding) as f:
+        yield from csv.reader(f, delimiter=fmt.delimiter)
+
+
+def read_xlsx_rows(path: Path) -> Iterator[tuple[Any, ...]]:
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        yield from workbook.worksheets[0].iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+
+def read_statement_rows(path: Path, fmt: BankFormat) -> Iterator[Iterable[Any]]:
+    ext = path.suffix.lower().lstrip(".")
+    if ext == "csv":
+        return read_csv_rows(path, fmt)
+    if ext == "xlsx":
+        return read_xlsx_rows(path)
+    raise ValueError(
+        f"Cannot ingest .{ext} statements. Only CSV and XLSX are supported."
+    )
+
+
+def parse_statement(
+    rows: Iterator[Iterable[Any]], fmt: BankFormat, owner: str, source: str
+) -> Iterator[Row]:
+    """
+    Turn raw statement rows into transactions rows, one at a time.
+    Lines before the header (account details, export date...) are skipped,
+    as are blank lines and footer lines without a date. The first line
+    whose date does not parse starts the footer (totals, balance...): a
+    dated line after it is reported as an unrecognized date.
+    """
+    wanted = dict(fmt.columns)
+    if fmt.debit:
+        wanted["_debit"] = fmt.debit
+    if fmt.credit:
+        wanted["_credit"] = fmt.credit
+
+    positions: dict[str, int] | None = None
+    for _, raw in zip(range(MAX_PREAMBLE_ROWS), rows):
+        headers = [_normalize_header(v) for v in raw]
+        found = {
+            column: headers.index(_normalize_header(name))
+            for column, name in wanted.items()
+            if _normalize_header(name) in headers
+        }
+        if all(column in found for column in fmt.required):
+            positions = found
+            break
+    if positions is None:
+        raise ValueError(
+            f"No header with columns {[fmt.columns[c] for c in fmt.required]} found."
+        )
+
+    def cell(values: list[Any], column: str) -> Any:
+        i = positions.get(column)
+        if i is None or i >= len(values):
+            return None
+        value = values[i]
+        return value.strip() if isinstance(value, str) else value
+
+    footer = None
+    for raw in rows:
+        values = list(raw)
+        try:
+            completed = parse_date(cell(values, "Completed Date"), fmt.date_formats)
+        except ValueError as e:
+            footer = footer or e
+            continue
+        if completed is None:
+            continue
+        if footer is not None:
+            raise footer
+        if "Amount" in positions:
+            amount = parse_amount(cell(values, "Amount"))
+        else:
+            amount = (parse_amount(cell(values, "_credit")) or 0.0) - (
+                parse_amount(cell(values, "_debit")) or 0.0
+            )
+        started = parse_date(cell(values, "Started Date"), fmt.date_formats)
+        yield (
+            cell(values, "Type") or ("CREDIT" if (amount or 0) > 0 else "DEBIT"),
+            cell(values, "Product"),
+            started or completed,
+            completed,
+            cell(values, "Description"),
+            amount,
+            parse_amount(cell(values, "Fee")) or 0.0,
+            cell(values, "Currency") or fmt.currency,
+            owner,
+            None,
+            source,
+        )
+
+
+def insert_rows(
+    conn: sqlite3.Connection,
+    rows: Iterable[Row],
+    chunk_size: int,
+    progress: IngestProgress | None = None,
+) -> int:
+    """Insert rows in fixed-size executemany batches. Caller owns the transaction."""
+    inserted = 0
+    for chunk in batched(rows, chunk_size):
+        conn.executemany(INSERT_TRANSACTION, chunk)
+        inserted += len(chunk)
+        if progress is not None:
+            progress.rows_inserted = inserted
+    return inserted
+
+
+def _annotations(conn: sqlite3.Connection, source: str) -> dict[tuple, tuple]:
+    """Rowid and ("QUI", "COMMENT") of the rows loaded from `source`, by key."""
+    return {
+        tuple(row[1:5]): (row[0], (row[5], row[6]))
+        for row in conn.execute(
+            ANNOTATIONS.format(table=transactions_by_rowid(conn)), (source,)
+        )
+    }
+
+
+def replace_rows(
+    conn: sqlite3.Connection,
+    source: str,
+    rows: Iterable[Row],
+    chunk_size: int,
+    progress: IngestProgress | None = None,
+) -> IngestResult:
+    """
+    Swap the rows loaded from `source` for `rows`. Rows found again, with
+    the same date, description and amount, keep the "QUI" and "COMMENT"
+    they were given since. Caller owns the transaction.
+    """
+    table = transactions_by_rowid(conn)
+    kept = {key: edited for key, (_, edited) in _annotations(conn, source).items()}
+    before = view_changes(conn)
+    replaced = changed_rows(
+        conn.execute(f'DELETE FROM "{table}" WHERE "Source" = ?', (source,)),
+        before,
+    )
+    inserted = insert_rows(conn, rows, chunk_size, progress)
+    if kept:
+        conn.executemany(
+            f'UPDATE "{table}" SET "QUI" = ?, "COMMENT" = ? WHERE "rowid" = ?',
+            [
+                (*kept[key], rowid)
+                for key, (rowid, loaded) in _annotations(conn, source).items()
+                if kept.get(key, loaded) != loaded
+            ],
+        )
+    return IngestResult(inserted, replaced)
+
+
+def read_statement(
+    path: Path, owner: OwnerEnum, bank: BankEnum, source: str
+) -> Iterator[Row]:
+    """Parse a statement file into transactions rows, one at a time."""
+    fmt = BANK_FORMATS[bank]
+    return parse_statement(read_statement_rows(path, fmt), fmt, owner.value, source)
+
+
+def parse_statement_file(
+    path: Path, owner: OwnerEnum, bank: BankEnum, source: str
+) -> list[Row]:
+    """Parse a whole statement file. Used where rows must be sent elsewhere."""
+    return list(read_statement(path, owner, bank, source))
+
+
+def staging_table() -> str:
+    """Name of a new staging table, unique to this process."""
+    return f"ingest_{next(_staging_ids)}"
+
+
+def stage_rows(conn: sqlite3.Connection, table: str, rows: list[Row]) -> int:
+    """
+    Keep parsed rows in the TEMP `table` of `conn`, to be swapped in by
+    replace_staged on the same connection. Caller owns the transaction.
+    """
+    conn.execute(STAGING_DDL.format(table=table))
+    conn.executemany(STAGE_ROWS.format(table=table), rows)
+    return len(rows)
+
+
+def replace_staged(
+    conn: sqlite3.Connection,
+    table: str,
+    source: str,
+    chunk_size: int,
+    entry: FileEntry | None = None,
+) -> IngestResult:
+    """
+    Swap the rows loaded from `source` for those staged in `table`, then
+    drop it. When given, `entry` is marked ingested along with the rows.
+    Caller owns the transaction.
+    """
+    ensure_transactions_table(conn)
+    conn.execute(STAGING_DDL.format(table=table))
+    staged = conn.execute(f'SELECT * FROM temp."{table}"')
+    result = replace_rows(conn, source, staged, chunk_size)
+    if entry is not None:
+        mark_ingested(conn, entry)
+    drop_staged(conn, table)
+    logger.info(
+        f"Ingested {result.rows_inserted} rows from {source} "
+        f"({result.rows_replaced} replaced)"
+    )
+    return result
+
+
+def drop_staged(conn: sqlite3.Connection, table: str) -> None:
+    conn.execute(f'DROP TABLE IF EXISTS temp."{table}"')
+
+
+def ingest_statement(
+    conn: sqlite3.Connection,
+    path: Path,
+    owner: OwnerEnum,
+    bank: BankEnum,
+    source: str,
+    chunk_size: int,
+    entry: FileEntry | None = None,
+    progress: IngestProgress | None = None,
+) -> IngestResult:
+    """
+    Load one statement file into transactions in a single transaction.
+    Rows previously ingested from the same `source` are replaced.
+    Only `chunk_size` parsed rows are held in memory at a time.
+    When given, the file's catalog `entry` is marked ingested in the same
+    transaction, and `progress` is kept up to date.
+    """
+    rows = read_statement(path, owner, bank, source)
+    if progress is not None:
+        rows = progress.count_parsed(rows)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        ensure_transactions_table(conn)
+        result = replace_rows(conn, source, rows, chunk_size, progress)
+        if entry is not None:
+            mark_ingested(conn, entry)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    logger.info(
+        f"Ingested {result.rows_inserted} rows from {source} "
+        f"({result.rows_replaced} replaced)"
+    )
+    return result
+
+
+def ingest_entries(
+    conn: sqlite3.Connection,
+    blob_path: Path | str,
+    entries: Iterable[FileEntry],
+    chunk_size: int,
+) -> dict[str, IngestResult | None]:
+    """
+    Ingest catalogued statement files one after the other, each in its own
+    transaction. Files whose content is already loaded map to None.
+    """
+    results: dict[str, IngestResult | None] = {}
+    for entry in entries:
+        if is_ingested(conn, entry):
+            results[entry.path] = None
+            continue
+        results[entry.path] = ingest_statement(
+            conn,
+            Path(blob_path) / entry.path,
+            OwnerEnum(entry.owner),
+            BankEnum(entry.bank),
+            entry.path,
+            chunk_size,
+            entry,
+        )
+    return results
@@ -0,0 +1,258 @@
+import logging
+import math
+import sqlite3
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+import anyio
+import orjson
+
+from database_pkg.catalog import FileEntry, is_ingested
+from database_pkg.config.schemas import BankEnum, JobStatusEnum, OwnerEnum
+from database_pkg.config.settings import database_settings
+from database_pkg.executor import DatabaseExecutor
+from database_pkg.ingest import IngestProgress, ingest_statement
+from database_pkg.pool import ConnectionPool
+from database_pkg.schema import JOBS_TABLE, ensure_jobs_table, table_exists
+from database_pkg.writer import DatabaseWriter
+
+logger = logging.getLogger(__name__)
+
+INGEST_JOB = "ingest"
+
+# Seconds before a worker that could not claim a job tries again, doubled
+# after each failure up to the maximum
+CLAIM_RETRY_DELAY = 0.1
+CLAIM_RETRY_MAX_DELAY = 5.0
+
+# A job handler runs on a database worker thread with its own connection
+JobHandler = Callable[[sqlite3.Connection, dict[str, Any], IngestProgress], Any]
+
+
+def insert_job(conn: sqlite3.Connection, kind: str, payload: dict[str, Any]) -> int:
+    """Insert a queued job and return its id. Caller owns the transaction."""
+    ensure_jobs_table(conn)
+    cursor = conn.execute(
+        'INSERT INTO "jobs" ("kind", "payload", "status", "created_at") '
+        "VALUES (?, ?, ?, ?)",
+        (kind, orjson.dumps(payload), JobStatusEnum.QUEUED.value, time.time()),
+    )
+    return cursor.lastrowid
+
+
+def enqueue_job(conn: sqlite3.Connection, kind: str, payload: dict[str, Any]) -> int:
+    """Insert a queued job and return its id."""
+    try:
+        job_id = insert_job(conn, kind, payload)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    return job_id
+
+
+def claim_job(conn: sqlite3.Connection) -> dict[str, Any] | None:
+    """Mark the oldest queued job as running and return it."""
+    if not table_exists(conn, JOBS_TABLE):
+        return None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            'SELECT "id", "kind", "payload" FROM "jobs" WHERE "status" = ? '
+            'ORDER BY "id" LIMIT 1',
+            (JobStatusEnum.QUEUED.value,),
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                'UPDATE "jobs" SET "status" = ?, "started_at" = ? WHERE "id" = ?',
+                (JobStatusEnum.RUNNING.value, time.time(), row[0]),
+            )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    if row is None:
+        return None
+    return {"id": row[0], "kind": row[1], "payload": orjson.loads(row[2])}
+
+
+def finish_job(
+    conn: sqlite3.Connection,
+    job_id: int,
+    progress: IngestProgress,
+    result: Any = None,
+    error: str | None = None,
+) -> None:
+    status = JobStatusEnum.FAILED if error is not None else JobStatusEnum.DONE
+    conn.execute(
+        'UPDATE "jobs" SET "status" = ?, "rows_parsed" = ?, "rows_inserted" = ?, '
+        '"result" = ?, "error" = ?, "finished_at" = ? WHERE "id" = ?',
+        (
+            status.value,
+            progress.rows_parsed,
+            progress.rows_inserted,
+            orjson.dumps(result) if result is not None else None,
+            error,
+            time.time(),
+            job_id,
+        ),
+    )
+    conn.commit()
+
+
+def requeue_running(conn: sqlite3.Connection) -> int:
+    """Put jobs left running by a previous process back in the queue."""
+    if not table_exists(conn, JOBS_TABLE):
+        return 0
+    cursor = conn.execute(
+        'UPDATE "jobs" SET "status" = ?, "started_at" = NULL WHERE "status" = ?',
+        (JobStatusEnum.QUEUED.value, JobStatusEnum.RUNNING.value),
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def get_job(conn: sqlite3.Connection, job_id: int) -> dict[str, Any] | None:
+    if not table_exists(conn, JOBS_TABLE):
+        return None
+    cursor = conn.execute('SELECT * FROM "jobs" WHERE "id" = ?', (job_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    job = dict(zip([c[0] for c in cursor.description], row))
+    job["payload"] = orjson.loads(job["payload"])
+    if job["result"] is not None:
+        job["result"] = orjson.loads(job["result"])
+    return job
+
+
+def run_ingest_job(
+    conn: sqlite3.Connection, payload: dict[str, Any], progress: IngestProgress
+) -> dict[str, Any]:
+    """Ingest one catalogued statement, unless its content is already loaded."""
+    entry = FileEntry(**payload["entry"])
+    if not payload.get("force") and is_ingested(conn, entry):
+        return {"path": entry.path, "skipped": True}
+    result = ingest_statement(
+        conn,
+        Path(database_settings.blob_path) / entry.path,
+        OwnerEnum(entry.owner),
+        BankEnum(entry.bank),
+        entry.path,
+        database_settings.ingest_chunk_size,
+        entry,
+        progress,
+    )
+    return {"path": entry.path, "skipped": False, **result._asdict()}
+
+
+def ingest_job_payload(entry: FileEntry, force: bool = False) -> dict[str, Any]:
+    return {"entry": entry._asdict(), "force": force}
+
+
+class JobQueue:
+    """
+    In-process queue of background jobs, persisted in the jobs table.
+
+    `workers` tasks take queued jobs oldest first and run them on the
+    database executor, with connections from a pool of their own, so heavy
+    parsing never holds up a request nor takes its connection. Jobs left
+    running when the process stopped are queued again on start. Progress of
+    running jobs is kept in memory and written to the table when they finish.
+    """
+
+    def __init__(
+        self, db_path: Path | str, executor: DatabaseExecutor, workers: int
+    ) -> None:
+        self.pool = ConnectionPool(
+            db_path, size=max(workers, 1), timeout=database_settings.db_pool_timeout
+        )
+        self.executor = executor
+        self.workers = workers
+        self.handlers: dict[str, JobHandler] = {INGEST_JOB: run_ingest_job}
+        self._progress: dict[int, IngestProgress] = {}
+        self._wakeup_send, self._wakeup_receive = anyio.create_memory_object_stream[
+            None
+        ](math.inf)
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        conn = await self.executor.wait_for(self.pool.acquire, wait=True)
+        try:
+            return await self.executor.run(fn, conn, *args, wait=True)
+        finally:
+            self.pool.release(conn)
+
+    async def run(self) -> None:
+        """Run the workers until cancelled."""
+        if not self.workers:
+            return
+        try:
+            requeued = await self._call(requeue_running)
+            if requeued:
+                logger.info(f"Requeued {requeued} interrupted jobs")
+        except Exception as e:
+            logger.error(f"Could not requeue interrupted jobs: {e}")
+        async with anyio.create_task_group() as tg:
+            for _ in range(self.workers):
+                tg.start_soon(self._worker)
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def notify(self) -> None:
+        """Wake up a worker to look for queued jobs."""
+        self._wakeup_send.send_nowait(None)
+
+    async def submit(self, writer: DatabaseWriter, kind: str, payload: dict) -> int:
+        """Queue a job through the database writer and return its id."""
+        job_id = await writer.run(insert_job, kind, payload)
+        self.notify()
+        return job_id
+
+    async def get(self, conn: sqlite3.Connection, job_id: int) -> dict | None:
+        job = await self.executor.run(get_job, conn, job_id)
+        if job is None:
+            return None
+        progress = self._progress.get(job_id)
+        if progress is not None and job["status"] == JobStatusEnum.RUNNING.value:
+            job["rows_parsed"] = progress.rows_parsed
+            job["rows_inserted"] = progress.rows_inserted
+        end = job["finished_at"] or time.time()
+        job["duration_seconds"] = end - job["started_at"] if job["started_at"] else None
+        return job
+
+    async def _worker(self) -> None:
+        delay = CLAIM_RETRY_DELAY
+        while True:
+            try:
+                job = await self._call(claim_job)
+            except Exception as e:
+                # Queued jobs may be waiting: retry rather than wait for a submit
+                logger.error(f"Could not claim a job, retrying in {delay}s: {e}")
+                await anyio.sleep(delay)
+                delay = min(delay * 2, CLAIM_RETRY_MAX_DELAY)
+                continue
+            delay = CLAIM_RETRY_DELAY
+            if job is None:
+                await self._wakeup_receive.receive()
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: dict[str, Any]) -> None:
+        progress = self._progress[job["id"]] = IngestProgress()
+        result, error = None, None
+        handler = self.handlers.get(job["kind"])
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job kind: {job['kind']}")
+            result = await self._call(handler, job["payload"], progress)
+        except Exception as e:
+            logger.warning(f"Job {job['id']} failed: {e}")
+            error = str(e)
+        try:
+            await self._call(finish_job, job["id"], progress, result, error)
+        except Exception as e:
+            logger.error(f"Could not record the end of job {job['id']}: {e}")
+        finally:
+            self._progress.pop(job["id"], None)
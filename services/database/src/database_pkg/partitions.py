@@ -0,0 +1,328 @@
+import argparse
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Callable, TypeVar
+
+from database_pkg.config.settings import database_settings
+from database_pkg.pool import connect
+from database_pkg.schema import (
+    DEFAULT_PARTITION,
+    MONTHLY_SUMMARY_TRIGGERS,
+    PARTITIONS_DDL,
+    ROWID_BLOCK,
+    SEARCH_TRIGGERS,
+    TRANSACTION_COLUMNS,
+    TRANSACTIONS_DDL,
+    Partition,
+    ensure_partition,
+    ensure_transactions_table,
+    is_compact,
+    list_partitions,
+    partition_year,
+    table_exists,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+COLUMNS = ", ".join(f'"{c}"' for c in TRANSACTION_COLUMNS)
+SOURCE_COLUMNS = ", ".join(f't."{c}"' for c in TRANSACTION_COLUMNS)
+
+
+def group_years(years: list[int], files: int) -> list[tuple[int, int]]:
+    """
+    First and last year of each new partition for `years`, one per year,
+    except that the oldest years share a file when there are more years
+    than `files`.
+    """
+    if files <= 0 or not years:
+        return []
+    if len(years) <= files:
+        return [(year, year) for year in years]
+    shared = len(years) - files + 1
+    return [(years[0], years[shared - 1])] + [(y, y) for y in years[shared:]]
+
+
+def _remove(path: Path) -> None:
+    for leftover in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+        leftover.unlink(missing_ok=True)
+
+
+def ensure_partitions(db_path: Path | str) -> list[str]:
+    """
+    Create what is missing from the open partitions of the main database
+    `db_path`, e.g. after an interrupted split, and return their names.
+    """
+    conn = connect(db_path)
+    try:
+        partitions = list_partitions(conn)
+    finally:
+        conn.close()
+    ensured = []
+    for partition in partitions:
+        if partition.closed:
+            continue
+        conn = connect(partition.path(db_path))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            ensure_partition(conn, partition)
+            conn.commit()
+        finally:
+            conn.close()
+        ensured.append(partition.name)
+    return ensured
+
+
+def for_each_partition(
+    conn: sqlite3.Connection, fn: Callable[[sqlite3.Connection], T]
+) -> list[T]:
+    """
+    Call `fn` with a connection to each open partition attached to `conn`,
+    on which the partition is a plain transactions database.
+    """
+    files = {row[1]: row[2] for row in conn.execute("PRAGMA database_list")}
+    results = []
+    for partition in list_partitions(conn):
+        if partition.closed:
+            continue
+        part = connect(files[partition.schema])
+        try:
+            results.append(fn(part))
+        finally:
+            part.close()
+    return results
+
+
+def split_by_year(db_path: Path | str) -> list[Partition]:
+    """
+    Move transactions to year partitions, and return the partitions created.
+
+    The first split moves the transactions table of the main database to a
+    default partition and one partition per year. Later splits give their
+    own partition to the years that reached the default partition since.
+    SQLite attaches at most 10 databases, so when years outnumber the free
+    slots, the oldest new years share a partition; when no slot is left,
+    they stay in the default partition.
+    Rows moved to a year partition get new rowids in its block. Partition
+    files are created in one transaction, then indexed and summarized.
+    """
+    db_path = Path(db_path)
+    conn = connect(db_path)
+    created: list[Partition] = []
+    try:
+        existing = list_partitions(conn)
+        if existing:
+            default = next(p for p in existing if p.first_year is None)
+            source = f'"{default.schema}"."transactions"'
+        else:
+            if is_compact(conn) or not table_exists(conn, "transactions"):
+                raise ValueError("There is no transactions table to partition.")
+            conn.execute("BEGIN IMMEDIATE")
+            ensure_transactions_table(conn)
+            conn.commit()
+            columns = [
+                row[1] for row in conn.execute('PRAGMA table_info("transactions")')
+            ]
+            if columns != TRANSACTION_COLUMNS:
+                raise ValueError(
+                    f"The transactions table has columns {columns}, "
+                    f"expected {TRANSACTION_COLUMNS}."
+                )
+            max_rowid = conn.execute('SELECT max("rowid") FROM "transactions"')
+            if (max_rowid.fetchone()[0] or 0) >= ROWID_BLOCK:
+                raise ValueError(f"Rowids must stay below {ROWID_BLOCK}.")
+            default = Partition(DEFAULT_PARTITION, None, None)
+            source = '"main"."transactions"'
+
+        year = partition_year("t")
+        covered = [(p.first_year, p.last_year) for p in existing if p.first_year]
+        years = [
+            y
+            for (y,) in conn.execute(
+                f"SELECT DISTINCT {year} FROM {source} AS t "
+                f"WHERE {year} > 0 ORDER BY 1"
+            )
+            if not any(first <= y <= last for first, last in covered)
+        ]
+        slots = conn.getlimit(sqlite3.SQLITE_LIMIT_ATTACHED) - max(len(existing), 1)
+        ranges = group_years(years, slots)
+        for first, last in ranges:
+            if any(
+                first_covered <= last and first <= last_covered
+                for first_covered, last_covered in covered
+            ):
+                raise ValueError(
+                    f"Years {first} to {last} would share a partition with "
+                    "an existing one."
+                )
+        if not ranges and years:
+            logger.warning(
+                f"No partition slot left: years {years} stay in the default partition"
+            )
+        new = [
+            Partition(str(first) if first == last else f"{first}-{last}", first, last)
+            for first, last in ranges
+        ]
+        if existing and not new:
+            return []
+        created = new if existing else [default, *new]
+        for partition in created:
+            path = partition.path(db_path)
+            if path.exists():
+                raise ValueError(
+                    f"{path} already exists: remove what is left of an "
+                    "interrupted split first."
+                )
+        for partition in created:
+            part = connect(partition.path(db_path))
+            try:
+                # Indexes and triggers are built once the rows are in
+                part.execute(TRANSACTIONS_DDL)
+                part.commit()
+            finally:
+                part.close()
+            conn.execute(
+                f'ATTACH DATABASE ? AS "{partition.schema}"',
+                (str(partition.path(db_path)),),
+            )
+
+        conn.execute("BEGIN IMMEDIATE")
+        for partition in new:
+            conn.execute(
+                f'INSERT INTO "{partition.schema}"."transactions" ("rowid", {COLUMNS}) '
+                f"SELECT {partition.first_year * ROWID_BLOCK} "
+                f'+ row_number() OVER (ORDER BY t."rowid"), {SOURCE_COLUMNS} '
+                f"FROM {source} AS t WHERE {year} BETWEEN ? AND ?",
+                (partition.first_year, partition.last_year),
+            )
+        in_new = " OR ".join(
+            f"{year} BETWEEN {p.first_year} AND {p.last_year}" for p in new
+        )
+        moved = f"coalesce({in_new or 0}, 0)"
+        if existing:
+            # Rebuilt from the remaining rows, rather than updated row by row
+            for trigger in [*MONTHLY_SUMMARY_TRIGGERS, *SEARCH_TRIGGERS]:
+                conn.execute(f'DROP TRIGGER IF EXISTS "{default.schema}"."{trigger}"')
+            conn.execute(
+                f'DELETE FROM {source} WHERE "rowid" IN '
+                f'(SELECT t."rowid" FROM {source} AS t WHERE {moved})'
+            )
+        else:
+            conn.execute(
+                f'INSERT INTO "{default.schema}"."transactions" ("rowid", {COLUMNS}) '
+                f'SELECT "rowid", {COLUMNS} FROM {source} AS t WHERE NOT {moved}'
+            )
+            conn.execute('DROP TABLE "main"."transactions"')
+            conn.execute('DROP TABLE IF EXISTS "main"."monthly_summary"')
+            conn.execute('DROP TABLE IF EXISTS "main"."transactions_fts"')
+            conn.execute(PARTITIONS_DDL)
+        conn.executemany(
+            'INSERT INTO "partitions" ("name", "first_year", "last_year") '
+            "VALUES (?, ?, ?)",
+            [(p.name, p.first_year, p.last_year) for p in created],
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        conn.close()
+        for partition in created:
+            _remove(partition.path(db_path))
+        raise
+    conn.close()
+    ensure_partitions(db_path)
+    logger.info(f"Created partitions: {', '.join(p.name for p in created)}")
+    return created
+
+
+def _find(db_path: Path | str, year: int) -> Partition:
+    conn = connect(db_path)
+    try:
+        partitions = list_partitions(conn)
+    finally:
+        conn.close()
+    for partition in partitions:
+        if partition.first_year is not None and (
+            partition.first_year <= year <= partition.last_year
+        ):
+            return partition
+    raise ValueError(f"No partition holds the transactions of {year}.")
+
+
+def _set_closed(db_path: Path | str, partition: Partition, closed: bool) -> None:
+    # Without attaching the partitions, which may be changing journal mode
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(
+            'UPDATE "partitions" SET "closed" = ? WHERE "name" = ?',
+            (int(closed), partition.name),
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def close_partition(db_path: Path | str, year: int, vacuum: bool = True) -> Partition:
+    """
+    Close the partition holding `year`: compact it, leave WAL mode, which
+    immutable databases cannot use, and mark it closed. Connections opened
+    afterwards attach it immutable and refuse writes to it.
+    """
+    partition = _find(db_path, year)
+    # Not with connect(), which would put it back in WAL mode
+    conn = sqlite3.connect(partition.path(db_path), isolation_level=None)
+    try:
+        conn.execute("PRAGMA optimize")
+        if vacuum:
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        conn.close()
+    _set_closed(db_path, partition, True)
+    logger.info(f"Closed partition {partition.name}")
+    return partition
+
+
+def reopen_partition(db_path: Path | str, year: int) -> Partition:
+    """Reopen the partition holding `year` to writes."""
+    partition = _find(db_path, year)
+    _set_closed(db_path, partition, False)
+    logger.info(f"Reopened partition {partition.name}")
+    return partition
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Manage the year partitions of transactions. Stop the service first."
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("split", help="Move the years without a partition to one.")
+    close = commands.add_parser("close", help="Make the partition of a year read-only.")
+    close.add_argument("year", type=int)
+    close.add_argument("--no-vacuum", action="store_true")
+    reopen = commands.add_parser("reopen", help="Reopen the partition of a year.")
+    reopen.add_argument("year", type=int)
+    commands.add_parser("list", help="List the partitions.")
+    args = parser.parse_args()
+
+    db_path = database_settings.sqlite_path
+    if args.command == "split":
+        for partition in split_by_year(db_path):
+            print(f"Created {partition.path(db_path)}")
+    elif args.command == "close":
+        partition = close_partition(db_path, args.year, vacuum=not args.no_vacuum)
+        print(f"Closed {partition.path(db_path)}")
+    elif args.command == "reopen":
+        partition = reopen_partition(db_path, args.year)
+        print(f"Reopened {partition.path(db_path)}")
+    conn = connect(db_path)
+    try:
+        for partition in list_partitions(conn):
+            rows = conn.execute(
+                f'SELECT count(*) FROM "{partition.schema}"."transactions"'
+            ).fetchone()[0]
+            state = "closed" if partition.closed else "open"
+            print(f"{partition.name}: {rows} transactions, {state}")
+    finally:
+        conn.close()
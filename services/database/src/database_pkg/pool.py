@@ -0,0 +1,215 @@
+import logging
+import queue
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterable, Iterator
+
+from database_pkg.config.settings import database_settings
+from database_pkg.schema import attach_partitions, count_view_changes
+
+logger = logging.getLogger(__name__)
+
+
+class PoolClosedError(RuntimeError):
+    """Raised when a connection is requested from a closed pool."""
+
+
+class PoolTimeoutError(RuntimeError):
+    """Raised when no connection becomes available before the timeout."""
+
+
+class StatementCacheStats:
+    """
+    Mirror of sqlite3's per-connection LRU statement cache, used to report
+    how often a statement is reused instead of being parsed and planned again.
+    """
+
+    def __init__(self, size: int) -> None:
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._seen: OrderedDict[str, None] = OrderedDict()
+
+    def record(self, sql: str) -> None:
+        if sql in self._seen:
+            self._seen.move_to_end(sql)
+            self.hits += 1
+            return
+        self.misses += 1
+        if self.size:
+            self._seen[sql] = None
+            if len(self._seen) > self.size:
+                self._seen.popitem(last=False)
+
+
+class TrackingCursor(sqlite3.Cursor):
+    """Cursor recording each statement against its connection's cache stats."""
+
+    connection: "PooledConnection"
+
+    def execute(self, sql: str, parameters: Any = (), /) -> "TrackingCursor":
+        self.connection.statement_cache.record(sql)
+        return super().execute(sql, parameters)
+
+    def executemany(self, sql: str, seq_of_parameters: Any, /) -> "TrackingCursor":
+        self.connection.statement_cache.record(sql)
+        return super().executemany(sql, seq_of_parameters)
+
+
+class PooledConnection(sqlite3.Connection):
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.statement_cache = StatementCacheStats(kwargs.get("cached_statements", 128))
+
+    def cursor(self, factory: type[sqlite3.Cursor] = TrackingCursor) -> Any:
+        return super().cursor(factory)
+
+
+def connect(db_path: Path | str, read_only: bool = False) -> PooledConnection:
+    """
+    Open a SQLite connection tuned for the service.
+    PRAGMAs are applied once here so pooled connections never pay for them again.
+    A `read_only` connection is opened with mode=ro: SQLite refuses any write
+    on it, and it leaves the journal mode to the writers.
+    The year partitions of a partitioned database are attached and get the
+    same PRAGMAs, see schema.attach_partitions. Rows written through a
+    "transactions" view are counted, see schema.count_view_changes.
+    """
+    conn = sqlite3.connect(
+        f"{Path(db_path).resolve().as_uri()}?mode=ro" if read_only else str(db_path),
+        check_same_thread=False,
+        cached_statements=database_settings.sqlite_statement_cache_size,
+        factory=PooledConnection,
+        uri=True,
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA busy_timeout={int(database_settings.db_pool_timeout * 1000)}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    partitions = attach_partitions(conn, db_path, read_only=read_only)
+    if not read_only:
+        for schema in ["main", *(p.schema for p in partitions if not p.closed)]:
+            conn.execute(f'PRAGMA "{schema}".journal_mode=WAL')
+    for schema in ["main", *(p.schema for p in partitions)]:
+        conn.execute(
+            f'PRAGMA "{schema}".synchronous={database_settings.sqlite_synchronous}'
+        )
+        conn.execute(
+            f'PRAGMA "{schema}".cache_size=-{database_settings.sqlite_cache_size_kib}'
+        )
+        conn.execute(
+            f'PRAGMA "{schema}".mmap_size={database_settings.sqlite_mmap_size}'
+        )
+    count_view_changes(conn)
+    return conn
+
+
+def statement_cache_stats(connections: Iterable[PooledConnection]) -> dict[str, Any]:
+    """Statement cache hits and misses added up over `connections`."""
+    connections = list(connections)
+    hits = sum(c.statement_cache.hits for c in connections)
+    misses = sum(c.statement_cache.misses for c in connections)
+    return {
+        "size": database_settings.sqlite_statement_cache_size,
+        "hits": hits,
+        "misses": misses,
+        "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+    }
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections.
+    Connections are opened lazily, up to `size`, and reused afterwards.
+    """
+
+    def __init__(
+        self,
+        db_path: Path | str,
+        size: int,
+        timeout: float,
+        read_only: bool = False,
+    ) -> None:
+        self.db_path = db_path
+        self.size = size
+        self.timeout = timeout
+        self.read_only = read_only
+        self._idle: queue.LifoQueue[PooledConnection] = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._connections: list[PooledConnection] = []
+        self._closed = False
+
+    @property
+    def _opened(self) -> int:
+        return len(self._connections)
+
+    @property
+    def in_use(self) -> int:
+        return self._opened - self._idle.qsize()
+
+    @property
+    def connections(self) -> list[PooledConnection]:
+        """Connections opened so far, idle or not."""
+        return list(self._connections)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "pool": {"size": self.size, "open": self._opened, "in_use": self.in_use},
+            "statement_cache": statement_cache_stats(self._connections),
+        }
+
+    def acquire(self) -> PooledConnection:
+        if self._closed:
+            raise PoolClosedError("Connection pool is closed.")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                logger.debug(
+                    f"Opening pooled connection {self._opened + 1}/{self.size} to {self.db_path}"
+                )
+                conn = connect(self.db_path, read_only=self.read_only)
+                self._connections.append(conn)
+                return conn
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise PoolTimeoutError(
+                f"No database connection available after {self.timeout}s."
+            )
+
+    def release(self, conn: PooledConnection) -> None:
+        if conn.in_transaction:
+            conn.rollback()
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+
+    @contextmanager
+    def connection(self) -> Iterator[PooledConnection]:
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def _discard(self, conn: PooledConnection) -> None:
+        conn.close()
+        with self._lock:
+            self._connections.remove(conn)
+
+    def close(self) -> None:
+        """Close idle connections; connections still checked out close on release."""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(conn)
+        logger.debug(f"Connection pool for {self.db_path} closed")
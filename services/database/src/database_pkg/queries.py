@@ -0,0 +1,382 @@
+import base64
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import AbstractContextManager, nullcontext
+from typing import Any, NamedTuple
+
+import orjson
+
+from database_pkg.budget import QueryBudget
+from database_pkg.config.schemas import ResultFormatEnum, SQLBatch, SQLQuery
+from database_pkg.metrics import count_rows, phase
+from database_pkg.schema import changed_rows, view_changes
+
+JSON_MEDIA_TYPE = "application/json"
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class QueryResponse(NamedTuple):
+    """Encoded response body, ready to be sent as is."""
+
+    body: bytes
+    media_type: str
+    # Rows returned, or affected by a write
+    rows: int
+
+
+def _default(obj: Any) -> Any:
+    # SQLite BLOBs come back as bytes
+    if isinstance(obj, bytes):
+        return obj.decode()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+class StatementInfo(NamedTuple):
+    # Returns rows and changes nothing: may run on a read-only connection
+    read_only: bool
+    # BEGIN, COMMIT, ROLLBACK, SAVEPOINT or RELEASE
+    transaction_control: bool
+
+
+# Opcodes of statements that change the database or connection state
+# without opening a write transaction
+STATE_OPCODES = frozenset(
+    {"Checkpoint", "IncrVacuum", "JournalMode", "SqlExec", "Vacuum", "VUpdate"}
+)
+TRANSACTION_OPCODES = frozenset({"AutoCommit", "Savepoint"})
+
+# Statement texts whose StatementInfo is remembered
+STATEMENT_INFO_CACHE_SIZE = 1024
+
+_statement_info: OrderedDict[str, StatementInfo] = OrderedDict()
+_statement_info_lock = threading.Lock()
+
+
+def cached_statement_info(query: str) -> StatementInfo | None:
+    with _statement_info_lock:
+        info = _statement_info.get(query)
+        if info is not None:
+            _statement_info.move_to_end(query)
+        return info
+
+
+def statement_info(
+    conn: sqlite3.Connection, query: str, params: Any = None
+) -> StatementInfo:
+    """
+    Classify a statement from its compiled program, as sqlite3_stmt_readonly
+    does: it is read-only if it returns rows without ever starting a write
+    transaction or changing the connection's state. Unlike a look at its
+    first keyword, this gets WITH ... SELECT, PRAGMA and INSERT ... RETURNING
+    right. The program comes from EXPLAIN, which compiles without running.
+    """
+    info = cached_statement_info(query)
+    if info is not None:
+        return info
+    try:
+        program = conn.execute(f"EXPLAIN {query}", params or ()).fetchall()
+    except Exception:
+        # May only compile on the writer, e.g. writes to views whose triggers
+        # readers lack: run it there, where it reports its own error if any
+        return StatementInfo(read_only=False, transaction_control=False)
+    opcodes = {row[1] for row in program}
+    writes = any(row[1] == "Transaction" and row[3] != 0 for row in program)
+    info = StatementInfo(
+        read_only=(
+            "ResultRow" in opcodes
+            and not writes
+            and not opcodes & (STATE_OPCODES | TRANSACTION_OPCODES)
+        ),
+        transaction_control=bool(opcodes & TRANSACTION_OPCODES),
+    )
+    with _statement_info_lock:
+        _statement_info[query] = info
+        if len(_statement_info) > STATEMENT_INFO_CACHE_SIZE:
+            _statement_info.popitem(last=False)
+    return info
+
+
+def is_read_only(conn: sqlite3.Connection, query: str, params: Any = None) -> bool:
+    return statement_info(conn, query, params).read_only
+
+
+def within(
+    budget: QueryBudget | None, conn: sqlite3.Connection
+) -> AbstractContextManager[None]:
+    return budget.applied(conn) if budget is not None else nullcontext()
+
+
+def fetch_rows(cursor: sqlite3.Cursor, budget: QueryBudget | None) -> list[Any]:
+    """Fetch every row, but stop as soon as there are more than the budget allows."""
+    if budget is None or not budget.max_rows:
+        return cursor.fetchall()
+    rows = cursor.fetchmany(budget.max_rows + 1)
+    budget.check_rows(len(rows))
+    return rows
+
+
+def check_size(response: QueryResponse, budget: QueryBudget | None) -> QueryResponse:
+    if budget is not None:
+        budget.check_bytes(len(response.body))
+    return response
+
+
+def quote_identifier(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_names(cursor: sqlite3.Cursor) -> list[str]:
+    return [column[0] for column in cursor.description or ()]
+
+
+def encode_cursor(page_key: str, last_value: Any) -> str:
+    payload = json.dumps({"key": page_key, "after": last_value}).encode()
+    return base64.urlsafe_b64encode(payload).decode()
+
+
+def decode_cursor(cursor: str, page_key: str) -> Any:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ValueError("Invalid pagination cursor.")
+    if payload.get("key") != page_key:
+        raise ValueError("Pagination cursor does not match page_key.")
+    return payload["after"]
+
+
+def shape_rows(
+    cursor: sqlite3.Cursor, rows: list[Any], result_format: ResultFormatEnum
+) -> Any:
+    """Lay rows out as a list of dicts, or as column names plus row arrays."""
+    if result_format == ResultFormatEnum.COLUMNS:
+        return {"columns": column_names(cursor), "rows": [tuple(row) for row in rows]}
+    return [dict(row) for row in rows]
+
+
+def to_arrow(cursor: sqlite3.Cursor, rows: list[Any]) -> bytes:
+    """Encode rows as an Apache Arrow IPC stream."""
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError(
+            "The arrow format requires pyarrow. Install the 'arrow' extra."
+        )
+    names = column_names(cursor)
+    columns = list(zip(*rows)) if rows else [() for _ in names]
+    table = pa.Table.from_arrays([pa.array(list(c)) for c in columns], names=names)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def run_query(
+    conn: sqlite3.Connection, sql_query: SQLQuery, budget: QueryBudget | None = None
+) -> QueryResponse:
+    """
+    Execute a read-only query on `conn` and return its encoded response body,
+    within `budget`. Blocking: meant to be run on the database executor.
+    """
+    if sql_query.page_size is not None:
+        return run_page(conn, sql_query, budget)
+    cursor = conn.cursor()
+    with within(budget, conn):
+        with phase("execute"):
+            cursor.execute(sql_query.query, sql_query.params or ())
+        with phase("fetch"):
+            rows = fetch_rows(cursor, budget)
+    count_rows(len(rows))
+    with phase("serialize"):
+        if sql_query.format == ResultFormatEnum.ARROW:
+            body, media_type = to_arrow(cursor, rows), ARROW_MEDIA_TYPE
+        else:
+            result = shape_rows(cursor, rows, sql_query.format)
+            body, media_type = dumps({"result": result}), JSON_MEDIA_TYPE
+    response = QueryResponse(body, media_type, len(rows))
+    cursor.close()
+    return check_size(response, budget)
+
+
+def _check_no_transaction_control(
+    conn: sqlite3.Connection, query: str, params: Any = None
+) -> None:
+    if statement_info(conn, query, params).transaction_control:
+        raise ValueError(
+            "Transaction control statements are not allowed: each call runs in "
+            "its own transaction. Use /execute_batch to group statements."
+        )
+
+
+def run_write(
+    conn: sqlite3.Connection, sql_query: SQLQuery, budget: QueryBudget | None = None
+) -> QueryResponse:
+    """
+    Execute a statement that writes, within the time and step limits of
+    `budget`, and return its encoded response body.
+    Caller owns the transaction: meant to be run on the database writer.
+    """
+    if sql_query.page_size is not None:
+        raise ValueError("Pagination is only supported for read-only queries.")
+    _check_no_transaction_control(conn, sql_query.query, sql_query.params)
+    cursor = conn.cursor()
+    with within(budget, conn), phase("execute"):
+        before = view_changes(conn)
+        cursor.execute(sql_query.query, sql_query.params or ())
+        # Rows of a RETURNING clause are not returned, but must be read for
+        # the statement to finish
+        cursor.fetchall()
+    result = {"rows_affected": changed_rows(cursor, before)}
+    cursor.close()
+    return QueryResponse(
+        dumps({"result": result}), JSON_MEDIA_TYPE, result["rows_affected"]
+    )
+
+
+def run_batch(
+    conn: sqlite3.Connection, batch: SQLBatch, budget: QueryBudget | None = None
+) -> QueryResponse:
+    """
+    Run every statement of `batch`, within the time and step limits of
+    `budget` for the whole batch. Caller owns the transaction: meant to be
+    run on the database writer, so that the whole batch is rolled back if
+    any statement fails.
+    """
+    cursor = conn.cursor()
+    rowcounts: list[int] = []
+    try:
+        with within(budget, conn), phase("execute"):
+            if batch.query is not None:
+                _check_no_transaction_control(conn, batch.query)
+                before = view_changes(conn)
+                cursor.executemany(batch.query, batch.param_sets or [])
+                rowcounts.append(changed_rows(cursor, before))
+            for i, statement in enumerate(batch.statements or []):
+                try:
+                    _check_no_transaction_control(
+                        conn, statement.query, statement.params
+                    )
+                    before = view_changes(conn)
+                    cursor.execute(statement.query, statement.params or ())
+                except sqlite3.Error as e:
+                    raise sqlite3.Error(f"Statement {i} failed: {e}") from e
+                rowcounts.append(changed_rows(cursor, before))
+    finally:
+        cursor.close()
+    return QueryResponse(
+        dumps({"rowcounts": rowcounts, "rows_affected": sum(rowcounts)}),
+        JSON_MEDIA_TYPE,
+        sum(rowcounts),
+    )
+
+
+def run_page(
+    conn: sqlite3.Connection, sql_query: SQLQuery, budget: QueryBudget | None = None
+) -> QueryResponse:
+    """
+    Return one keyset page of a SELECT.
+    The query is wrapped so SQLite only ever produces `page_size` rows past
+    the cursor; `page_key` must be a unique column selected by the query.
+    """
+    if not is_read_only(conn, sql_query.query, sql_query.params):
+        raise ValueError("Pagination is only supported for read-only queries.")
+    if not sql_query.page_key:
+        raise ValueError("page_key is required when page_size is set.")
+    if sql_query.format == ResultFormatEnum.ARROW:
+        raise ValueError("Pagination is not supported with the arrow format.")
+    key = quote_identifier(sql_query.page_key)
+    inner = sql_query.query.strip().rstrip(";")
+    # Page bounds are bound like the caller's own parameters, so the wrapped
+    # statement text does not change from one page to the next and stays in
+    # the connection's statement cache.
+    named = isinstance(sql_query.params, dict)
+    params: list[Any] | dict[str, Any] = (
+        dict(sql_query.params) if named else list(sql_query.params or ())
+    )
+    where = ""
+    if sql_query.cursor:
+        after = decode_cursor(sql_query.cursor, sql_query.page_key)
+        where = f" WHERE {key} > " + (":_page_after" if named else "?")
+        if named:
+            params["_page_after"] = after
+        else:
+            params.append(after)
+    if named:
+        params["_page_limit"] = sql_query.page_size + 1
+    else:
+        params.append(sql_query.page_size + 1)
+    limit = ":_page_limit" if named else "?"
+    cursor = conn.cursor()
+    with within(budget, conn):
+        with phase("execute"):
+            cursor.execute(
+                f"SELECT * FROM ({inner}){where} ORDER BY {key} LIMIT {limit}",
+                params,
+            )
+        if sql_query.page_key not in column_names(cursor):
+            cursor.close()
+            raise ValueError(
+                f"page_key {sql_query.page_key!r} must be a column selected by the "
+                'query, e.g. "SELECT rowid AS id, ..." with page_key "id".'
+            )
+        with phase("fetch"):
+            rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > sql_query.page_size:
+        rows = rows[: sql_query.page_size]
+        next_cursor = encode_cursor(sql_query.page_key, rows[-1][sql_query.page_key])
+    if budget is not None:
+        budget.check_rows(len(rows))
+    count_rows(len(rows))
+    with phase("serialize"):
+        result = shape_rows(cursor, rows, sql_query.format)
+        body = dumps({"result": result, "next_cursor": next_cursor})
+    cursor.close()
+    return check_size(QueryResponse(body, JSON_MEDIA_TYPE, len(rows)), budget)
+
+
+def open_stream(
+    conn: sqlite3.Connection, sql_query: SQLQuery, budget: QueryBudget | None = None
+) -> sqlite3.Cursor:
+    """
+    Start a read-only query whose rows are then pulled with `fetch_ndjson`.
+    Streams are not buffered: only the time and step limits of `budget`
+    apply, to the whole stream.
+    """
+    if not is_read_only(conn, sql_query.query, sql_query.params):
+        raise ValueError("Streaming is only supported for read-only queries.")
+    if sql_query.format == ResultFormatEnum.ARROW:
+        raise ValueError("Streaming is not supported with the arrow format.")
+    cursor = conn.cursor()
+    with within(budget, conn), phase("execute"):
+        cursor.execute(sql_query.query, sql_query.params or ())
+    return cursor
+
+
+def stream_header(cursor: sqlite3.Cursor, result_format: ResultFormatEnum) -> bytes:
+    """First NDJSON line of a stream: the column names, for the columns format."""
+    if result_format == ResultFormatEnum.COLUMNS:
+        return dumps({"columns": column_names(cursor)}) + b"\n"
+    return b""
+
+
+def fetch_ndjson(
+    cursor: sqlite3.Cursor,
+    size: int,
+    result_format: ResultFormatEnum,
+    budget: QueryBudget | None = None,
+) -> bytes:
+    """Fetch up to `size` rows and encode them as newline-delimited JSON."""
+    with within(budget, cursor.connection), phase("fetch"):
+        rows = cursor.fetchmany(size)
+    count_rows(len(rows))
+    with phase("serialize"):
+        if result_format == ResultFormatEnum.COLUMNS:
+            return b"".join(dumps(tuple(row)) + b"\n" for row in rows)
+        return b"".join(dumps(dict(row)) + b"\n" for row in rows)
@@ -0,0 +1,133 @@
+import hashlib
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple
+
+import orjson
+
+from database_pkg.config.schemas import SQLQuery
+from database_pkg.pool import connect
+from database_pkg.sql_text import normalize_sql
+
+logger = logging.getLogger(__name__)
+
+
+class CachedResult(NamedTuple):
+    body: bytes
+    media_type: str
+
+
+class ResultCache:
+    """
+    In-process LRU cache of encoded SELECT results, bounded in bytes.
+
+    Entries are tagged with the database's `PRAGMA data_version`, read on a
+    dedicated connection that never writes. SQLite changes that value after
+    every commit made by any other connection, in this process or not, so
+    the whole cache is dropped as soon as a write is seen. On a partitioned
+    database, the data versions of the main database and its partitions
+    are summed.
+    """
+
+    def __init__(self, db_path: Path | str, max_bytes: int) -> None:
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        # A single result may not take more than a quarter of the cache
+        self.max_entry_bytes = max_bytes // 4
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[str, CachedResult] = OrderedDict()
+        self._bytes = 0
+        self._version: int | None = None
+        self._lock = threading.Lock()
+        self._sentinel: sqlite3.Connection | None = None
+
+    @staticmethod
+    def key(sql_query: SQLQuery) -> str:
+        fields = sql_query.model_dump(mode="json", exclude={"query", "cache"})
+        fields["query"] = normalize_sql(sql_query.query)
+        return hashlib.sha256(
+            orjson.dumps(fields, option=orjson.OPT_SORT_KEYS)
+        ).hexdigest()
+
+    @staticmethod
+    def etag(key: str, version: int) -> str:
+        return '"' + hashlib.sha256(f"{key}:{version}".encode()).hexdigest()[:32] + '"'
+
+    def data_version(self) -> int:
+        """Current data version. Blocking: run it on the database executor."""
+        with self._lock:
+            if self._sentinel is None:
+                # Attaching the partitions, whose writes count too
+                self._sentinel = connect(self.db_path, read_only=True)
+            version = sum(
+                self._sentinel.execute(f'PRAGMA "{name}".data_version').fetchone()[0]
+                for _, name, _ in self._sentinel.execute("PRAGMA database_list")
+                if name != "temp"
+            )
+            if version != self._version:
+                if self._entries:
+                    logger.debug(
+                        f"Data version changed, dropping {len(self._entries)} cached results"
+                    )
+                self._entries.clear()
+                self._bytes = 0
+                self._version = version
+            return version
+
+    def get(self, key: str, version: int) -> CachedResult | None:
+        with self._lock:
+            entry = self._entries.get(key) if version == self._version else None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, version: int, body: bytes, media_type: str) -> None:
+        if len(body) > self.max_entry_bytes:
+            return
+        with self._lock:
+            if version != self._version:
+                return
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous.body)
+            self._entries[key] = CachedResult(body, media_type)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.body)
+
+    def stats(self) -> dict[str, int | float]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            if self._sentinel is not None:
+                self._sentinel.close()
+                self._sentinel = None
+            self._entries.clear()
+            self._bytes = 0
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """Whether an If-None-Match header value matches `etag`."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or any(
+        tag.removeprefix("W/") == etag for tag in candidates
+    )
@@ -0,0 +1,1028 @@
+import re
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+TRANSACTIONS_TABLE = "transactions"
+
+# Expression reading a transactions column (second argument) of a trigger's
+# NEW or OLD row (first argument), for triggers on the table storing them
+ColumnExpression = Callable[[str, str], str]
+
+# Columns of the transactions table, in order. "Source" holds the path of the
+# statement file a row was ingested from, relative to the blob directory, so
+# that re-ingesting a statement replaces its rows instead of duplicating them.
+TRANSACTION_COLUMNS = [
+    "Type",
+    "Product",
+    "Started Date",
+    "Completed Date",
+    "Description",
+    "Amount",
+    "Fee",
+    "Currency",
+    "QUI",
+    "COMMENT",
+    "Source",
+]
+
+TRANSACTIONS_DDL = """
+CREATE TABLE IF NOT EXISTS "transactions" (
+    "Type" TEXT,
+    "Product" TEXT,
+    "Started Date" TIMESTAMP,
+    "Completed Date" TIMESTAMP,
+    "Description" TEXT,
+    "Amount" REAL,
+    "Fee" REAL,
+    "Currency" TEXT,
+    "QUI" TEXT,
+    "COMMENT" TEXT,
+    "Source" TEXT
+)
+"""
+
+
+def table_exists(conn: sqlite3.Connection, name: str) -> bool:
+    """Whether `name` is a table or view, including the TEMP views of partitions."""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ? "
+        "UNION ALL "
+        "SELECT 1 FROM sqlite_temp_master WHERE type = 'view' AND name = ?",
+        (name, name),
+    ).fetchone()
+    return row is not None
+
+
+# Indexes kept on the transactions table for the usual date range, owner
+# and currency filters. "Source" is indexed so re-ingesting a statement
+# finds the rows it replaces without a full scan.
+TRANSACTIONS_INDEXES = {
+    "transactions_completed_date": ("Completed Date",),
+    "transactions_started_date": ("Started Date",),
+    "transactions_qui_completed_date": ("QUI", "Completed Date"),
+    "transactions_currency": ("Currency",),
+    "transactions_source": ("Source",),
+}
+
+
+def _is_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def ensure_transactions_table(conn: sqlite3.Connection) -> None:
+    """
+    Create the transactions table and its indexes if needed, and add the
+    "Source" column to tables created before it existed (e.g. by
+    excel_to_sqlite). Does nothing on a partitioned database, whose
+    partitions are prepared by database_pkg.partitions.
+    """
+    if is_partitioned(conn):
+        return
+    conn.execute(TRANSACTIONS_DDL)
+    columns = {row[1] for row in conn.execute('PRAGMA table_info("transactions")')}
+    if "Source" not in columns:
+        conn.execute('ALTER TABLE "transactions" ADD COLUMN "Source" TEXT')
+    ensure_transactions_indexes(conn)
+    ensure_monthly_summary(conn)
+    ensure_search_index(conn)
+
+
+def ensure_transactions_indexes(conn: sqlite3.Connection) -> list[str]:
+    """
+    Create the managed indexes missing from an existing transactions table
+    and return their names. Does nothing if the table does not exist.
+    """
+    if is_compact(conn):
+        return _create_missing_indexes(conn, COMPACT_TABLE, COMPACT_INDEXES)
+    if not _is_table(conn, TRANSACTIONS_TABLE):
+        return []
+    columns = {row[1] for row in conn.execute('PRAGMA table_info("transactions")')}
+    indexes = {
+        name: ", ".join(f'"{c}"' for c in indexed)
+        for name, indexed in TRANSACTIONS_INDEXES.items()
+        # Tables loaded by excel_to_sqlite may lack some of the columns
+        if columns.issuperset(indexed)
+    }
+    return _create_missing_indexes(conn, TRANSACTIONS_TABLE, indexes)
+
+
+def _create_missing_indexes(
+    conn: sqlite3.Connection, table: str, indexes: dict[str, str]
+) -> list[str]:
+    """Create the `indexes` (name: indexed columns) missing from `table`."""
+    existing = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+            (table,),
+        )
+    }
+    created = []
+    for name, column_list in indexes.items():
+        if name in existing:
+            continue
+        conn.execute(f'CREATE INDEX "{name}" ON "{table}" ({column_list})')
+        created.append(name)
+    return created
+
+
+MONTHLY_SUMMARY_TABLE = "monthly_summary"
+
+# Totals of transactions per month, owner, currency and type, kept up to
+# date by triggers on transactions. Missing owners, currencies and types
+# are stored as '' since NULLs never match in the primary key, and rows
+# without a "Completed Date" are counted in month 0 of year 0.
+MONTHLY_SUMMARY_DDL = """
+CREATE TABLE IF NOT EXISTS "monthly_summary" (
+    "year" INTEGER NOT NULL,
+    "month" INTEGER NOT NULL,
+    "QUI" TEXT NOT NULL,
+    "Currency" TEXT NOT NULL,
+    "Type" TEXT NOT NULL,
+    "count" INTEGER NOT NULL,
+    "Amount" REAL NOT NULL,
+    "Fee" REAL NOT NULL,
+    PRIMARY KEY ("year", "month", "QUI", "Currency", "Type")
+) WITHOUT ROWID
+"""
+
+SUMMARY_KEY = ("year", "month", "QUI", "Currency", "Type")
+
+
+def _column(row: str, column: str) -> str:
+    return f'{row}."{column}"'
+
+
+def _summary_key(row: str, column: ColumnExpression = _column) -> tuple[str, ...]:
+    """Expressions of the monthly_summary key for the NEW or OLD row."""
+    completed = column(row, "Completed Date")
+    return (
+        f"coalesce(CAST(substr({completed}, 1, 4) AS INTEGER), 0)",
+        f"coalesce(CAST(substr({completed}, 6, 2) AS INTEGER), 0)",
+        f"coalesce({column(row, 'QUI')}, '')",
+        f"coalesce({column(row, 'Currency')}, '')",
+        f"coalesce({column(row, 'Type')}, '')",
+    )
+
+
+def _add_to_summary(row: str, column: ColumnExpression = _column) -> str:
+    return f"""
+    INSERT INTO "monthly_summary"
+    VALUES ({", ".join(_summary_key(row, column))}, 1,
+        coalesce({column(row, "Amount")}, 0), coalesce({column(row, "Fee")}, 0))
+    ON CONFLICT ({", ".join(f'"{c}"' for c in SUMMARY_KEY)}) DO UPDATE SET
+        "count" = "count" + 1,
+        "Amount" = "Amount" + excluded."Amount",
+        "Fee" = "Fee" + excluded."Fee";
+    """
+
+
+def _remove_from_summary(row: str, column: ColumnExpression = _column) -> str:
+    match = " AND ".join(
+        f'"{c}" = {e}' for c, e in zip(SUMMARY_KEY, _summary_key(row, column))
+    )
+    return f"""
+    UPDATE "monthly_summary" SET
+        "count" = "count" - 1,
+        "Amount" = "Amount" - coalesce({column(row, "Amount")}, 0),
+        "Fee" = "Fee" - coalesce({column(row, "Fee")}, 0)
+    WHERE {match};
+    DELETE FROM "monthly_summary" WHERE {match} AND "count" <= 0;
+    """
+
+
+def _summary_triggers(
+    table: str, watched: tuple[str, ...], column: ColumnExpression = _column
+) -> dict[str, str]:
+    """Triggers keeping the summary in sync with `table`, whose rows `column` reads."""
+    update_of = ", ".join(f'"{c}"' for c in watched)
+    return {
+        "monthly_summary_insert": f"""
+CREATE TRIGGER IF NOT EXISTS "monthly_summary_insert"
+AFTER INSERT ON "{table}" BEGIN {_add_to_summary("NEW", column)} END
+""",
+        "monthly_summary_delete": f"""
+CREATE TRIGGER IF NOT EXISTS "monthly_summary_delete"
+AFTER DELETE ON "{table}" BEGIN {_remove_from_summary("OLD", column)} END
+""",
+        "monthly_summary_update": f"""
+CREATE TRIGGER IF NOT EXISTS "monthly_summary_update"
+AFTER UPDATE OF {update_of}
+ON "{table}" BEGIN {_remove_from_summary("OLD", column)} {_add_to_summary("NEW", column)} END
+""",
+    }
+
+
+MONTHLY_SUMMARY_TRIGGERS = _summary_triggers(
+    TRANSACTIONS_TABLE,
+    ("Completed Date", "QUI", "Currency", "Type", "Amount", "Fee"),
+)
+
+REBUILD_MONTHLY_SUMMARY = f"""
+INSERT INTO "monthly_summary"
+SELECT {", ".join(_summary_key('"transactions"'))},
+    count(*), total("Amount"), total("Fee")
+FROM "transactions"
+GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def ensure_monthly_summary(conn: sqlite3.Connection) -> bool:
+    """
+    Create the monthly summary and its triggers on an existing transactions
+    table. The summary is filled from scratch whenever it or one of its
+    triggers was missing, since writes may then have gone uncounted.
+    Returns whether it was.
+    """
+    storage = transactions_storage(conn)
+    if storage is None:
+        return False
+    triggers = summary_triggers(storage)
+    if _is_table(conn, MONTHLY_SUMMARY_TABLE) and _has_triggers(
+        conn, storage, triggers
+    ):
+        return False
+    conn.execute(MONTHLY_SUMMARY_DDL)
+    for ddl in triggers.values():
+        conn.execute(ddl)
+    conn.execute('DELETE FROM "monthly_summary"')
+    conn.execute(REBUILD_MONTHLY_SUMMARY)
+    return True
+
+
+def _has_triggers(conn: sqlite3.Connection, table: str, triggers: dict) -> bool:
+    existing = {
+        row[0]
+        for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = ?",
+            (table,),
+        )
+    }
+    return existing.issuperset(triggers)
+
+
+SEARCH_TABLE = "transactions_fts"
+
+# Full-text index of "Description" and "COMMENT". It stores no text of its
+# own: it reads it from transactions by rowid, through the transaction_rows
+# view on the compact schema, and triggers keep it in sync.
+# Accents are ignored and 2 and 3 character prefixes are indexed, for
+# search-as-you-type. VACUUM may renumber the rowids of transactions, after
+# which the index must be rebuilt.
+SEARCH_DDL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS "transactions_fts" USING fts5(
+    "Description",
+    "COMMENT",
+    content='{content}',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+)
+"""
+
+_SEARCH_INSERT = """
+    INSERT INTO "transactions_fts" ("rowid", "Description", "COMMENT")
+    VALUES (NEW."rowid", NEW."Description", NEW."COMMENT");
+"""
+
+_SEARCH_DELETE = """
+    INSERT INTO "transactions_fts" ("transactions_fts", "rowid", "Description", "COMMENT")
+    VALUES ('delete', OLD."rowid", OLD."Description", OLD."COMMENT");
+"""
+
+
+def _search_triggers(table: str) -> dict[str, str]:
+    """
+    Triggers keeping the full-text index in sync with `table`. Column names
+    are case-insensitive, so they also fit the compact schema's columns.
+    """
+    return {
+        "transactions_fts_insert": f"""
+CREATE TRIGGER IF NOT EXISTS "transactions_fts_insert"
+AFTER INSERT ON "{table}" BEGIN {_SEARCH_INSERT} END
+""",
+        "transactions_fts_delete": f"""
+CREATE TRIGGER IF NOT EXISTS "transactions_fts_delete"
+AFTER DELETE ON "{table}" BEGIN {_SEARCH_DELETE} END
+""",
+        "transactions_fts_update": f"""
+CREATE TRIGGER IF NOT EXISTS "transactions_fts_update"
+AFTER UPDATE OF "Description", "COMMENT" ON "{table}"
+BEGIN {_SEARCH_DELETE} {_SEARCH_INSERT} END
+""",
+    }
+
+
+SEARCH_TRIGGERS = _search_triggers(TRANSACTIONS_TABLE)
+
+REBUILD_SEARCH_INDEX = """
+INSERT INTO "transactions_fts" ("transactions_fts") VALUES ('rebuild')
+"""
+
+
+def has_fts5(conn: sqlite3.Connection) -> bool:
+    return any(
+        row[0] == "ENABLE_FTS5" for row in conn.execute("PRAGMA compile_options")
+    )
+
+
+def ensure_search_index(conn: sqlite3.Connection) -> bool:
+    """
+    Create the full-text index and its triggers on an existing transactions
+    table, and rebuild it whenever it or one of its triggers was missing.
+    Returns whether it was. Does nothing if SQLite was built without FTS5.
+    """
+    storage = transactions_storage(conn)
+    if storage is None or not has_fts5(conn):
+        return False
+    triggers = search_triggers(storage)
+    if _is_table(conn, SEARCH_TABLE) and _has_triggers(conn, storage, triggers):
+        return False
+    conn.execute(search_ddl(storage))
+    for ddl in triggers.values():
+        conn.execute(ddl)
+    conn.execute(REBUILD_SEARCH_INDEX)
+    return True
+
+
+# Compact schema, opted into with database_pkg.compact: transactions are
+# stored in the STRICT transactions_data table, with amounts and fees in
+# integer cents, dates as Unix timestamps, and types, products, currencies
+# and owners as ids into dictionary tables. "transactions" becomes a view
+# with the original columns, that triggers make writable.
+COMPACT_TABLE = "transactions_data"
+MINOR_UNITS = 100
+
+# Views have no rowid. Where "transactions" is a view, transaction_rows is
+# the same view with the rowid as first column, for queries and writes by
+# rowid.
+ROWS_VIEW = "transaction_rows"
+
+# Dictionary table of each low-cardinality column, and the column of
+# transactions_data holding its ids
+DICTIONARIES = {
+    "Type": ("transaction_types", "type_id"),
+    "Product": ("products", "product_id"),
+    "Currency": ("currencies", "currency_id"),
+    "QUI": ("owners", "owner_id"),
+}
+
+COMPACT_DDL = """
+CREATE TABLE IF NOT EXISTS "transactions_data" (
+    "id" INTEGER PRIMARY KEY,
+    "type_id" INTEGER REFERENCES "transaction_types",
+    "product_id" INTEGER REFERENCES "products",
+    "started_at" INTEGER,
+    "completed_at" INTEGER,
+    "description" TEXT,
+    "amount" INTEGER,
+    "fee" INTEGER,
+    "currency_id" INTEGER REFERENCES "currencies",
+    "owner_id" INTEGER REFERENCES "owners",
+    "comment" TEXT,
+    "source" TEXT
+) STRICT
+"""
+
+DICTIONARY_DDL = """
+CREATE TABLE IF NOT EXISTS "{table}" (
+    "id" INTEGER PRIMARY KEY,
+    "name" TEXT NOT NULL UNIQUE
+) STRICT
+"""
+
+# Transactions columns other than dictionary ones, read from a row of
+# transactions_data, and the expression storing each from a row of the view
+_COMPACT_COLUMNS = {
+    "Started Date": (
+        "datetime({row}.\"started_at\", 'unixepoch')",
+        "CAST(strftime('%s', {row}.\"Started Date\") AS INTEGER)",
+    ),
+    "Completed Date": (
+        "datetime({row}.\"completed_at\", 'unixepoch')",
+        "CAST(strftime('%s', {row}.\"Completed Date\") AS INTEGER)",
+    ),
+    "Description": ('{row}."description"', '{row}."Description"'),
+    "Amount": (
+        f'{{row}}."amount" / {MINOR_UNITS:.1f}',
+        f'CAST(round({{row}}."Amount" * {MINOR_UNITS}) AS INTEGER)',
+    ),
+    "Fee": (
+        f'{{row}}."fee" / {MINOR_UNITS:.1f}',
+        f'CAST(round({{row}}."Fee" * {MINOR_UNITS}) AS INTEGER)',
+    ),
+    "COMMENT": ('{row}."comment"', '{row}."COMMENT"'),
+    "Source": ('{row}."source"', '{row}."Source"'),
+}
+
+# Stored columns of transactions_data, in order, with the transactions
+# column each holds
+_STORED_COLUMNS = {
+    "type_id": "Type",
+    "product_id": "Product",
+    "started_at": "Started Date",
+    "completed_at": "Completed Date",
+    "description": "Description",
+    "amount": "Amount",
+    "fee": "Fee",
+    "currency_id": "Currency",
+    "owner_id": "QUI",
+    "comment": "COMMENT",
+    "source": "Source",
+}
+
+
+def compact_indexed_column(expression: str) -> str | None:
+    """
+    Transactions column an indexed column or expression of transactions_data
+    reads, if it reads exactly one, e.g. "Completed Date" for
+    datetime("completed_at", 'unixepoch').
+    """
+    read = [c for c in _STORED_COLUMNS if re.search(rf"\b{c}\b", expression)]
+    return _STORED_COLUMNS[read[0]] if len(read) == 1 else None
+
+
+def _compact_column(row: str, column: str) -> str:
+    """Expression of transactions `column` for a row of transactions_data."""
+    if column in DICTIONARIES:
+        table, id_column = DICTIONARIES[column]
+        return f'(SELECT "name" FROM "{table}" WHERE "id" = {row}."{id_column}")'
+    return _COMPACT_COLUMNS[column][0].format(row=row)
+
+
+def _stored_value(row: str, stored: str) -> str:
+    """Expression of transactions_data column `stored` for a row of transactions."""
+    column = _STORED_COLUMNS[stored]
+    if column in DICTIONARIES:
+        table, _ = DICTIONARIES[column]
+        return f'(SELECT "id" FROM "{table}" WHERE "name" = {row}."{column}")'
+    return _COMPACT_COLUMNS[column][1].format(row=row)
+
+
+def compact_insert_select(row: str, rowid: str | None = None) -> str:
+    """
+    INSERT of the transactions row `row` into transactions_data, with id
+    `rowid` (the row's own rowid by default, "NULL" for a new one), once its
+    dictionary names are stored.
+    """
+    rowid = rowid or f'{row}."rowid"'
+    stored = ", ".join(_stored_value(row, c) for c in _STORED_COLUMNS)
+    return (
+        f'INSERT INTO "transactions_data" ("id", {", ".join(f'"{c}"' for c in _STORED_COLUMNS)}) '
+        f"SELECT {rowid}, {stored}"
+    )
+
+
+def _store_names(row: str) -> str:
+    return "".join(
+        f'INSERT OR IGNORE INTO "{table}" ("name") '
+        f'SELECT {row}."{column}" WHERE {row}."{column}" IS NOT NULL;\n    '
+        for column, (table, _) in DICTIONARIES.items()
+    )
+
+
+def _view_column(column: str) -> str:
+    if column in DICTIONARIES:
+        return f'"{DICTIONARIES[column][0]}"."name"'
+    return _COMPACT_COLUMNS[column][0].format(row='"d"')
+
+
+COMPACT_ROWS_VIEW_DDL = (
+    'CREATE VIEW IF NOT EXISTS "transaction_rows" AS\nSELECT "d"."id" AS "rowid", '
+    + ", ".join(f'{_view_column(c)} AS "{c}"' for c in TRANSACTION_COLUMNS)
+    + '\nFROM "transactions_data" AS "d"'
+    + "".join(
+        f'\nLEFT JOIN "{table}" ON "{table}"."id" = "d"."{id_column}"'
+        for table, id_column in DICTIONARIES.values()
+    )
+)
+
+COMPACT_VIEW_DDL = (
+    'CREATE VIEW IF NOT EXISTS "transactions" AS\nSELECT '
+    + ", ".join(f'"{c}"' for c in TRANSACTION_COLUMNS)
+    + ' FROM "transaction_rows"'
+)
+
+
+def _compact_write_triggers(
+    view: str, new_rowid: str, old_rowid: str
+) -> dict[str, str]:
+    """
+    INSTEAD OF triggers turning writes to `view` into writes to
+    transactions_data, adding the names they introduce to the dictionaries.
+    """
+    assignments = ", ".join(
+        f'"{c}" = {_stored_value("NEW", c)}' for c in _STORED_COLUMNS
+    )
+    return {
+        f"{view}_insert": f"""
+CREATE TRIGGER IF NOT EXISTS "{view}_insert"
+INSTEAD OF INSERT ON "{view}" BEGIN
+    {_store_names("NEW")}{compact_insert_select("NEW", new_rowid)};
+END
+""",
+        f"{view}_delete": f"""
+CREATE TRIGGER IF NOT EXISTS "{view}_delete"
+INSTEAD OF DELETE ON "{view}" BEGIN
+    DELETE FROM "transactions_data" WHERE "id" = {old_rowid};
+END
+""",
+        f"{view}_update": f"""
+CREATE TRIGGER IF NOT EXISTS "{view}_update"
+INSTEAD OF UPDATE ON "{view}" BEGIN
+    {_store_names("NEW")}UPDATE "transactions_data" SET {assignments}
+    WHERE "id" = {old_rowid};
+END
+""",
+    }
+
+
+def same_row(row: str) -> str:
+    """Whether a transactions row has the values of `row`, NULLs included."""
+    return " AND ".join(f'"{c}" IS {row}."{c}"' for c in TRANSACTION_COLUMNS)
+
+
+# Writes to "transactions" cannot tell its rows apart by rowid: each goes to
+# the first row with the same values. Rows with the same values only differ
+# by their rowid, so whichever is written leaves the view the same.
+COMPACT_WRITE_TRIGGERS = {
+    **_compact_write_triggers(ROWS_VIEW, 'NEW."rowid"', 'OLD."rowid"'),
+    **_compact_write_triggers(
+        TRANSACTIONS_TABLE,
+        "NULL",
+        f'(SELECT "rowid" FROM "{ROWS_VIEW}" WHERE {same_row("OLD")} LIMIT 1)',
+    ),
+}
+
+# Indexes matching the view's expressions, so the date range, owner and
+# currency filters of queries on the view keep using an index
+COMPACT_INDEXES = {
+    "transactions_data_completed_date": "datetime(\"completed_at\", 'unixepoch')",
+    "transactions_data_started_date": "datetime(\"started_at\", 'unixepoch')",
+    "transactions_data_owner_completed_date": (
+        '"owner_id", datetime("completed_at", \'unixepoch\')'
+    ),
+    "transactions_data_currency": '"currency_id"',
+    "transactions_data_source": '"source"',
+}
+
+COMPACT_SUMMARY_TRIGGERS = _summary_triggers(
+    COMPACT_TABLE,
+    ("completed_at", "owner_id", "currency_id", "type_id", "amount", "fee"),
+    _compact_column,
+)
+
+COMPACT_SEARCH_TRIGGERS = _search_triggers(COMPACT_TABLE)
+
+
+def is_compact(conn: sqlite3.Connection) -> bool:
+    """Whether the database uses the compact schema."""
+    return _is_table(conn, COMPACT_TABLE)
+
+
+def transactions_by_rowid(conn: sqlite3.Connection) -> str:
+    """
+    Name to query transactions by rowid under: "transactions" if it is a
+    table, else the transaction_rows view.
+    """
+    if is_compact(conn) or is_partitioned(conn):
+        return ROWS_VIEW
+    return TRANSACTIONS_TABLE
+
+
+def transactions_storage(conn: sqlite3.Connection) -> str | None:
+    """Table storing the transactions, None if there is none yet."""
+    if is_compact(conn):
+        return COMPACT_TABLE
+    if _is_table(conn, TRANSACTIONS_TABLE):
+        return TRANSACTIONS_TABLE
+    return None
+
+
+def summary_triggers(storage: str) -> dict[str, str]:
+    """Monthly summary triggers of the `storage` table."""
+    if storage == COMPACT_TABLE:
+        return COMPACT_SUMMARY_TRIGGERS
+    return MONTHLY_SUMMARY_TRIGGERS
+
+
+def search_ddl(storage: str) -> str:
+    """Full-text index of transactions stored in the `storage` table."""
+    if storage == COMPACT_TABLE:
+        return SEARCH_DDL.format(content=ROWS_VIEW)
+    return SEARCH_DDL.format(content=TRANSACTIONS_TABLE)
+
+
+def search_triggers(storage: str) -> dict[str, str]:
+    """Full-text index triggers of the `storage` table."""
+    if storage == COMPACT_TABLE:
+        return COMPACT_SEARCH_TRIGGERS
+    return SEARCH_TRIGGERS
+
+
+def create_compact_schema(conn: sqlite3.Connection) -> None:
+    """
+    Create the compact schema's tables, view and write triggers. The
+    transactions table must be gone first.
+    """
+    for table, _ in DICTIONARIES.values():
+        conn.execute(DICTIONARY_DDL.format(table=table))
+    conn.execute(COMPACT_DDL)
+    conn.execute(COMPACT_ROWS_VIEW_DDL)
+    conn.execute(COMPACT_VIEW_DDL)
+    for ddl in COMPACT_WRITE_TRIGGERS.values():
+        conn.execute(ddl)
+
+
+# SQLite reports no changes for writes to a view, which is what the compact
+# schema and year partitions make of "transactions". TEMP triggers count the
+# rows written through it, or transaction_rows, on each connection instead.
+VIEW_CHANGES_TABLE = "view_changes"
+
+
+def count_view_changes(conn: sqlite3.Connection) -> None:
+    """Count the rows written through "transactions" on `conn`, if it is a view."""
+    if not is_compact(conn) and not is_partitioned(conn):
+        return
+    # CREATE ... AS, unlike an INSERT, opens no transaction
+    conn.execute('CREATE TEMP TABLE IF NOT EXISTS "view_changes" AS SELECT 0 AS "rows"')
+    for view in (TRANSACTIONS_TABLE, ROWS_VIEW):
+        for operation in ("INSERT", "UPDATE", "DELETE"):
+            conn.execute(
+                f'CREATE TEMP TRIGGER IF NOT EXISTS "{view}_count_{operation.lower()}" '
+                f'INSTEAD OF {operation} ON "{view}" '
+                'BEGIN UPDATE "view_changes" SET "rows" = "rows" + 1; END'
+            )
+
+
+def view_changes(conn: sqlite3.Connection) -> int:
+    """Rows written through the views of transactions on `conn` so far."""
+    try:
+        return conn.execute('SELECT "rows" FROM temp."view_changes"').fetchone()[0]
+    except sqlite3.OperationalError:
+        # Not counted: "transactions" is a table
+        return 0
+
+
+def changed_rows(cursor: sqlite3.Cursor, view_changes_before: int) -> int:
+    """
+    Rows changed by the statement just run on `cursor`, including those
+    written through the "transactions" view. `view_changes_before` is
+    view_changes() from before the statement.
+    """
+    through_view = view_changes(cursor.connection) - view_changes_before
+    return cursor.rowcount + through_view if through_view else cursor.rowcount
+
+
+# Year partitions, opted into with database_pkg.partitions: transactions are
+# stored in one database file per year, or per range of years, next to the
+# main one, plus a default file for rows without a date or whose year has no
+# file of its own. Each is a complete transactions database with its indexes,
+# monthly summary and search index. Connections attach them all, and
+# "transactions", transaction_rows and "monthly_summary" become TEMP views
+# over them, with TEMP triggers routing writes to the partition of each
+# row's year.
+PARTITIONS_TABLE = "partitions"
+DEFAULT_PARTITION = "default"
+
+PARTITIONS_DDL = """
+CREATE TABLE IF NOT EXISTS "partitions" (
+    "name" TEXT PRIMARY KEY,
+    "first_year" INTEGER,
+    "last_year" INTEGER,
+    "closed" INTEGER NOT NULL DEFAULT 0
+)
+"""
+
+# Rowids of a year partition start at its first year times ROWID_BLOCK, so
+# that they stay unique across partitions. The default partition's stay below.
+ROWID_BLOCK = 10**9
+
+
+@dataclass(frozen=True)
+class Partition:
+    name: str
+    # None for the default partition
+    first_year: int | None
+    last_year: int | None
+    # Closed partitions are attached immutable and refuse writes
+    closed: bool = False
+
+    @property
+    def schema(self) -> str:
+        """Name the partition is attached under."""
+        return "partition_" + self.name.replace("-", "_")
+
+    @property
+    def view(self) -> str:
+        """
+        Writable view of the partition's transactions. Triggers may only
+        write to unqualified tables, so routed writes go through a name
+        that is unique across partitions.
+        """
+        return "transactions_" + self.name.replace("-", "_")
+
+    def path(self, db_path: Path | str) -> Path:
+        """Partition file next to the main database file `db_path`."""
+        db_path = Path(db_path)
+        return db_path.with_name(f"{db_path.stem}.{self.name}{db_path.suffix}")
+
+    def routes(self, row: str, partitions: list["Partition"]) -> str:
+        """Whether the NEW or OLD `row` belongs in this partition, 0 or 1."""
+        year = partition_year(row)
+        if self.first_year is not None:
+            return f"coalesce({year} BETWEEN {self.first_year} AND {self.last_year}, 0)"
+        dated = " OR ".join(
+            f"{year} BETWEEN {p.first_year} AND {p.last_year}"
+            for p in partitions
+            if p.first_year is not None
+        )
+        return f"(NOT coalesce({dated or 0}, 0))"
+
+    def holds(self, row: str) -> str:
+        """Whether the rowid of `row` is in this partition's block."""
+        if self.first_year is None:
+            return f'({row}."rowid" < {ROWID_BLOCK})'
+        first = self.first_year * ROWID_BLOCK
+        last = (self.last_year + 1) * ROWID_BLOCK - 1
+        return f'({row}."rowid" BETWEEN {first} AND {last})'
+
+
+def partition_year(row: str) -> str:
+    """Year a row is partitioned by: of its completion, else of its start."""
+    return (
+        f'CAST(substr(coalesce({row}."Completed Date", {row}."Started Date"), 1, 4) '
+        "AS INTEGER)"
+    )
+
+
+def is_partitioned(conn: sqlite3.Connection) -> bool:
+    return _is_table(conn, PARTITIONS_TABLE)
+
+
+def list_partitions(conn: sqlite3.Connection) -> list[Partition]:
+    """Partitions of the database, the default one first then by year."""
+    if not is_partitioned(conn):
+        return []
+    return [
+        Partition(name, first_year, last_year, bool(closed))
+        for name, first_year, last_year, closed in conn.execute(
+            'SELECT "name", "first_year", "last_year", "closed" FROM "partitions" '
+            'ORDER BY "first_year"'
+        )
+    ]
+
+
+def transactions_schemas(conn: sqlite3.Connection) -> list[str]:
+    """Attached databases holding transactions: the partitions, or main."""
+    if is_partitioned(conn):
+        return [p.schema for p in list_partitions(conn)]
+    return ["main"]
+
+
+def _quoted_columns(row: str | None = None) -> str:
+    prefix = f"{row}." if row else ""
+    return ", ".join(f'{prefix}"{c}"' for c in TRANSACTION_COLUMNS)
+
+
+def partition_view_ddl(partition: Partition) -> list[str]:
+    """
+    The partition's writable view and its triggers, created in the
+    partition file itself.
+    """
+    view = partition.view
+    return [
+        f'CREATE VIEW IF NOT EXISTS "{view}" AS '
+        f'SELECT "rowid" AS "rowid", {_quoted_columns()} FROM "transactions"',
+        f"""
+CREATE TRIGGER IF NOT EXISTS "{view}_insert" INSTEAD OF INSERT ON "{view}" BEGIN
+    INSERT INTO "transactions" ("rowid", {_quoted_columns()})
+    VALUES (NEW."rowid", {_quoted_columns("NEW")});
+END
+""",
+        f"""
+CREATE TRIGGER IF NOT EXISTS "{view}_update" INSTEAD OF UPDATE ON "{view}" BEGIN
+    UPDATE "transactions" SET {", ".join(f'"{c}" = NEW."{c}"' for c in TRANSACTION_COLUMNS)}
+    WHERE "rowid" = OLD."rowid";
+END
+""",
+        f"""
+CREATE TRIGGER IF NOT EXISTS "{view}_delete" INSTEAD OF DELETE ON "{view}" BEGIN
+    DELETE FROM "transactions" WHERE "rowid" = OLD."rowid";
+END
+""",
+    ]
+
+
+def ensure_partition(conn: sqlite3.Connection, partition: Partition) -> None:
+    """
+    Create what a partition file holds on `conn`, a connection to it: the
+    transactions table with its indexes, summary and search index, and the
+    partition's writable view.
+    """
+    ensure_transactions_table(conn)
+    for ddl in partition_view_ddl(partition):
+        conn.execute(ddl)
+
+
+def _route_insert(partition: Partition, partitions: list[Partition]) -> str:
+    if partition.first_year is None:
+        rowid = "NULL"
+    else:
+        rowid = (
+            f'max(coalesce((SELECT max("rowid") FROM "{partition.view}"), 0), '
+            f"{partition.first_year * ROWID_BLOCK}) + 1"
+        )
+    return (
+        f'INSERT INTO "{partition.view}" ("rowid", {_quoted_columns()}) '
+        f'SELECT {rowid}, {_quoted_columns("NEW")} '
+        f'WHERE {partition.routes("NEW", partitions)}'
+    )
+
+
+def _refuse_closed(partition: Partition, condition: str) -> str:
+    return (
+        f"SELECT RAISE(ABORT, 'Partition {partition.name} is closed') "
+        f"WHERE {condition};"
+    )
+
+
+def _partition_write_triggers(
+    view: str,
+    partitions: list[Partition],
+    holds: Callable[[Partition], str],
+    old_rowid: Callable[[Partition], str],
+) -> list[str]:
+    """
+    TEMP triggers routing writes to `view`. `holds` tells whether a
+    partition holds the OLD row, and `old_rowid` is its rowid there.
+    """
+    opened = [p for p in partitions if not p.closed]
+    closed = [p for p in partitions if p.closed]
+    insert = [_refuse_closed(p, p.routes("NEW", partitions)) for p in closed] + [
+        _route_insert(p, partitions) + ";" for p in opened
+    ]
+    delete = [_refuse_closed(p, holds(p)) for p in closed] + [
+        f'DELETE FROM "{p.view}" WHERE "rowid" = {old_rowid(p)} AND {holds(p)};'
+        for p in opened
+    ]
+    assignments = ", ".join(f'"{c}" = NEW."{c}"' for c in TRANSACTION_COLUMNS)
+    update = [
+        _refuse_closed(p, f"{holds(p)} OR {p.routes('NEW', partitions)}")
+        for p in closed
+    ]
+    for p in opened:
+        update += [
+            f'UPDATE "{p.view}" SET {assignments} WHERE "rowid" = {old_rowid(p)} '
+            f'AND {holds(p)} AND {p.routes("NEW", partitions)};',
+            f'DELETE FROM "{p.view}" WHERE "rowid" = {old_rowid(p)} '
+            f'AND {holds(p)} AND NOT {p.routes("NEW", partitions)};',
+            _route_insert(p, partitions) + f" AND NOT {holds(p)};",
+        ]
+    body = "\n    ".join
+    return [
+        f"""
+CREATE TEMP TRIGGER "{view}_insert" INSTEAD OF INSERT ON "{view}" BEGIN
+    {body(insert)}
+END
+""",
+        f"""
+CREATE TEMP TRIGGER "{view}_update" INSTEAD OF UPDATE ON "{view}" BEGIN
+    {body(update)}
+END
+""",
+        f"""
+CREATE TEMP TRIGGER "{view}_delete" INSTEAD OF DELETE ON "{view}" BEGIN
+    {body(delete)}
+END
+""",
+    ]
+
+
+def partition_write_triggers(partitions: list[Partition]) -> list[str]:
+    """
+    TEMP triggers routing writes to the "transactions" and transaction_rows
+    views to the partition of each row's year. Rows moved to another year
+    by an update change partition, and rowid. Writes to closed partitions
+    are refused. As on the compact schema, a write to "transactions" goes
+    to the first row with the same values, in the partition of its year.
+    """
+    return _partition_write_triggers(
+        ROWS_VIEW,
+        partitions,
+        lambda p: p.holds("OLD"),
+        lambda p: 'OLD."rowid"',
+    ) + _partition_write_triggers(
+        TRANSACTIONS_TABLE,
+        partitions,
+        lambda p: p.routes("OLD", partitions),
+        lambda p: f'(SELECT "rowid" FROM "{p.view}" WHERE {same_row("OLD")} LIMIT 1)',
+    )
+
+
+def attach_partitions(
+    conn: sqlite3.Connection, db_path: Path | str, read_only: bool = False
+) -> list[Partition]:
+    """
+    Attach the partitions of the main database `db_path` to `conn`, which
+    must be opened with uri=True, and create the TEMP views over them,
+    "transactions" and transaction_rows, and the TEMP triggers routing
+    writes. Closed partitions
+    are attached immutable: SQLite then reads them without any locking.
+    Returns the partitions attached, none if the database is not partitioned.
+    """
+    partitions = list_partitions(conn)
+    if not partitions:
+        return []
+    for partition in partitions:
+        uri = partition.path(db_path).resolve().as_uri()
+        if partition.closed:
+            uri += "?immutable=1"
+        else:
+            uri += "?mode=ro" if read_only else "?mode=rw"
+        conn.execute(f'ATTACH DATABASE ? AS "{partition.schema}"', (uri,))
+    for view, rowid in ((ROWS_VIEW, '"rowid" AS "rowid", '), (TRANSACTIONS_TABLE, "")):
+        conn.execute(
+            f'CREATE TEMP VIEW "{view}" AS\n'
+            + "\nUNION ALL\n".join(
+                f'SELECT {rowid}{_quoted_columns()} FROM "{p.schema}"."transactions"'
+                for p in partitions
+            )
+        )
+    conn.execute(
+        'CREATE TEMP VIEW "monthly_summary" AS\n'
+        + "\nUNION ALL\n".join(
+            f'SELECT * FROM "{p.schema}"."monthly_summary"' for p in partitions
+        )
+    )
+    # Also on read-only connections, where writes to "transactions" then
+    # compile as writes, and fail as such
+    for ddl in partition_write_triggers(partitions):
+        conn.execute(ddl)
+    return partitions
+
+
+FILES_TABLE = "files"
+
+# Catalog of uploaded statement files. "path" is relative to the blob
+# directory, like transactions."Source". "ingested_sha256" is the hash of
+# the content last loaded into transactions, so unchanged files are skipped.
+FILES_DDL = """
+CREATE TABLE IF NOT EXISTS "files" (
+    "path" TEXT PRIMARY KEY,
+    "owner" TEXT NOT NULL,
+    "bank" TEXT NOT NULL,
+    "year" INTEGER NOT NULL,
+    "month" INTEGER NOT NULL,
+    "ext" TEXT NOT NULL,
+    "size" INTEGER NOT NULL,
+    "mtime" REAL NOT NULL,
+    "sha256" TEXT NOT NULL,
+    "uploaded_at" TEXT NOT NULL,
+    "ingested_sha256" TEXT,
+    "ingested_at" TEXT
+)
+"""
+
+FILES_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS "files_year_month" ON "files" ("year", "month")
+"""
+
+
+def ensure_files_table(conn: sqlite3.Connection) -> None:
+    conn.execute(FILES_DDL)
+    conn.execute(FILES_INDEX_DDL)
+
+
+JOBS_TABLE = "jobs"
+
+# Background jobs. Times are Unix timestamps. "payload" and "result" are JSON.
+JOBS_DDL = """
+CREATE TABLE IF NOT EXISTS "jobs" (
+    "id" INTEGER PRIMARY KEY,
+    "kind" TEXT NOT NULL,
+    "payload" TEXT NOT NULL,
+    "status" TEXT NOT NULL,
+    "rows_parsed" INTEGER NOT NULL DEFAULT 0,
+    "rows_inserted" INTEGER NOT NULL DEFAULT 0,
+    "result" TEXT,
+    "error" TEXT,
+    "created_at" REAL NOT NULL,
+    "started_at" REAL,
+    "finished_at" REAL
+)
+"""
+
+JOBS_INDEX_DDL = """
+CREATE INDEX IF NOT EXISTS "jobs_status" ON "jobs" ("status", "id")
+"""
+
+
+def ensure_jobs_table(conn: sqlite3.Connection) -> None:
+    conn.execute(JOBS_DDL)
+    conn.execute(JOBS_INDEX_DDL)
@@ -0,0 +1,137 @@
+import logging
+import sqlite3
+from typing import Any
+
+from database_pkg.config.settings import database_settings
+from database_pkg.partitions import for_each_partition
+from database_pkg.pool import connect
+from database_pkg.schema import (
+    REBUILD_SEARCH_INDEX,
+    SEARCH_TABLE,
+    TRANSACTION_COLUMNS,
+    has_fts5,
+    is_partitioned,
+    search_ddl,
+    search_triggers,
+    transactions_by_rowid,
+    transactions_schemas,
+    transactions_storage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def match_expression(text: str) -> str:
+    """
+    FTS5 query matching rows that contain every word of `text`, the last
+    one as a prefix so that partial words typed so far match.
+    Words are quoted, so punctuation is never read as FTS5 syntax.
+    """
+    words = [f'"{word.replace(chr(34), chr(34) * 2)}"' for word in text.split()]
+    if not words:
+        raise ValueError("The search text is empty.")
+    words[-1] += "*"
+    return " ".join(words)
+
+
+def search_transactions(
+    conn: sqlite3.Connection,
+    text: str,
+    owner: str | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    limit: int = 50,
+    offset: int = 0,
+    raw: bool = False,
+) -> dict[str, Any]:
+    """
+    Transactions whose "Description" or "COMMENT" match `text`, best match
+    first, with their rowid as "id" and their bm25 "score" (lower is better).
+    Dates bound "Completed Date" and are inclusive. With `raw`, `text` is
+    used as an FTS5 query as is. Returns one page of rows and the offset of
+    the next page, or None on the last one.
+    """
+    # The index of each partition, or of main
+    schemas = [
+        schema
+        for schema in transactions_schemas(conn)
+        if conn.execute(
+            f"SELECT 1 FROM \"{schema}\".sqlite_master WHERE type = 'table' AND name = ?",
+            (SEARCH_TABLE,),
+        ).fetchone()
+    ]
+    if not schemas:
+        raise ValueError("The search index does not exist yet.")
+    clauses = ['f."transactions_fts" MATCH ?']
+    params: list[Any] = [text if raw else match_expression(text)]
+    if owner is not None:
+        clauses.append('t."QUI" = ?')
+        params.append(owner)
+    if date_from is not None:
+        clauses.append('t."Completed Date" >= ?')
+        params.append(date_from)
+    if date_to is not None:
+        clauses.append("t.\"Completed Date\" < date(?, '+1 day')")
+        params.append(date_to)
+    # Partitions hold a transactions table, main may hold a view of it, whose
+    # rowid only transaction_rows shows
+    table = "transactions" if is_partitioned(conn) else transactions_by_rowid(conn)
+    selected = "t.*"
+    if table != "transactions":
+        selected = ", ".join(f't."{c}"' for c in TRANSACTION_COLUMNS)
+    matches = [f"""
+        SELECT t."rowid" AS "id", {selected}, f."rank" AS "score"
+        FROM "{schema}"."transactions_fts" AS f
+        JOIN "{schema}"."{table}" AS t ON t."rowid" = f."rowid"
+        WHERE {" AND ".join(clauses)}
+        """ for schema in schemas]
+    if len(matches) == 1:
+        query = f'{matches[0]} ORDER BY f."rank" LIMIT ? OFFSET ?'
+    else:
+        # bm25 scores of different partitions are only roughly comparable
+        union = "UNION ALL".join(matches)
+        query = f'SELECT * FROM ({union}) ORDER BY "score" LIMIT ? OFFSET ?'
+    cursor = conn.execute(query, [*params * len(matches), limit + 1, offset])
+    columns = [c[0] for c in cursor.description]
+    rows = [dict(zip(columns, row)) for row in cursor]
+    next_offset = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_offset = offset + limit
+    return {"rows": rows, "next_offset": next_offset}
+
+
+def rebuild_search_index(conn: sqlite3.Connection) -> int:
+    """
+    Rebuild the full-text index from transactions in one transaction, and
+    return the number of rows indexed. Also recreates missing triggers.
+    On a partitioned database, each open partition's index is rebuilt.
+    """
+    if not has_fts5(conn):
+        raise ValueError("This SQLite build has no FTS5 support.")
+    if is_partitioned(conn):
+        return sum(for_each_partition(conn, rebuild_search_index))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        storage = transactions_storage(conn)
+        if storage is None:
+            raise ValueError("There is no transactions table to index.")
+        conn.execute(search_ddl(storage))
+        for ddl in search_triggers(storage).values():
+            conn.execute(ddl)
+        conn.execute(REBUILD_SEARCH_INDEX)
+        rows = conn.execute('SELECT count(*) FROM "transactions"').fetchone()[0]
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    logger.info(f"Rebuilt the search index: {rows} rows")
+    return rows
+
+
+if __name__ == "__main__":
+    conn = connect(database_settings.sqlite_path)
+    try:
+        print(f"Search index rebuilt: {rebuild_search_index(conn)} rows")
+    finally:
+        conn.close()
@@ -0,0 +1,136 @@
+import logging
+import math
+import sqlite3
+import threading
+from collections import deque
+from dataclasses import asdict, dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+import orjson
+
+from database_pkg.sql_text import fingerprint_id, fingerprint_sql, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SlowQuery:
+    fingerprint: str
+    query: str
+    params: Any
+    # Seconds spent running the query
+    duration: float
+    # Rows returned, or affected by a write; None if the query was aborted
+    rows: int | None
+    plan: list[str]
+    logged_at: str
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Nearest-rank percentile of sorted `values`."""
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+class SlowQueryLog:
+    """
+    Log of queries that ran for at least `threshold` seconds, with their
+    query plan from EXPLAIN QUERY PLAN.
+
+    The last `max_entries` are kept in memory to be reported, grouped by
+    fingerprint; every entry is also appended to `path` as a line of JSON,
+    if set, for a record that survives restarts.
+    """
+
+    def __init__(
+        self, threshold: float, max_entries: int, path: Path | None = None
+    ) -> None:
+        self.threshold = threshold
+        self.path = path
+        self._entries: deque[SlowQuery] = deque(maxlen=max_entries)
+        self._lock = threading.Lock()
+
+    def is_slow(self, duration: float) -> bool:
+        return duration >= self.threshold
+
+    def record(
+        self,
+        conn: sqlite3.Connection,
+        query: str,
+        params: Any,
+        duration: float,
+        rows: int | None,
+    ) -> SlowQuery:
+        """
+        Log a slow query, explained on `conn`.
+        Blocking: run it on the database executor.
+        """
+        try:
+            plan = [
+                row[3]
+                for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params or ())
+            ]
+        except sqlite3.Error as e:
+            logger.debug(f"Could not explain slow query: {e}")
+            plan = []
+        entry = SlowQuery(
+            fingerprint=fingerprint_id(fingerprint_sql(query)),
+            query=normalize_sql(query),
+            params=params,
+            duration=duration,
+            rows=rows,
+            plan=plan,
+            logged_at=datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+        )
+        logger.warning(f"Slow query ({duration:.3f}s): {entry.query}")
+        line = orjson.dumps(asdict(entry), default=str) + b"\n"
+        with self._lock:
+            self._entries.append(entry)
+            if self.path is not None:
+                try:
+                    with open(self.path, "ab") as f:
+                        f.write(line)
+                except OSError as e:
+                    logger.warning(f"Could not append to the slow query log: {e}")
+        return entry
+
+    def entries(self) -> list[SlowQuery]:
+        """Entries kept in memory, most recent first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def report(self) -> list[dict[str, Any]]:
+        """
+        Entries kept in memory grouped by fingerprint, with their count and
+        duration percentiles, the most total time first. Each group shows its
+        latest query, parameters and plan.
+        """
+        groups: dict[str, list[SlowQuery]] = {}
+        for entry in self.entries():
+            groups.setdefault(entry.fingerprint, []).append(entry)
+        report = []
+        for fingerprint, entries in groups.items():
+            durations = sorted(e.duration for e in entries)
+            latest = entries[0]
+            report.append(
+                {
+                    "fingerprint": fingerprint,
+                    "query": fingerprint_sql(latest.query),
+                    "count": len(entries),
+                    "total": sum(durations),
+                    "p50": percentile(durations, 50),
+                    "p95": percentile(durations, 95),
+                    "max": durations[-1],
+                    "latest": asdict(latest),
+                }
+            )
+        return sorted(report, key=lambda group: group["total"], reverse=True)
+
+    def stats(self) -> dict[str, Any]:
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "entries": len(self._entries),
+                "max_entries": self._entries.maxlen,
+            }
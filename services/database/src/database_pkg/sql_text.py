@@ -0,0 +1,102 @@
+import hashlib
+import re
+from typing import Iterator
+
+NUMBER = re.compile(r"^(\d+(\.\d*)?|\.\d+)([eE]\d+)?$|^0[xX][0-9a-fA-F]+$")
+# A parenthesized list of placeholders only, as in "IN (?, ?, ?)"
+PLACEHOLDER_LIST = re.compile(r"\(\s*\?(\s*,\s*\?)*\s*\)")
+
+
+def _tokens(query: str) -> Iterator[tuple[str, bool]]:
+    """
+    Tokens of `query`, each with whether whitespace or a comment came
+    before it: quoted strings and identifiers, runs of word characters, and
+    single characters otherwise. Comments are dropped.
+    """
+    i, n = 0, len(query)
+    pending_space = False
+    while i < n:
+        ch = query[i]
+        if ch in "'\"`[":
+            close = "]" if ch == "[" else ch
+            end = i + 1
+            while end < n:
+                if query[end] == close:
+                    # A doubled quote is an escaped quote, not the end
+                    if close != "]" and end + 1 < n and query[end + 1] == close:
+                        end += 2
+                        continue
+                    break
+                end += 1
+            token = query[i : end + 1]
+            i = end + 1
+        elif query.startswith("--", i):
+            end = query.find("\n", i)
+            i = n if end == -1 else end
+            pending_space = True
+            continue
+        elif query.startswith("/*", i):
+            end = query.find("*/", i + 2)
+            i = n if end == -1 else end + 2
+            pending_space = True
+            continue
+        elif ch.isspace():
+            pending_space = True
+            i += 1
+            continue
+        elif ch.isalnum() or ch in "_.":
+            end = i + 1
+            while end < n and (query[end].isalnum() or query[end] in "_."):
+                end += 1
+            token = query[i:end]
+            i = end
+        else:
+            token = ch
+            i += 1
+        yield token, pending_space
+        pending_space = False
+
+
+def _join(tokens: Iterator[tuple[str, bool]]) -> str:
+    out: list[str] = []
+    for token, space in tokens:
+        if space and out:
+            out.append(" ")
+        out.append(token)
+    return "".join(out).rstrip(" ;")
+
+
+def normalize_sql(query: str) -> str:
+    """
+    Collapse whitespace and drop comments and the trailing semicolon,
+    leaving quoted strings and identifiers untouched.
+    Two queries with the same normalized text are the same statement.
+    """
+    return _join(_tokens(query))
+
+
+def fingerprint_sql(query: str) -> str:
+    """
+    Normalized `query` with its literal strings and numbers replaced by ?,
+    lists of placeholders by a single (?), and keywords and unquoted names
+    lowercased: the same statement whatever values it is run with.
+    """
+
+    def tokens() -> Iterator[tuple[str, bool]]:
+        previous = ""
+        for token, space in _tokens(query):
+            # Numbers right after a sigil name a placeholder, as in ?1 or $1
+            placeholder = previous in ("?", ":", "$", "@") and not space
+            previous = token
+            if token.startswith("'") or (NUMBER.match(token) and not placeholder):
+                token = "?"
+            elif token[0] not in '"`[':
+                token = token.lower()
+            yield token, space
+
+    return PLACEHOLDER_LIST.sub("(?)", _join(tokens()))
+
+
+def fingerprint_id(fingerprint: str) -> str:
+    """Short stable id of a fingerprint."""
+    return hashlib.sha1(fingerprint.encode()).hexdigest()[:16]
@@ -0,0 +1,97 @@
+import logging
+import sqlite3
+from typing import Any
+
+from database_pkg.config.settings import database_settings
+from database_pkg.partitions import for_each_partition
+from database_pkg.pool import connect
+from database_pkg.schema import (
+    MONTHLY_SUMMARY_DDL,
+    MONTHLY_SUMMARY_TABLE,
+    REBUILD_MONTHLY_SUMMARY,
+    is_partitioned,
+    summary_triggers,
+    table_exists,
+    transactions_storage,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def rebuild_summary(conn: sqlite3.Connection) -> int:
+    """
+    Recompute the monthly summary from transactions in one transaction, and
+    return its number of rows. Also repairs missing triggers, and drift from
+    adding and subtracting floating point amounts over many writes.
+    On a partitioned database, each open partition's summary is rebuilt.
+    """
+    if is_partitioned(conn):
+        return sum(for_each_partition(conn, rebuild_summary))
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        storage = transactions_storage(conn)
+        if storage is None:
+            raise ValueError("There is no transactions table to summarize.")
+        conn.execute(MONTHLY_SUMMARY_DDL)
+        for ddl in summary_triggers(storage).values():
+            conn.execute(ddl)
+        conn.execute('DELETE FROM "monthly_summary"')
+        rows = conn.execute(REBUILD_MONTHLY_SUMMARY).rowcount
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    logger.info(f"Rebuilt the monthly summary: {rows} rows")
+    return rows
+
+
+def monthly_totals(
+    conn: sqlite3.Connection,
+    year: int | None = None,
+    month: int | None = None,
+    owner: str | None = None,
+    currency: str | None = None,
+    type_: str | None = None,
+    by_type: bool = True,
+) -> list[dict[str, Any]]:
+    """
+    Transaction count and "Amount" and "Fee" totals per month, owner,
+    currency and, if `by_type`, type, read from the monthly summary.
+    Missing owners, currencies and types come back as None.
+    """
+    if not table_exists(conn, MONTHLY_SUMMARY_TABLE):
+        return []
+    filters = {
+        '"year"': year,
+        '"month"': month,
+        '"QUI"': owner,
+        '"Currency"': currency,
+        '"Type"': type_,
+    }
+    clauses = [
+        f"{column} = ?" for column, value in filters.items() if value is not None
+    ]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    key = '"year", "month", "QUI", "Currency"' + (', "Type"' if by_type else "")
+    type_column = """nullif("Type", '') AS "Type", """ if by_type else ""
+    cursor = conn.execute(
+        f"""
+        SELECT "year", "month", nullif("QUI", '') AS "QUI",
+            nullif("Currency", '') AS "Currency", {type_column}
+            sum("count") AS "count", sum("Amount") AS "Amount", sum("Fee") AS "Fee"
+        FROM "monthly_summary" {where}
+        GROUP BY {key}
+        ORDER BY {key}
+        """,
+        [value for value in filters.values() if value is not None],
+    )
+    columns = [c[0] for c in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor]
+
+
+if __name__ == "__main__":
+    conn = connect(database_settings.sqlite_path)
+    try:
+        print(f"Monthly summary rebuilt: {rebuild_summary(conn)} rows")
+    finally:
+        conn.close()
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import BinaryIO, Callable, NamedTuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp
+
+from database_pkg.config.settings import database_settings
+from database_pkg.metrics import UPLOAD_BYTES, phase
+
+# Room left for the form fields and multipart boundaries of /upload_file
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds `upload_max_bytes`."""
+
+
+class StagedUpload(NamedTuple):
+    """An upload written and synced to a temporary file next to its target."""
+
+    temp_path: Path
+    size: int
+    sha256: str
+
+
+def exceeds_upload_limit(size: int | None) -> bool:
+    """Whether a declared upload size is already over the limit."""
+    return size is not None and size > database_settings.upload_max_bytes
+
+
+def too_large_message() -> str:
+    return f"File too large. The limit is {database_settings.upload_max_bytes} bytes."
+
+
+def stage_upload(src: BinaryIO, directory: Path) -> StagedUpload:
+    """
+    Copy `src` into a temporary file in `directory`, hashing it on the way.
+    Each chunk is read, hashed and written once; the file is fsynced before
+    returning. Blocking: run it off the event loop.
+    """
+    max_bytes = database_settings.upload_max_bytes
+    chunk_size = database_settings.upload_chunk_size
+    digest = hashlib.sha256()
+    size = 0
+    fd, name = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+    temp_path = Path(name)
+    try:
+        with phase("upload_write"), os.fdopen(fd, "wb") as out:
+            while chunk := src.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(too_large_message())
+                digest.update(chunk)
+                out.write(chunk)
+            out.flush()
+            os.fsync(out.fileno())
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    UPLOAD_BYTES.inc(size)
+    return StagedUpload(temp_path, size, digest.hexdigest())
+
+
+def commit_upload(staged: StagedUpload, dest: Path) -> None:
+    """
+    Atomically move a staged upload to `dest`, replacing any existing file.
+    Readers see either the old file or the new one, never a partial write.
+    """
+    os.replace(staged.temp_path, dest)
+    # Persist the rename itself
+    dir_fd = os.open(dest.parent, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+def discard_upload(staged: StagedUpload) -> None:
+    staged.temp_path.unlink(missing_ok=True)
+
+
+def request_body_limit(path: str) -> int | None:
+    """Largest request body accepted on `path`, None if it has no limit."""
+    if path == "/upload_file":
+        return database_settings.upload_max_bytes + UPLOAD_FORM_OVERHEAD
+    if path == "/upload_files":
+        return database_settings.upload_request_max_bytes
+    return None
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware refusing upload requests over their size limit with 413
+    before their body is spooled to disk: from their Content-Length when
+    they declare one, or as soon as they send too much.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: dict, receive: Callable, send: Callable) -> None:
+        limit = request_body_limit(scope["path"]) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+        detail = f"Request too large. The limit is {limit} bytes."
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            response = JSONResponse(status_code=413, content={"detail": detail})
+            await response(scope, receive, send)
+            return
+        received = 0
+
+        async def limited_receive() -> dict:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Re-raised as is by FastAPI while it parses the form
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
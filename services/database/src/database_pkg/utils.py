@@ -1,21 +1,227 @@
+import asyncio
 import logging
+import os
 import sqlite3
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator
 
+from fastapi import Depends, HTTPException, Request
+
+from database_pkg.budget import QueryBudget
 from database_pkg.config.settings import database_settings
 from database_pkg.config.logs import setup_logging
+from database_pkg.executor import DatabaseBusyError, DatabaseExecutor
+from database_pkg.index_advisor import IndexAdvisor
+from database_pkg.jobs import JobQueue
+from database_pkg.metrics import phase
+from database_pkg.partitions import ensure_partitions
+from database_pkg.pool import ConnectionPool, PoolTimeoutError
+from database_pkg.result_cache import ResultCache
+from database_pkg.slow_log import SlowQueryLog
+from database_pkg.schema import (
+    ensure_monthly_summary,
+    ensure_search_index,
+    ensure_transactions_indexes,
+)
+from database_pkg.writer import DatabaseWriter
 
 setup_logging()
 logger = logging.getLogger(__name__)
 
+# Seconds between two checks that the client of a running query is still there
+DISCONNECT_POLL_INTERVAL = 0.1
+
 
-def get_db_connection():
-    db_path = str(database_settings.sqlite_path)
+def create_db_pool() -> ConnectionPool:
+    db_path = database_settings.sqlite_path
     logger.debug(
-        f"Connecting to database at: {db_path} with app_env: {database_settings.app_env}"
+        f"Creating connection pool for: {db_path} with app_env: {database_settings.app_env}"
+    )
+    return ConnectionPool(
+        db_path,
+        size=database_settings.db_pool_size,
+        timeout=database_settings.db_pool_timeout,
+    )
+
+
+def reader_pool_size() -> int:
+    return database_settings.db_reader_pool_size or os.cpu_count() or 1
+
+
+def create_reader_pool(pool: ConnectionPool) -> ConnectionPool:
+    return ConnectionPool(
+        pool.db_path,
+        size=reader_pool_size(),
+        timeout=database_settings.db_pool_timeout,
+        read_only=True,
+    )
+
+
+def create_db_writer(pool: ConnectionPool) -> DatabaseWriter:
+    return DatabaseWriter(
+        pool.db_path,
+        max_batch=database_settings.db_writer_max_batch,
+        queue_depth=database_settings.db_writer_queue_depth,
+    )
+
+
+def executor_workers() -> int:
+    """
+    Threads of the database executor. By default, one per reader connection,
+    so reads scale with the reader pool, plus one per background job worker,
+    so that running jobs do not take them.
+    """
+    if database_settings.db_executor_workers is not None:
+        return database_settings.db_executor_workers
+    return reader_pool_size() + database_settings.job_workers
+
+
+def create_db_executor() -> DatabaseExecutor:
+    return DatabaseExecutor(
+        max_workers=executor_workers(),
+        queue_depth=database_settings.db_executor_queue_depth,
     )
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
-    return conn
+
+
+def create_result_cache() -> ResultCache | None:
+    if not database_settings.result_cache_max_bytes:
+        return None
+    return ResultCache(
+        database_settings.sqlite_path,
+        max_bytes=database_settings.result_cache_max_bytes,
+    )
+
+
+def create_index_advisor() -> IndexAdvisor | None:
+    if not database_settings.index_advisor_max_queries:
+        return None
+    return IndexAdvisor(max_queries=database_settings.index_advisor_max_queries)
+
+
+def create_slow_query_log() -> SlowQueryLog | None:
+    if not database_settings.slow_query_threshold:
+        return None
+    return SlowQueryLog(
+        threshold=database_settings.slow_query_threshold,
+        max_entries=database_settings.slow_query_log_size,
+        path=database_settings.slow_query_log_path,
+    )
+
+
+def create_query_budget() -> QueryBudget:
+    return QueryBudget(
+        timeout=database_settings.query_timeout,
+        max_steps=database_settings.query_max_steps,
+        max_rows=database_settings.query_max_rows,
+        max_bytes=database_settings.query_max_bytes,
+    )
+
+
+def prepare_database(pool: ConnectionPool) -> None:
+    """
+    Create the managed transactions indexes, the monthly summary and the
+    full-text search index missing from an existing database, or from its
+    open partitions.
+    """
+    try:
+        with pool.connection() as conn:
+            created = ensure_transactions_indexes(conn)
+            summarized = ensure_monthly_summary(conn)
+            indexed = ensure_search_index(conn)
+            conn.commit()
+        partitions = ensure_partitions(pool.db_path)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not prepare the database: {e}")
+        return
+    if created:
+        logger.info(f"Created transactions indexes: {', '.join(created)}")
+    if summarized:
+        logger.info("Built the monthly summary")
+    if indexed:
+        logger.info("Built the search index")
+    if partitions:
+        logger.info(f"Prepared partitions: {', '.join(partitions)}")
+
+
+def create_job_queue(pool: ConnectionPool, executor: DatabaseExecutor) -> JobQueue:
+    return JobQueue(pool.db_path, executor, workers=database_settings.job_workers)
+
+
+def get_db_pool(request: Request) -> ConnectionPool:
+    return request.app.state.db_pool
+
+
+def get_reader_pool(request: Request) -> ConnectionPool:
+    return request.app.state.reader_pool
+
+
+def get_db_writer(request: Request) -> DatabaseWriter:
+    return request.app.state.db_writer
+
+
+def get_db_executor(request: Request) -> DatabaseExecutor:
+    return request.app.state.db_executor
+
+
+def get_result_cache(request: Request) -> ResultCache | None:
+    return request.app.state.result_cache
+
+
+def get_job_queue(request: Request) -> JobQueue:
+    return request.app.state.job_queue
+
+
+def get_index_advisor(request: Request) -> IndexAdvisor | None:
+    return request.app.state.index_advisor
+
+
+def get_slow_query_log(request: Request) -> SlowQueryLog | None:
+    return request.app.state.slow_query_log
+
+
+async def _cancel_on_disconnect(request: Request, budget: QueryBudget) -> None:
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_INTERVAL)
+    logger.info(f"Client of {request.url.path} went away, cancelling its query")
+    budget.cancel()
+
+
+async def get_query_budget(request: Request) -> AsyncIterator[QueryBudget]:
+    """
+    Budget of the request's query, cancelled if the client goes away before
+    the response is ready.
+    """
+    budget = create_query_budget()
+    watcher = asyncio.create_task(_cancel_on_disconnect(request, budget))
+    try:
+        yield budget
+    finally:
+        watcher.cancel()
+
+
+@asynccontextmanager
+async def _checked_out(
+    pool: ConnectionPool, executor: DatabaseExecutor
+) -> AsyncIterator[sqlite3.Connection]:
+    try:
+        with phase("connect"):
+            conn = await executor.wait_for(pool.acquire)
+    except (DatabaseBusyError, PoolTimeoutError) as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+async def get_db_connection(
+    pool: ConnectionPool = Depends(get_reader_pool),
+    executor: DatabaseExecutor = Depends(get_db_executor),
+) -> AsyncIterator[sqlite3.Connection]:
+    """Check a read-only connection out for the duration of the request."""
+    async with _checked_out(pool, executor) as conn:
+        yield conn
 
 
 def get_extension(filename):
@@ -27,3 +233,17 @@ def get_extension(filename):
     elif ext in ["xlsx", "xls"]:
         return ext
     return None
+
+
+def raw_dir(blob_path: Path | str) -> Path:
+    return Path(blob_path) / "raw"
+
+
+def statement_dir(blob_path: Path | str, year: int, month: int) -> Path:
+    return raw_dir(blob_path) / str(year) / str(month)
+
+
+def statement_path(
+    blob_path: Path | str, owner: str, bank: str, year: int, month: int, ext: str
+) -> Path:
+    return statement_dir(blob_path, year, month) / f"{owner}_{bank}.{ext}"
@@ -0,0 +1,194 @@
+import asyncio
+import contextvars
+import logging
+import queue
+import threading
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, NamedTuple, TypeVar
+
+from database_pkg.executor import DatabaseBusyError
+from database_pkg.pool import PooledConnection, connect
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class WriterClosedError(RuntimeError):
+    """Raised when a write is submitted to a closed writer."""
+
+
+class _Write(NamedTuple):
+    fn: Callable[..., Any]
+    args: tuple[Any, ...]
+    future: Future
+    # Context of the caller, as threads of the database executor get it
+    context: contextvars.Context
+    # Run outside of a batch, managing its own transactions
+    alone: bool = False
+
+
+class DatabaseWriter:
+    """
+    Single connection applying every write, on a thread of its own.
+
+    Writes are queued and applied in order. Whatever is queued when the
+    thread gets to it, up to `max_batch` writes, goes into one transaction
+    with one commit, so under load many writes share a single fsync while
+    a lone write is committed right away. Each write runs in a savepoint:
+    one that fails is rolled back alone, and its caller gets the error.
+    Results are only handed back once committed. At most `queue_depth`
+    writes may wait; beyond that, DatabaseBusyError is raised.
+    Maintenance that manages its own transactions goes through run_alone,
+    in turn with the other writes.
+    """
+
+    def __init__(self, db_path: Path | str, max_batch: int, queue_depth: int) -> None:
+        self.db_path = db_path
+        self.max_batch = max_batch
+        self.queue_depth = queue_depth
+        self.connection: PooledConnection | None = None
+        self.commits = 0
+        self.writes = 0
+        self._queue: queue.Queue[_Write | None] = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._loop, name="database-writer", daemon=True
+        )
+        self._thread.start()
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run `fn(conn, *args)` on the writer connection and return its result
+        once committed. `fn` must not commit nor roll back.
+        """
+        return await self._submit(fn, args, alone=False)
+
+    async def run_alone(self, fn: Callable[..., T], *args: Any) -> T:
+        """
+        Run `fn(conn, *args)` on the writer connection between two batches,
+        and return its result. `fn` manages its own transactions.
+        """
+        return await self._submit(fn, args, alone=True)
+
+    async def _submit(
+        self, fn: Callable[..., T], args: tuple[Any, ...], alone: bool
+    ) -> T:
+        if self._closed:
+            raise WriterClosedError("Database writer is closed.")
+        if self._queue.qsize() >= self.queue_depth:
+            logger.warning(f"Database writer saturated ({self._queue.qsize()} queued)")
+            raise DatabaseBusyError("Database is busy. Retry later.")
+        future: Future = Future()
+        self._queue.put(_Write(fn, args, future, contextvars.copy_context(), alone))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "queued": self._queue.qsize(),
+            "commits": self.commits,
+            "writes": self.writes,
+            "writes_per_commit": self.writes / self.commits if self.commits else 0.0,
+        }
+
+    def close(self) -> None:
+        """Apply the writes already queued, then close the connection."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _loop(self) -> None:
+        stop = False
+        # Write that ended the previous batch, to run alone
+        alone: _Write | None = None
+        while not stop:
+            write = alone or self._queue.get()
+            alone = None
+            if write is None:
+                break
+            if write.alone:
+                self._apply_alone(write)
+                continue
+            batch = [write]
+            while len(batch) < self.max_batch:
+                try:
+                    write = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if write is None:
+                    stop = True
+                    break
+                if write.alone:
+                    alone = write
+                    break
+                batch.append(write)
+            self._apply(batch)
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+    def _apply(self, batch: list[_Write]) -> None:
+        # Writes whose caller went away before they started are dropped
+        writes = [w for w in batch if w.future.set_running_or_notify_cancel()]
+        while writes:
+            writes = self._commit(writes)
+
+    def _apply_alone(self, write: _Write) -> None:
+        if not write.future.set_running_or_notify_cancel():
+            return
+        try:
+            if self.connection is None:
+                self.connection = connect(self.db_path)
+            result = write.context.run(write.fn, self.connection, *write.args)
+        except Exception as e:
+            if self.connection is not None and self.connection.in_transaction:
+                self.connection.rollback()
+            write.future.set_exception(e)
+            return
+        # Not counted in the stats, which are about batching
+        write.future.set_result(result)
+
+    def _commit(self, writes: list[_Write]) -> list[_Write]:
+        """
+        Apply `writes` in one transaction, and return those to apply again
+        in a new one if a write's failure took the whole transaction down.
+        """
+        done: list[tuple[Future, Any]] = []
+        conn = self.connection
+        try:
+            if conn is None:
+                conn = self.connection = connect(self.db_path)
+            conn.execute("BEGIN IMMEDIATE")
+            for i, write in enumerate(writes):
+                conn.execute("SAVEPOINT write")
+                try:
+                    result = write.context.run(write.fn, conn, *write.args)
+                except Exception as e:
+                    write.future.set_exception(e)
+                    if not conn.in_transaction:
+                        # An interrupted statement, such as one over its
+                        # budget, rolls the whole transaction back
+                        return writes[:i] + writes[i + 1 :]
+                    conn.execute("ROLLBACK TO write")
+                    conn.execute("RELEASE write")
+                else:
+                    conn.execute("RELEASE write")
+                    done.append((write.future, result))
+            conn.commit()
+        except Exception as e:
+            # The whole transaction is lost, along with every write in it
+            logger.error(f"Database writer could not commit {len(writes)} writes: {e}")
+            if conn is not None and conn.in_transaction:
+                conn.rollback()
+            for write in writes:
+                if not write.future.done():
+                    write.future.set_exception(e)
+            return []
+        self.commits += 1
+        self.writes += len(done)
+        for future, result in done:
+            future.set_result(result)
+        return []
@@ -0,0 +1,96 @@
+"""
+Shared fixtures for tests that need a real SQLite database.
+"""
+
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from fastapi.testclient import TestClient
+
+from database_pkg.app import app
+from database_pkg.config.settings import database_settings
+from database_pkg.pool import ConnectionPool
+from database_pkg.result_cache import ResultCache
+from database_pkg.slow_log import SlowQueryLog
+
+TRANSACTIONS_DDL = """
+CREATE TABLE "transactions" (
+    "Type" TEXT,
+    "Product" TEXT,
+    "Started Date" TIMESTAMP,
+    "Completed Date" TIMESTAMP,
+    "Description" TEXT,
+    "Amount" REAL,
+    "Fee" REAL,
+    "Currency" TEXT,
+    "QUI" TEXT,
+    "COMMENT" TEXT
+)
+"""
+
+
+@pytest.fixture(autouse=True)
+def no_job_workers():
+    """Background job workers only run in tests using `db_client`."""
+    with patch.object(database_settings, "job_workers", 0):
+        yield
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    return tmp_path / "test.db"
+
+
+@pytest.fixture
+def transactions_db(db_path: Path) -> Path:
+    """A database holding 25 transactions, one per day of January 2025."""
+    conn = sqlite3.connect(db_path)
+    conn.execute(TRANSACTIONS_DDL)
+    conn.executemany(
+        'INSERT INTO "transactions" VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        [
+            (
+                "CARD_PAYMENT",
+                "Current",
+                f"2025-01-{day:02d} 10:00:00",
+                f"2025-01-{day:02d} 12:00:00",
+                f"Merchant {day}",
+                -float(day),
+                0.0,
+                "EUR",
+                "G" if day % 2 else "N",
+                None,
+            )
+            for day in range(1, 26)
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+@pytest.fixture
+def db_client(transactions_db: Path):
+    """
+    Test client whose connection pool, cache, job queue and slow query log
+    use `transactions_db`, with one job worker.
+    """
+    pool = ConnectionPool(transactions_db, size=2, timeout=1.0)
+    cache = ResultCache(transactions_db, max_bytes=1024 * 1024)
+    slow_log = SlowQueryLog(
+        threshold=database_settings.slow_query_threshold,
+        max_entries=100,
+        path=transactions_db.with_suffix(".slow_queries.jsonl"),
+    )
+    with (
+        patch("database_pkg.app.create_db_pool", return_value=pool),
+        patch("database_pkg.app.create_result_cache", return_value=cache),
+        patch("database_pkg.app.create_slow_query_log", return_value=slow_log),
+        patch.object(database_settings, "job_workers", 1),
+        TestClient(app) as client,
+    ):
+        yield client
+    cache.close()
+    pool.close()
@@ -1,11 +1,28 @@
 import io
+import json
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import PropertyMock, patch
+import anyio
+import pytest
 from fastapi.testclient import TestClient
 
 from database_pkg.app import app
-from database_pkg.utils import get_db_connection
+from database_pkg.config.settings import database_settings
+from database_pkg.executor import DatabaseExecutor
+from database_pkg.pool import ConnectionPool
+from database_pkg.utils import (
+    get_db_connection,
+    get_db_executor,
+    get_db_writer,
+    get_job_queue,
+    get_reader_pool,
+    get_result_cache,
+)
+from database_pkg.writer import DatabaseWriter
 
 
 def test_healthz():
@@ -18,12 +35,15 @@ def test_healthz():
 
 def test_execute_sql_select():
     class DummyCursor:
-        def execute(self, query):
+        def execute(self, query, params=()):
             assert query == "SELECT * FROM test"
 
         def fetchall(self):
             return [{"id": 1, "name": "foo"}, {"id": 2, "name": "bar"}]
 
+        def fetchmany(self, size):
+            return self.fetchall()[:size]
+
         def close(self):
             pass
 
@@ -31,10 +51,22 @@ def test_execute_sql_select():
         def rowcount(self):
             return 2
 
+    class DummyProgram:
+        def fetchall(self):
+            # EXPLAIN of a SELECT: returns rows, writes nothing
+            return [(0, "Init", 0, 0), (1, "ResultRow", 0, 0)]
+
     class DummyConn:
         def cursor(self):
             return DummyCursor()
 
+        def execute(self, query, params=()):
+            assert query == "EXPLAIN SELECT * FROM test"
+            return DummyProgram()
+
+        def set_progress_handler(self, handler, n):
+            pass
+
         def commit(self):
             pass
 
@@ -46,8 +78,11 @@ def test_execute_sql_select():
 
     app.dependency_overrides = {}
     app.dependency_overrides[get_db_connection] = dummy_get_db_connection
-    test_client = TestClient(app)
-    response = test_client.post("/execute_sql", json={"query": "SELECT * FROM test"})
+    app.dependency_overrides[get_result_cache] = lambda: None
+    with TestClient(app) as test_client:
+        response = test_client.post(
+            "/execute_sql", json={"query": "SELECT * FROM test"}
+        )
     assert response.status_code == 200
     assert "result" in response.json()
     assert response.json()["result"] == [
@@ -56,60 +91,60 @@ def test_execute_sql_select():
     ]
 
 
-def test_execute_sql_non_select():
-    class DummyCursor:
-        def execute(self, query):
-            assert query == "UPDATE test SET value='baz' WHERE id=1"
-
-        def close(self):
-            pass
-
-        @property
-        def rowcount(self):
-            return 1
-
-    class DummyConn:
-        def cursor(self):
-            return DummyCursor()
-
-        def commit(self):
-            pass
-
-        def close(self):
-            pass
-
-    def dummy_get_db_connection():
-        return DummyConn()
-
-    app.dependency_overrides = {}
-    app.dependency_overrides[get_db_connection] = dummy_get_db_connection
-    test_client = TestClient(app)
-    response = test_client.post(
-        "/execute_sql", json={"query": "UPDATE test SET value='baz' WHERE id=1"}
-    )
-    assert response.status_code == 200
-    assert response.json()["result"]["rows_affected"] == 1
-
-
 def test_execute_sql_error():
     def dummy_get_db_connection():
         raise Exception("DB error")
 
     app.dependency_overrides = {}
     app.dependency_overrides[get_db_connection] = dummy_get_db_connection
-    test_client = TestClient(app)
-    response = test_client.post("/execute_sql", json={"query": "SELECT * FROM test"})
+    app.dependency_overrides[get_result_cache] = lambda: None
+    with TestClient(app) as test_client:
+        response = test_client.post(
+            "/execute_sql", json={"query": "SELECT * FROM test"}
+        )
     assert response.status_code == 400
     assert "DB error" in response.json()["detail"]
 
 
+def test_execute_sql_busy():
+    saturated = DatabaseExecutor(max_workers=1, queue_depth=0)
+    saturated._pending = 1
+
+    app.dependency_overrides = {}
+    app.dependency_overrides[get_db_connection] = lambda: object()
+    app.dependency_overrides[get_result_cache] = lambda: None
+    app.dependency_overrides[get_db_executor] = lambda: saturated
+    with TestClient(app) as test_client:
+        response = test_client.post(
+            "/execute_sql", json={"query": "SELECT * FROM test"}
+        )
+    app.dependency_overrides = {}
+    assert response.status_code == 503
+    assert "busy" in response.json()["detail"]
+
+
 class TestUploadFile:
     """Test cases for the /upload_file endpoint."""
 
-    def setup_method(self):
-        """Set up test client and clear dependency overrides."""
-        app.dependency_overrides = {}
+    @pytest.fixture(autouse=True)
+    def catalog_db(self, db_path):
+        """
+        Set up test client, with a pool and a writer on an empty database for
+        the catalog.
+        """
+        pool = ConnectionPool(db_path, size=1, timeout=1.0)
+        writer = DatabaseWriter(db_path, max_batch=10, queue_depth=10)
+        app.dependency_overrides = {
+            get_reader_pool: lambda: pool,
+            get_db_writer: lambda: writer,
+            get_db_executor: lambda: DatabaseExecutor(max_workers=1, queue_depth=4),
+            get_job_queue: lambda: None,
+        }
         self.client = TestClient(app)
+        yield
+        app.dependency_overrides = {}
+        writer.close()
+        pool.close()
 
     def test_upload_file_success_pdf(self):
         """Test successful PDF file upload."""
@@ -388,6 +423,75 @@ class TestUploadFile:
                 # Verify file was overwritten
                 assert existing_file.read_bytes() == new_content
 
+    def test_upload_file_too_large(self):
+        """Test upload over the configured size limit."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch("database_pkg.app.database_settings") as mock_settings:
+                mock_settings.blob_path = temp_dir
+                with patch.object(database_settings, "upload_max_bytes", 8):
+                    files = {
+                        "file": (
+                            "test.pdf",
+                            io.BytesIO(b"%PDF-1.4 too long"),
+                            "application/pdf",
+                        )
+                    }
+                    data = {"owner": "G", "year": 2025, "month": 8, "bank": "BNP"}
+
+                    response = self.client.post("/upload_file", files=files, data=data)
+
+                assert response.status_code == 413
+                # Nothing, not even a temporary file, is left behind
+                assert [p for p in Path(temp_dir).rglob("*") if p.is_file()] == []
+
+    def test_upload_file_over_declared_length_is_refused_unread(self):
+        """Test a request whose Content-Length is over the limit."""
+        with patch.object(database_settings, "upload_max_bytes", 8):
+            response = self.client.post(
+                "/upload_file",
+                content=b"x" * (70 * 1024),
+                headers={"Content-Type": "multipart/form-data; boundary=b"},
+            )
+        assert response.status_code == 413
+
+    def test_upload_files_over_limit_while_streaming(self):
+        """Test a request without Content-Length cut off once over the limit."""
+
+        def body():
+            yield (
+                b"--b\r\nContent-Disposition: form-data; "
+                b'name="files"; filename="G_BNP.csv"\r\n\r\n'
+            )
+            for _ in range(4):
+                yield b"x" * 1024
+
+        with patch.object(database_settings, "upload_request_max_bytes", 2048):
+            response = self.client.post(
+                "/upload_files",
+                content=body(),
+                headers={"Content-Type": "multipart/form-data; boundary=b"},
+            )
+        assert response.status_code == 413
+
+    def test_upload_file_ingest_without_job_queue(self):
+        """Test ingest=true refused before anything is written."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            with patch("database_pkg.app.database_settings") as mock_settings:
+                mock_settings.blob_path = temp_dir
+                files = {"file": ("test.csv", io.BytesIO(b"a,b\n"), "text/csv")}
+                data = {
+                    "owner": "G",
+                    "year": 2025,
+                    "month": 8,
+                    "bank": "BNP",
+                    "ingest": True,
+                }
+
+                response = self.client.post("/upload_file", files=files, data=data)
+
+            assert response.status_code == 503
+            assert list(Path(temp_dir).rglob("*")) == []
+
     def test_upload_file_invalid_owner(self):
         """Test upload with invalid owner value."""
         files = {"file": ("test.pdf", io.BytesIO(b"fake content"), "application/pdf")}
@@ -445,3 +549,631 @@ class TestUploadFile:
                 # Verify directories were created
                 assert expected_dir.exists()
                 assert (expected_dir / "N_BNC.pdf").exists()
+
+
+class TestExecuteSqlOnDatabase:
+    """Test cases for /execute_sql against a real SQLite database."""
+
+    def test_select_rows(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={"query": 'SELECT "Description" FROM transactions LIMIT 2'},
+        )
+        assert response.status_code == 200
+        assert response.json()["result"] == [
+            {"Description": "Merchant 1"},
+            {"Description": "Merchant 2"},
+        ]
+
+    def test_keyset_pagination_walks_all_rows(self, db_client):
+        query = {
+            "query": 'SELECT rowid AS id, "Description" FROM transactions;',
+            "page_size": 10,
+            "page_key": "id",
+        }
+        seen = []
+        pages = 0
+        while True:
+            response = db_client.post("/execute_sql", json=query)
+            assert response.status_code == 200
+            body = response.json()
+            assert len(body["result"]) <= 10
+            seen.extend(row["id"] for row in body["result"])
+            pages += 1
+            if body["next_cursor"] is None:
+                break
+            query["cursor"] = body["next_cursor"]
+        assert seen == list(range(1, 26))
+        assert pages == 3
+
+    def test_pagination_requires_page_key(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={"query": "SELECT * FROM transactions", "page_size": 5},
+        )
+        assert response.status_code == 400
+        assert "page_key" in response.json()["detail"]
+
+    def test_pagination_requires_a_selected_page_key(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={
+                "query": "SELECT * FROM transactions",
+                "page_size": 5,
+                "page_key": "rowid",
+            },
+        )
+        assert response.status_code == 400
+        assert "must be a column selected by the query" in response.json()["detail"]
+
+    def test_pagination_rejects_foreign_cursor(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={
+                "query": "SELECT rowid AS id FROM transactions",
+                "page_size": 5,
+                "page_key": "id",
+                "cursor": "not-a-cursor",
+            },
+        )
+        assert response.status_code == 400
+        assert "cursor" in response.json()["detail"]
+
+    def test_stream_returns_ndjson(self, db_client):
+        with patch("database_pkg.app.database_settings") as mock_settings:
+            mock_settings.stream_chunk_size = 7
+            response = db_client.post(
+                "/execute_sql/stream",
+                json={"query": 'SELECT "Description" FROM transactions'},
+            )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/x-ndjson"
+        lines = response.text.splitlines()
+        assert len(lines) == 25
+        assert json.loads(lines[0]) == {"Description": "Merchant 1"}
+        assert json.loads(lines[-1]) == {"Description": "Merchant 25"}
+
+    def test_stream_rejects_non_select(self, db_client):
+        response = db_client.post(
+            "/execute_sql/stream",
+            json={"query": "DELETE FROM transactions"},
+        )
+        assert response.status_code == 400
+        assert "read-only" in response.json()["detail"]
+
+    def test_columns_format(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'SELECT "Description", "Amount" FROM transactions LIMIT 2',
+                "format": "columns",
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["result"] == {
+            "columns": ["Description", "Amount"],
+            "rows": [["Merchant 1", -1.0], ["Merchant 2", -2.0]],
+        }
+
+    def test_arrow_format(self, db_client):
+        pa = pytest.importorskip("pyarrow")
+        response = db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'SELECT "Description", "Amount" FROM transactions',
+                "format": "arrow",
+            },
+        )
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/vnd.apache.arrow.stream"
+        table = pa.ipc.open_stream(response.content).read_all()
+        assert table.column_names == ["Description", "Amount"]
+        assert table.num_rows == 25
+        assert table.column("Amount").to_pylist()[0] == -1.0
+
+    def test_stream_columns_format(self, db_client):
+        response = db_client.post(
+            "/execute_sql/stream",
+            json={
+                "query": 'SELECT "Description" FROM transactions',
+                "format": "columns",
+            },
+        )
+        assert response.status_code == 200
+        lines = response.text.splitlines()
+        assert json.loads(lines[0]) == {"columns": ["Description"]}
+        assert json.loads(lines[1]) == ["Merchant 1"]
+        assert len(lines) == 26
+
+    def test_positional_params(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'SELECT COUNT(*) AS n FROM transactions WHERE "QUI" = ?',
+                "params": ["G"],
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["result"] == [{"n": 13}]
+
+    def test_named_params_with_pagination(self, db_client):
+        query = {
+            "query": 'SELECT rowid AS id FROM transactions WHERE "QUI" = :qui',
+            "params": {"qui": "N"},
+            "page_size": 5,
+            "page_key": "id",
+        }
+        first = db_client.post("/execute_sql", json=query).json()
+        assert [row["id"] for row in first["result"]] == [2, 4, 6, 8, 10]
+        query["cursor"] = first["next_cursor"]
+        second = db_client.post("/execute_sql", json=query).json()
+        assert [row["id"] for row in second["result"]] == [12, 14, 16, 18, 20]
+
+    def test_repeated_query_hits_statement_cache(self, db_client):
+        query = 'SELECT * FROM transactions WHERE "Completed Date" >= ?'
+        for day in ("2025-01-05", "2025-01-10", "2025-01-15"):
+            response = db_client.post(
+                "/execute_sql", json={"query": query, "params": [day]}
+            )
+            assert response.status_code == 200
+        cache = db_client.get("/stats").json()["statement_cache"]
+        assert cache["misses"] == 1
+        assert cache["hits"] == 2
+        assert cache["hit_rate"] == pytest.approx(2 / 3)
+
+    def test_index_advisor_reports_scans(self, db_client):
+        indexes = db_client.get("/index_advisor").json()["indexes"]
+        assert "transactions_completed_date" in [index["name"] for index in indexes]
+
+        query = 'SELECT * FROM transactions WHERE "Description" LIKE ?'
+        for pattern in ("%1%", "%2%"):
+            db_client.post("/execute_sql", json={"query": query, "params": [pattern]})
+        db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'SELECT * FROM transactions WHERE "Completed Date" >= ?',
+                "params": ["2025-01-20"],
+            },
+        )
+        [report] = db_client.get("/index_advisor").json()["queries"]
+        assert report["query"] == query
+        assert report["count"] == 2
+        assert report["candidate_columns"] == ["Description"]
+        assert db_client.get("/stats").json()["index_advisor"]["queries"] == 2
+
+    def test_monthly_summary_follows_writes(self, db_client):
+        db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'DELETE FROM transactions WHERE "Completed Date" < ?',
+                "params": ["2025-01-11"],
+            },
+        )
+        response = db_client.get(
+            "/summary/monthly", params={"year": 2025, "by_type": False}
+        )
+        assert response.status_code == 200
+        assert [(r["QUI"], r["count"]) for r in response.json()["rows"]] == [
+            ("G", 8),
+            ("N", 7),
+        ]
+        rebuilt = db_client.post("/admin/rebuild_summary")
+        assert rebuilt.json()["rows"] == 2
+
+    def test_search(self, db_client):
+        response = db_client.get(
+            "/search", params={"q": "merchant 1", "owner": "G", "limit": 3}
+        )
+        assert response.status_code == 200
+        body = response.json()
+        # Odd days are G's: Merchant 1, 11, 13... 19
+        assert len(body["rows"]) == 3
+        assert all(row["Description"].startswith("Merchant 1") for row in body["rows"])
+        assert all(row["QUI"] == "G" for row in body["rows"])
+        assert body["next_offset"] == 3
+        assert db_client.get("/search", params={"q": " "}).status_code == 400
+        rebuilt = db_client.post("/admin/rebuild_search")
+        assert rebuilt.json()["rows"] == 25
+
+    def test_writes_go_through_the_writer(self, db_client):
+        response = db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'UPDATE transactions SET "COMMENT" = ? WHERE rowid <= 3',
+                "params": ["checked"],
+            },
+        )
+        assert response.status_code == 200
+        assert response.json()["result"]["rows_affected"] == 3
+        returning = db_client.post(
+            "/execute_sql",
+            json={"query": "DELETE FROM transactions WHERE rowid = 4 RETURNING rowid"},
+        )
+        assert returning.json()["result"]["rows_affected"] == 1
+        stats = db_client.get("/stats").json()
+        assert stats["writer"]["writes"] == 2
+        assert stats["writer"]["commits"] == 2
+
+    def test_upload_and_update_share_the_writer(self, db_client, tmp_path):
+        """
+        An upload should queue behind a running write, along with an UPDATE,
+        instead of competing with the writer for the lock.
+        """
+        writer = db_client.app.state.db_writer
+        started, release = threading.Event(), threading.Event()
+
+        def blocking(conn):
+            started.set()
+            release.wait()
+
+        holder = threading.Thread(target=anyio.run, args=(writer.run, blocking))
+        holder.start()
+        started.wait()
+        with (
+            patch.object(
+                type(database_settings),
+                "blob_path",
+                PropertyMock(return_value=str(tmp_path)),
+            ),
+            ThreadPoolExecutor(max_workers=2) as requests,
+        ):
+            upload = requests.submit(
+                db_client.post,
+                "/upload_file",
+                files={"file": ("s.pdf", io.BytesIO(b"%PDF"), "application/pdf")},
+                data={"owner": "G", "year": 2025, "month": 8, "bank": "BNP"},
+            )
+            update = requests.submit(
+                db_client.post,
+                "/execute_sql",
+                json={
+                    "query": 'UPDATE transactions SET "COMMENT" = ? WHERE rowid = 1',
+                    "params": ["checked"],
+                },
+            )
+            time.sleep(0.2)
+            assert not upload.done() and not update.done()
+            release.set()
+            assert upload.result().status_code == 200
+            assert update.result().json()["result"]["rows_affected"] == 1
+        holder.join()
+        assert db_client.get("/stats").json()["writer"]["writes"] == 3
+        files = db_client.get("/files").json()["files"]
+        assert [f["path"] for f in files] == ["raw/2025/8/G_BNP.pdf"]
+
+    def test_read_only_statements_are_not_writes(self, db_client):
+        for query in (
+            'WITH t AS (SELECT DISTINCT "QUI" FROM transactions) SELECT * FROM t',
+            "PRAGMA table_info(transactions)",
+        ):
+            response = db_client.post("/execute_sql", json={"query": query})
+            assert response.status_code == 200
+            assert isinstance(response.json()["result"], list)
+        assert db_client.get("/stats").json()["writer"]["writes"] == 0
+
+    def test_transaction_control_is_rejected(self, db_client):
+        for query in ("BEGIN", "COMMIT", "SAVEPOINT s"):
+            response = db_client.post("/execute_sql", json={"query": query})
+            assert response.status_code == 400
+
+    def test_query_over_step_budget_is_aborted(self, db_client):
+        with patch.object(database_settings, "query_max_steps", 10_000):
+            response = db_client.post(
+                "/execute_sql",
+                json={
+                    "query": "SELECT * FROM transactions a, transactions b, "
+                    "transactions c"
+                },
+            )
+        assert response.status_code == 408
+        assert "SQLite VM steps" in response.json()["detail"]
+        # The connection is still good for the next query
+        count = db_client.post(
+            "/execute_sql", json={"query": "SELECT COUNT(*) AS n FROM transactions"}
+        )
+        assert count.json()["result"] == [{"n": 25}]
+
+    def test_result_over_row_budget_is_refused(self, db_client):
+        with patch.object(database_settings, "query_max_rows", 10):
+            response = db_client.post(
+                "/execute_sql", json={"query": "SELECT * FROM transactions"}
+            )
+            paged = db_client.post(
+                "/execute_sql",
+                json={
+                    "query": "SELECT rowid AS id, * FROM transactions",
+                    "page_size": 10,
+                    "page_key": "id",
+                },
+            )
+        assert response.status_code == 413
+        assert paged.status_code == 200
+
+    def test_result_over_byte_budget_is_refused(self, db_client):
+        with patch.object(database_settings, "query_max_bytes", 100):
+            response = db_client.post(
+                "/execute_sql", json={"query": "SELECT * FROM transactions"}
+            )
+        assert response.status_code == 413
+
+    def test_write_over_budget_is_rolled_back(self, db_client):
+        with patch.object(database_settings, "query_max_steps", 10_000):
+            response = db_client.post(
+                "/execute_batch",
+                json={
+                    "statements": [
+                        {"query": "DELETE FROM transactions WHERE rowid = 1"},
+                        {
+                            "query": "INSERT INTO transactions SELECT a.* FROM "
+                            "transactions a, transactions b, transactions c"
+                        },
+                    ]
+                },
+            )
+        assert response.status_code == 408
+        count = db_client.post(
+            "/execute_sql", json={"query": "SELECT COUNT(*) AS n FROM transactions"}
+        )
+        assert count.json()["result"] == [{"n": 25}]
+
+    def test_metrics(self, db_client):
+        db_client.post(
+            "/execute_sql",
+            json={"query": "SELECT * FROM transactions", "cache": False},
+        )
+        db_client.post(
+            "/execute_sql", json={"query": "DELETE FROM transactions WHERE rowid = 1"}
+        )
+        response = db_client.get("/metrics")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/plain")
+        lines = response.text.splitlines()
+
+        def value(sample: str) -> float:
+            [line] = [line for line in lines if line.startswith(sample + " ")]
+            return float(line.split()[-1])
+
+        for phase in ("connect", "execute", "fetch", "serialize"):
+            sample = (
+                "database_phase_duration_seconds_count"
+                f'{{route="/execute_sql",phase="{phase}"}}'
+            )
+            assert value(sample) >= 1
+        assert value('database_rows_returned_total{route="/execute_sql"}') >= 25
+        assert value('http_response_bytes_total{route="/execute_sql"}') > 0
+        assert (
+            value(
+                "http_request_duration_seconds_count"
+                '{route="/execute_sql",method="POST",status="200"}'
+            )
+            >= 2
+        )
+        assert value('database_pool_connections{pool="read_only",state="in_use"}') == 0
+        assert value("database_writer_writes_total") == 1
+        assert value("http_requests_in_flight") == 1
+
+    def test_slow_queries_are_logged(self, db_client):
+        slow_log = db_client.app.state.slow_query_log
+        with patch.object(slow_log, "threshold", 0):
+            for qui in ("G", "N"):
+                db_client.post(
+                    "/execute_sql",
+                    json={
+                        "query": f"SELECT * FROM transactions WHERE \"QUI\" = '{qui}'",
+                        "cache": False,
+                    },
+                )
+        with patch.object(database_settings, "query_max_steps", 10_000):
+            db_client.post(
+                "/execute_sql",
+                json={
+                    "query": "SELECT * FROM transactions a, transactions b, "
+                    "transactions c"
+                },
+            )
+        body = db_client.get("/slow_queries", params={"recent": 1}).json()
+        by_query = {group["query"]: group for group in body["statements"]}
+        group = by_query['select * from transactions where "QUI" = ?']
+        assert group["count"] == 2
+        assert group["latest"]["rows"] == 12
+        assert group["latest"]["plan"]
+        aborted = by_query[
+            "select * from transactions a, transactions b, transactions c"
+        ]
+        assert aborted["latest"]["rows"] is None
+        assert len(body["recent"]) == 1
+        assert slow_log.path.read_text().count("\n") == 3
+
+    def test_select_is_served_from_cache(self, db_client):
+        query = {"query": "SELECT COUNT(*) AS n FROM transactions"}
+        first = db_client.post("/execute_sql", json=query)
+        second = db_client.post("/execute_sql", json=query)
+        assert first.json() == second.json() == {"result": [{"n": 25}]}
+        assert first.headers["ETag"] == second.headers["ETag"]
+        cache = db_client.get("/stats").json()["result_cache"]
+        assert cache["hits"] == 1
+        assert cache["misses"] == 1
+
+    def test_write_invalidates_cache(self, db_client):
+        query = {"query": "SELECT COUNT(*) AS n FROM transactions"}
+        before = db_client.post("/execute_sql", json=query)
+        db_client.post(
+            "/execute_sql", json={"query": "DELETE FROM transactions WHERE rowid = 1"}
+        )
+        after = db_client.post("/execute_sql", json=query)
+        assert after.json() == {"result": [{"n": 24}]}
+        assert after.headers["ETag"] != before.headers["ETag"]
+
+    def test_if_none_match_returns_304(self, db_client):
+        query = {"query": "SELECT COUNT(*) AS n FROM transactions"}
+        etag = db_client.post("/execute_sql", json=query).headers["ETag"]
+        response = db_client.post(
+            "/execute_sql", json=query, headers={"If-None-Match": etag}
+        )
+        assert response.status_code == 304
+        assert response.headers["ETag"] == etag
+
+    def test_cache_opt_out(self, db_client):
+        query = {"query": "SELECT random() AS r", "cache": False}
+        response = db_client.post("/execute_sql", json=query)
+        assert "ETag" not in response.headers
+        assert db_client.get("/stats").json()["result_cache"]["misses"] == 0
+
+    def test_batch_executemany(self, db_client):
+        response = db_client.post(
+            "/execute_batch",
+            json={
+                "query": 'UPDATE transactions SET "COMMENT" = ? WHERE rowid = ?',
+                "param_sets": [["rent", 1], ["food", 2], ["none", 999]],
+            },
+        )
+        assert response.status_code == 200
+        assert response.json() == {"rowcounts": [2], "rows_affected": 2}
+
+    def test_batch_statements_report_rowcounts(self, db_client):
+        response = db_client.post(
+            "/execute_batch",
+            json={
+                "statements": [
+                    {
+                        "query": 'UPDATE transactions SET "QUI" = ? WHERE "QUI" = ?',
+                        "params": ["X", "G"],
+                    },
+                    {"query": "DELETE FROM transactions WHERE rowid <= 3"},
+                ]
+            },
+        )
+        assert response.status_code == 200
+        assert response.json() == {"rowcounts": [13, 3], "rows_affected": 16}
+
+    def test_batch_is_all_or_nothing(self, db_client):
+        response = db_client.post(
+            "/execute_batch",
+            json={
+                "statements": [
+                    {"query": "DELETE FROM transactions"},
+                    {"query": "UPDATE no_such_table SET x = 1"},
+                ]
+            },
+        )
+        assert response.status_code == 400
+        assert "Statement 1 failed" in response.json()["detail"]
+        count = db_client.post(
+            "/execute_sql", json={"query": "SELECT COUNT(*) AS n FROM transactions"}
+        )
+        assert count.json()["result"] == [{"n": 25}]
+
+    def test_batch_requires_one_mode(self, db_client):
+        response = db_client.post(
+            "/execute_batch",
+            json={"query": "DELETE FROM transactions", "statements": []},
+        )
+        assert response.status_code == 422
+
+
+class TestUploadFiles:
+    """Test cases for the /upload_files bulk endpoint."""
+
+    REVOLUT_CSV = (
+        b"Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency\n"
+        b"TOPUP,Current,2025-08-03 11:00:00,2025-08-03 11:00:05,Top-up,100,0,EUR\n"
+    )
+
+    def post(self, client, blob_path, files, ingest=False):
+        data = {
+            "owners": [f[0] for f in files],
+            "years": [2025] * len(files),
+            "months": [8] * len(files),
+            "banks": [f[1] for f in files],
+            "ingest": ingest,
+        }
+        multipart = [("files", (f[2], io.BytesIO(f[3]), "text/plain")) for f in files]
+        with patch("database_pkg.app.database_settings") as mock_settings:
+            mock_settings.blob_path = blob_path
+            mock_settings.upload_concurrency = 2
+            mock_settings.ingest_chunk_size = 100
+            return client.post("/upload_files", files=multipart, data=data)
+
+    def test_upload_files_statuses(self, db_client, tmp_path):
+        blob_path = tmp_path / "blob"
+        first = [
+            ("G", "BNP", "a.pdf", b"%PDF one"),
+            ("N", "BNP", "b.pdf", b"%PDF two"),
+        ]
+        response = self.post(db_client, blob_path, first)
+        assert response.status_code == 200
+        assert [f["status"] for f in response.json()["files"]] == [
+            "created",
+            "created",
+        ]
+
+        second = [
+            ("G", "BNP", "a.pdf", b"%PDF one"),
+            ("N", "BNP", "b.pdf", b"%PDF changed"),
+            ("G", "HSBC", "c.txt", b"text"),
+            ("G", "HSBC", "d.pdf", b"%PDF new"),
+            ("G", "HSBC", "e.pdf", b"%PDF again"),
+        ]
+        results = self.post(db_client, blob_path, second).json()["files"]
+        assert [f["status"] for f in results] == [
+            "unchanged",
+            "conflict",
+            "error",
+            "created",
+            "conflict",
+        ]
+        assert (blob_path / "raw/2025/8/N_BNP.pdf").read_bytes() == b"%PDF two"
+        listed = db_client.get("/files").json()["files"]
+        assert [f["path"] for f in listed] == [
+            "raw/2025/8/G_BNP.pdf",
+            "raw/2025/8/G_HSBC.pdf",
+            "raw/2025/8/N_BNP.pdf",
+        ]
+
+    def test_upload_files_length_mismatch(self, db_client, tmp_path):
+        response = db_client.post(
+            "/upload_files",
+            files=[("files", ("a.pdf", io.BytesIO(b"%PDF"), "application/pdf"))],
+            data={
+                "owners": ["G", "N"],
+                "years": [2025],
+                "months": [8],
+                "banks": ["BNP"],
+            },
+        )
+        assert response.status_code == 400
+
+    def test_upload_files_queues_ingestion(self, db_client, tmp_path):
+        files = [
+            ("N", "Revolut", "revolut.csv", self.REVOLUT_CSV),
+            ("G", "BNP", "bnp.pdf", b"%PDF"),
+        ]
+        with patch("database_pkg.jobs.database_settings") as job_settings:
+            job_settings.blob_path = tmp_path / "blob"
+            job_settings.ingest_chunk_size = 100
+            results = self.post(db_client, tmp_path / "blob", files, ingest=True)
+            results = results.json()["files"]
+            assert "job_id" not in results[1]
+            job = wait_for_job(db_client, results[0]["job_id"])
+        assert job["status"] == "done"
+        assert (job["rows_parsed"], job["rows_inserted"]) == (1, 1)
+        assert job["result"]["path"] == "raw/2025/8/N_Revolut.csv"
+        assert job["duration_seconds"] >= 0
+        rows = db_client.post(
+            "/execute_sql",
+            json={
+                "query": 'SELECT "Description" FROM transactions WHERE "Source" IS NOT NULL'
+            },
+        ).json()["result"]
+        assert rows == [{"Description": "Top-up"}]
+
+
+def wait_for_job(client, job_id, timeout=10.0):
+    """Poll /jobs/{job_id} until the job has finished."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish: {job}")
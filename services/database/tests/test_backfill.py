@@ -0,0 +1,147 @@
+"""
+Unit tests for database_pkg.backfill module and the /admin/backfill endpoint.
+"""
+
+import sqlite3
+import time
+from concurrent.futures import as_completed
+from pathlib import Path
+from unittest.mock import PropertyMock, patch
+
+import pytest
+
+from database_pkg.backfill import backfill, discover_statements, parse_since
+from database_pkg.config.settings import database_settings
+
+REVOLUT_CSV = (
+    "Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency\n"
+    "CARD_PAYMENT,Current,2024-12-01 09:00:00,2024-12-01 10:00:00,Cafe,-3.50,0,EUR\n"
+    "TOPUP,Current,2024-12-03 11:00:00,2024-12-03 11:00:05,Top-up,100,0,EUR\n"
+)
+
+BNC_CSV = "Date;Description;Debit;Credit\n2025-01-02;EPICERIE;45.10;\n"
+
+
+@pytest.fixture
+def blob_path(tmp_path: Path) -> Path:
+    blob = tmp_path / "blob"
+    files = {
+        "raw/2024/12/N_Revolut.csv": REVOLUT_CSV,
+        "raw/2025/1/G_BNC.csv": BNC_CSV,
+        "raw/2025/1/G_BNP.pdf": "%PDF-1.4",
+        "raw/2025/1/notes.csv": "not a statement",
+        "raw/2025/2/N_HSBC.csv": "no header here\n",
+    }
+    for name, content in files.items():
+        path = blob / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return blob
+
+
+def test_parse_since() -> None:
+    assert parse_since("2025-03") == (2025, 3)
+    assert parse_since("2025") == (2025, 1)
+    with pytest.raises(ValueError):
+        parse_since("2025-13")
+
+
+def test_discover_statements(blob_path: Path) -> None:
+    sources = [s.source for s in discover_statements(blob_path)]
+    assert sources == [
+        "raw/2024/12/N_Revolut.csv",
+        "raw/2025/1/G_BNC.csv",
+        "raw/2025/2/N_HSBC.csv",
+    ]
+    since = [s.source for s in discover_statements(blob_path, (2025, 2))]
+    assert since == ["raw/2025/2/N_HSBC.csv"]
+
+
+def test_backfill(blob_path: Path, tmp_path: Path) -> None:
+    conn = sqlite3.connect(tmp_path / "test.db")
+    result = backfill(conn, blob_path, workers=2, commit_rows=1, chunk_size=1)
+    assert (result.files, result.rows_inserted, result.rows_replaced) == (2, 3, 0)
+    assert list(result.failed) == ["raw/2025/2/N_HSBC.csv"]
+    assert result.commits == 2
+
+    result = backfill(conn, blob_path, since=(2025, 1), workers=1, force=True)
+    assert (result.files, result.rows_inserted, result.rows_replaced) == (1, 1, 1)
+    rows = conn.execute(
+        'SELECT "Source", COUNT(*) FROM transactions GROUP BY "Source"'
+    ).fetchall()
+    assert rows == [("raw/2024/12/N_Revolut.csv", 2), ("raw/2025/1/G_BNC.csv", 1)]
+    conn.close()
+
+
+def test_backfill_waits_for_parsers_outside_transactions(
+    blob_path: Path, tmp_path: Path
+) -> None:
+    conn = sqlite3.connect(tmp_path / "test.db")
+    in_transaction = []
+
+    def watched(futures):
+        for future in as_completed(futures):
+            in_transaction.append(conn.in_transaction)
+            yield future
+
+    with patch("database_pkg.backfill.as_completed", watched):
+        result = backfill(conn, blob_path, workers=2, commit_rows=100)
+    assert result.commits == 1
+    assert in_transaction == [False, False, False]
+    conn.close()
+
+
+def test_backfill_skips_unchanged_files(blob_path: Path, tmp_path: Path) -> None:
+    conn = sqlite3.connect(tmp_path / "test.db")
+    backfill(conn, blob_path, workers=1)
+
+    result = backfill(conn, blob_path, workers=1)
+    assert (result.files, result.skipped, result.rows_inserted) == (0, 2, 0)
+
+    # Same bytes with a new mtime are hashed again, then skipped
+    bnc = blob_path / "raw/2025/1/G_BNC.csv"
+    bnc.write_text(BNC_CSV)
+    result = backfill(conn, blob_path, workers=1)
+    assert (result.files, result.skipped) == (0, 2)
+
+    bnc.write_text(BNC_CSV + "2025-01-03;PHARMACIE;12.00;\n")
+    result = backfill(conn, blob_path, workers=1)
+    assert (result.files, result.skipped, result.rows_inserted) == (1, 1, 2)
+    ingested = conn.execute(
+        'SELECT "ingested_sha256" = "sha256" FROM files WHERE "path" = ?',
+        ("raw/2025/1/G_BNC.csv",),
+    ).fetchone()
+    assert ingested == (1,)
+    conn.close()
+
+
+def test_admin_backfill_endpoint(db_client, blob_path: Path) -> None:
+    with patch.object(
+        type(database_settings), "blob_path", PropertyMock(return_value=blob_path)
+    ):
+        response = db_client.post(
+            "/admin/backfill", json={"since_year": 2024, "since_month": 12}
+        )
+        assert response.status_code == 200
+        job_id = response.json()["job_id"]
+        deadline = time.monotonic() + 30
+        while (job := db_client.get(f"/jobs/{job_id}").json())["status"] in (
+            "queued",
+            "running",
+        ):
+            assert time.monotonic() < deadline, job
+            time.sleep(0.05)
+    assert job["status"] == "done", job
+    body = job["result"]
+    assert (body["files"], body["rows_inserted"]) == (2, 3)
+    assert list(body["failed"]) == ["raw/2025/2/N_HSBC.csv"]
+    assert job["rows_inserted"] == 3
+
+
+def test_backfill_reads_settings_when_called(blob_path: Path, tmp_path: Path) -> None:
+    conn = sqlite3.connect(tmp_path / "test.db")
+    with patch.object(database_settings, "backfill_commit_rows", 1):
+        result = backfill(conn, blob_path, workers=1)
+    conn.close()
+    # One commit per statement parsed
+    assert result.commits == result.files
@@ -0,0 +1,112 @@
+"""
+Unit tests for database_pkg.budget module.
+"""
+
+import sqlite3
+import threading
+import time
+
+import anyio
+import pytest
+
+from database_pkg.budget import (
+    QueryBudget,
+    QueryCancelledError,
+    QueryTimeoutError,
+    ResultTooLargeError,
+)
+from database_pkg.utils import get_query_budget
+
+# Runs for as long as it is let: about 10^12 rows to count
+CROSS_JOIN = (
+    "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n "
+    "WHERE i < 1000000) SELECT count(*) FROM n AS a, n AS b"
+)
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    yield conn
+    conn.close()
+
+
+def test_timeout_aborts_the_query(conn) -> None:
+    budget = QueryBudget(timeout=0.1, max_steps=0, max_rows=0, max_bytes=0)
+    start = time.monotonic()
+    with pytest.raises(QueryTimeoutError):
+        with budget.applied(conn):
+            conn.execute(CROSS_JOIN).fetchone()
+    assert time.monotonic() - start < 1
+    # The connection is left usable, without the progress handler
+    assert conn.execute("SELECT 1").fetchone() == (1,)
+
+
+def test_step_limit_aborts_the_query(conn) -> None:
+    budget = QueryBudget(timeout=0, max_steps=100_000, max_rows=0, max_bytes=0)
+    with pytest.raises(QueryTimeoutError, match="100000 SQLite VM steps"):
+        with budget.applied(conn):
+            conn.execute(CROSS_JOIN).fetchone()
+    assert budget.steps > 100_000
+
+
+def test_time_is_counted_across_blocks(conn) -> None:
+    budget = QueryBudget(timeout=0.2, max_steps=0, max_rows=0, max_bytes=0)
+    with budget.applied(conn):
+        time.sleep(0.15)
+    with pytest.raises(QueryTimeoutError):
+        with budget.applied(conn):
+            conn.execute(CROSS_JOIN).fetchone()
+
+
+def test_cancel_from_another_thread(conn) -> None:
+    budget = QueryBudget(timeout=0, max_steps=0, max_rows=0, max_bytes=0)
+    threading.Timer(0.05, budget.cancel).start()
+    with pytest.raises(QueryCancelledError):
+        with budget.applied(conn):
+            conn.execute(CROSS_JOIN).fetchone()
+    # Once cancelled, nothing more runs
+    with pytest.raises(QueryCancelledError):
+        with budget.applied(conn):
+            pass
+
+
+def test_other_errors_pass_through(conn) -> None:
+    budget = QueryBudget(timeout=10, max_steps=0, max_rows=0, max_bytes=0)
+    with pytest.raises(sqlite3.OperationalError, match="no such table"):
+        with budget.applied(conn):
+            conn.execute("SELECT * FROM missing")
+
+
+def test_result_limits() -> None:
+    budget = QueryBudget(timeout=0, max_steps=0, max_rows=10, max_bytes=100)
+    budget.check_rows(10)
+    budget.check_bytes(100)
+    with pytest.raises(ResultTooLargeError):
+        budget.check_rows(11)
+    with pytest.raises(ResultTooLargeError):
+        budget.check_bytes(101)
+    unlimited = QueryBudget(timeout=0, max_steps=0, max_rows=0, max_bytes=0)
+    unlimited.check_rows(10**9)
+    unlimited.check_bytes(10**12)
+
+
+def test_budget_is_cancelled_when_the_client_goes_away() -> None:
+    class GoneRequest:
+        class url:
+            path = "/execute_sql"
+
+        async def is_disconnected(self) -> bool:
+            return True
+
+    async def main() -> QueryBudget:
+        dependency = get_query_budget(GoneRequest())
+        budget = await anext(dependency)
+        await anyio.sleep(0.05)
+        await dependency.aclose()
+        return budget
+
+    budget = anyio.run(main)
+    with pytest.raises(QueryCancelledError):
+        with budget.applied(sqlite3.connect(":memory:")):
+            pass
@@ -0,0 +1,98 @@
+"""
+Unit tests for database_pkg.catalog module and the /files endpoint.
+"""
+
+import io
+import os
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+from database_pkg.catalog import (
+    describe_file,
+    hash_file,
+    is_ingested,
+    list_files,
+    mark_ingested,
+    save_entries,
+)
+
+
+def test_describe_file_reuses_catalog_hash(tmp_path: Path) -> None:
+    blob = tmp_path / "blob"
+    path = blob / "raw" / "2025" / "8" / "G_BNP.pdf"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(b"%PDF-1.4 statement")
+    conn = sqlite3.connect(tmp_path / "test.db")
+
+    entry = describe_file(conn, blob, path, "G", "BNP", 2025, 8)
+    assert entry.path == "raw/2025/8/G_BNP.pdf"
+    assert entry.sha256 == hash_file(path)
+    save_entries(conn, [entry])
+
+    # Size and mtime unchanged: the stored hash is trusted, the file not read
+    with patch("database_pkg.catalog.hash_file") as mock_hash:
+        assert describe_file(conn, blob, path, "G", "BNP", 2025, 8) == entry
+        mock_hash.assert_not_called()
+
+    path.write_bytes(b"%PDF-1.4 corrected statement")
+    os.utime(path, (1, 1))
+    assert describe_file(conn, blob, path, "G", "BNP", 2025, 8).sha256 != entry.sha256
+    conn.close()
+
+
+def test_mark_ingested(tmp_path: Path) -> None:
+    blob = tmp_path / "blob"
+    path = blob / "raw" / "2025" / "8" / "N_Revolut.csv"
+    path.parent.mkdir(parents=True)
+    path.write_text("Type,Amount\n")
+    conn = sqlite3.connect(tmp_path / "test.db")
+    entry = describe_file(conn, blob, path, "N", "Revolut", 2025, 8)
+
+    assert not is_ingested(conn, entry)
+    mark_ingested(conn, entry)
+    conn.commit()
+    assert is_ingested(conn, entry)
+    assert not is_ingested(conn, entry._replace(sha256="0" * 64))
+    conn.close()
+
+
+def test_list_files(tmp_path: Path) -> None:
+    conn = sqlite3.connect(tmp_path / "test.db")
+    assert list_files(conn) == []
+    blob = tmp_path / "blob"
+    for owner, bank, month in [("G", "BNP", 8), ("N", "BNP", 8), ("G", "HSBC", 7)]:
+        path = blob / "raw" / "2025" / str(month) / f"{owner}_{bank}.pdf"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(owner.encode())
+        save_entries(conn, [describe_file(conn, blob, path, owner, bank, 2025, month)])
+
+    assert [f["path"] for f in list_files(conn)] == [
+        "raw/2025/7/G_HSBC.pdf",
+        "raw/2025/8/G_BNP.pdf",
+        "raw/2025/8/N_BNP.pdf",
+    ]
+    assert [f["path"] for f in list_files(conn, month=8, owner="G")] == [
+        "raw/2025/8/G_BNP.pdf"
+    ]
+    conn.close()
+
+
+def test_files_endpoint(db_client, tmp_path: Path) -> None:
+    data = {"owner": "G", "year": 2025, "month": 8, "bank": "BNP"}
+    with patch("database_pkg.app.database_settings") as mock_settings:
+        mock_settings.blob_path = tmp_path / "blob"
+        for _ in range(2):
+            response = db_client.post(
+                "/upload_file",
+                files={"file": ("s.pdf", io.BytesIO(b"%PDF"), "application/pdf")},
+                data=data,
+            )
+    assert response.json()["status"] == "unchanged"
+
+    listed = db_client.get("/files", params={"year": 2025, "bank": "BNP"}).json()
+    assert [(f["path"], f["size"]) for f in listed["files"]] == [
+        ("raw/2025/8/G_BNP.pdf", 4)
+    ]
+    assert listed["files"][0]["ingested_sha256"] is None
+    assert db_client.get("/files", params={"month": 7}).json() == {"files": []}
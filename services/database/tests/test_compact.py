@@ -0,0 +1,257 @@
+"""
+Unit tests for database_pkg.compact module and the compact schema's view and triggers.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import orjson
+import pytest
+
+from database_pkg.compact import migrate_to_compact
+from database_pkg.config.schemas import SQLBatch, SQLQuery
+from database_pkg.index_advisor import list_indexes
+from database_pkg.ingest import replace_rows
+from database_pkg.queries import run_batch, run_write
+from database_pkg.schema import (
+    ensure_transactions_table,
+    is_compact,
+    transactions_by_rowid,
+)
+from database_pkg.search import rebuild_search_index, search_transactions
+from database_pkg.summary import monthly_totals, rebuild_summary
+
+
+@pytest.fixture
+def conn(transactions_db: Path):
+    conn = sqlite3.connect(transactions_db, isolation_level=None)
+    conn.execute("BEGIN")
+    ensure_transactions_table(conn)
+    conn.execute("COMMIT")
+    yield conn
+    conn.close()
+
+
+def all_rows(conn: sqlite3.Connection) -> list[tuple]:
+    return conn.execute(
+        'SELECT "rowid", "Type", "Product", "Started Date", "Completed Date", '
+        '"Description", "Amount", "Fee", "Currency", "QUI", "COMMENT", "Source" '
+        f'FROM "{transactions_by_rowid(conn)}" ORDER BY "rowid"'
+    ).fetchall()
+
+
+def test_migration_keeps_rows_and_values(conn) -> None:
+    before = all_rows(conn)
+    totals = monthly_totals(conn)
+
+    stats = migrate_to_compact(conn)
+
+    assert is_compact(conn)
+    assert stats == {
+        "rows": 25,
+        "transaction_types": 1,
+        "products": 1,
+        "currencies": 1,
+        "owners": 2,
+    }
+    assert all_rows(conn) == before
+    assert monthly_totals(conn) == totals
+    assert conn.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'transactions'"
+    ).fetchone() == ("view",)
+    with pytest.raises(ValueError):
+        migrate_to_compact(conn)
+
+
+def test_migration_refuses_unconvertible_values(conn) -> None:
+    conn.execute(
+        'INSERT INTO "transactions" ("Completed Date", "Amount") '
+        "VALUES ('last tuesday', 1.0)"
+    )
+    with pytest.raises(ValueError):
+        migrate_to_compact(conn)
+    assert not is_compact(conn)
+    assert conn.execute('SELECT count(*) FROM "transactions"').fetchone() == (26,)
+
+
+@pytest.mark.parametrize(
+    "column, value",
+    [
+        ("Amount", -1.005),
+        ("Fee", 0.001),
+        ("Completed Date", "2025-02-01"),
+        ("Started Date", "2025-02-01 10:00:00+02:00"),
+    ],
+)
+def test_migration_refuses_values_it_would_change(conn, column, value) -> None:
+    conn.execute(f'INSERT INTO "transactions" ("{column}") VALUES (?)', (value,))
+    with pytest.raises(ValueError, match="rowids 26"):
+        migrate_to_compact(conn)
+    assert not is_compact(conn)
+
+    migrate_to_compact(conn, force=True)
+    assert is_compact(conn)
+
+
+def test_writes_go_through_the_view(conn) -> None:
+    migrate_to_compact(conn)
+
+    conn.execute(
+        'INSERT INTO "transactions" ("Type", "Completed Date", "Description", '
+        '"Amount", "Currency", "QUI") '
+        "VALUES ('TOPUP', '2025-02-01 08:30:00', 'Virement', 100.005, 'CAD', 'N')"
+    )
+    row = conn.execute(
+        'SELECT "Type", "Completed Date", "Amount", "Currency" FROM "transactions" '
+        "WHERE \"Currency\" = 'CAD'"
+    ).fetchone()
+    # Amounts are stored in cents
+    assert row == ("TOPUP", "2025-02-01 08:30:00", 100.01, "CAD")
+    assert conn.execute(
+        'SELECT "amount", "completed_at" FROM "transactions_data" '
+        "WHERE \"description\" = 'Virement'"
+    ).fetchone() == (10001, 1738398600)
+
+    conn.execute(
+        'UPDATE "transactions" SET "QUI" = \'G\', "Amount" = 50 '
+        "WHERE \"Currency\" = 'CAD'"
+    )
+    assert monthly_totals(conn, month=2) == [
+        {
+            "year": 2025,
+            "month": 2,
+            "QUI": "G",
+            "Currency": "CAD",
+            "Type": "TOPUP",
+            "count": 1,
+            "Amount": 50.0,
+            "Fee": 0.0,
+        }
+    ]
+
+    conn.execute('DELETE FROM "transactions" WHERE "Currency" = \'CAD\'')
+    assert monthly_totals(conn, month=2) == []
+    assert conn.execute('SELECT count(*) FROM "transactions"').fetchone() == (25,)
+
+
+def test_view_keeps_the_shape_of_the_table(conn) -> None:
+    before = conn.execute('SELECT * FROM "transactions" LIMIT 1')
+    columns = [c[0] for c in before.description]
+    first = before.fetchone()
+    migrate_to_compact(conn)
+
+    after = conn.execute('SELECT * FROM "transactions" LIMIT 1')
+    assert [c[0] for c in after.description] == columns
+    assert after.fetchone() == first
+    duplicate = ("CARD_PAYMENT", "Current", None, "2025-03-01 12:00:00", "Twice")
+    for _ in range(2):
+        conn.execute(
+            'INSERT INTO "transactions" VALUES (?, ?, ?, ?, ?, -2.5, 0, '
+            "'EUR', 'G', NULL, NULL)",
+            duplicate,
+        )
+    assert conn.execute(
+        'SELECT "rowid" FROM "transaction_rows" WHERE "Description" = \'Twice\''
+    ).fetchall() == [(26,), (27,)]
+
+    # Rows are found by their values, duplicates included
+    conn.execute(
+        'UPDATE "transactions" SET "COMMENT" = \'both\' WHERE "Description" = \'Twice\''
+    )
+    assert conn.execute(
+        'SELECT "COMMENT" FROM "transactions" WHERE "Description" = \'Twice\''
+    ).fetchall() == [("both",), ("both",)]
+    conn.execute('DELETE FROM "transactions" WHERE "Description" = \'Twice\'')
+    assert conn.execute('SELECT count(*) FROM "transactions"').fetchone() == (25,)
+
+    conn.execute('UPDATE "transaction_rows" SET "COMMENT" = \'one\' WHERE "rowid" = 3')
+    assert conn.execute(
+        'SELECT "rowid" FROM "transaction_rows" WHERE "COMMENT" = \'one\''
+    ).fetchall() == [(3,)]
+
+
+def test_search_index_follows_the_compact_schema(conn) -> None:
+    migrate_to_compact(conn)
+    assert [r["Description"] for r in search_transactions(conn, "merchant 7")["rows"]]
+
+    conn.execute(
+        'UPDATE "transactions" SET "Description" = \'Boulangerie\' '
+        "WHERE \"Description\" = 'Merchant 7'"
+    )
+    assert search_transactions(conn, "boulang")["rows"][0]["Description"] == (
+        "Boulangerie"
+    )
+    assert rebuild_search_index(conn) == 25
+    assert rebuild_summary(conn) == 2
+
+
+def test_replace_rows_counts_rows_replaced_through_the_view(conn) -> None:
+    conn.execute('UPDATE "transactions" SET "Source" = \'raw/jan.csv\'')
+    migrate_to_compact(conn)
+
+    conn.execute("BEGIN")
+    result = replace_rows(
+        conn,
+        "raw/jan.csv",
+        [
+            (
+                None,
+                None,
+                None,
+                "2025-01-01 10:00:00",
+                "Merchant",
+                -1.0,
+                0.0,
+                "EUR",
+                "G",
+                None,
+                "raw/jan.csv",
+            )
+        ],
+        chunk_size=10,
+    )
+    conn.execute("COMMIT")
+    assert result == (1, 25)
+
+
+def test_queries_on_the_view_use_the_expression_indexes(conn) -> None:
+    migrate_to_compact(conn)
+    assert {index["name"]: index["columns"] for index in list_indexes(conn)} == {
+        "transactions_data_completed_date": ["Completed Date"],
+        "transactions_data_started_date": ["Started Date"],
+        "transactions_data_owner_completed_date": ["QUI", "Completed Date"],
+        "transactions_data_currency": ["Currency"],
+        "transactions_data_source": ["Source"],
+    }
+    plan = " ".join(
+        row[3]
+        for row in conn.execute(
+            'EXPLAIN QUERY PLAN SELECT * FROM "transactions" '
+            'WHERE "QUI" = ? AND "Completed Date" >= ?',
+            ("G", "2025-01-10"),
+        )
+    )
+    assert "transactions_data_owner_completed_date" in plan
+
+
+def test_writes_through_the_view_report_their_rows(conn) -> None:
+    migrate_to_compact(conn)
+    conn.execute("BEGIN")
+    written = run_write(
+        conn,
+        SQLQuery(
+            query='UPDATE "transactions" SET "COMMENT" = \'x\' WHERE "QUI" = \'G\''
+        ),
+    )
+    assert orjson.loads(written.body) == {"result": {"rows_affected": 13}}
+    batch = run_batch(
+        conn,
+        SQLBatch(
+            statements=[
+                {"query": 'DELETE FROM "transactions" WHERE "QUI" = \'N\''},
+                {"query": 'INSERT INTO "transactions" ("QUI") VALUES (\'N\')'},
+            ]
+        ),
+    )
+    assert orjson.loads(batch.body) == {"rowcounts": [12, 1], "rows_affected": 13}
+    conn.execute("COMMIT")
@@ -0,0 +1,92 @@
+"""
+Unit tests for database_pkg.excel_to_sqlite module.
+"""
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+from database_pkg.excel_to_sqlite import (
+    column_headers,
+    excel_to_sqlite_streaming,
+    infer_column_type,
+)
+
+
+@pytest.fixture
+def workbook_path(tmp_path: Path) -> Path:
+    path = tmp_path / "legacy.xlsx"
+    workbook = Workbook()
+    january = workbook.active
+    january.title = "Janvier"
+    january.append(["Date", "Description", "Amount", None, "Amount"])
+    for day in range(1, 11):
+        january.append([datetime(2025, 1, day), f"Shop {day}", -day, 1, day / 2])
+    january.append([None, None, None, None, None])
+    february = workbook.create_sheet("Février")
+    february.append(["Date", "Count"])
+    february.append([datetime(2025, 2, 1, 8, 30), 3])
+    workbook.save(path)
+    return path
+
+
+def test_column_headers_match_pandas() -> None:
+    assert column_headers(["A", None, "A", "A"]) == ["A", "Unnamed: 1", "A.1", "A.2"]
+
+
+@pytest.mark.parametrize(
+    "values, expected",
+    [
+        ([1, None, 2], "INTEGER"),
+        ([1, 2.5], "REAL"),
+        ([datetime(2025, 1, 1)], "TIMESTAMP"),
+        ([1, "x"], "TEXT"),
+        ([None], "TEXT"),
+    ],
+)
+def test_infer_column_type(values, expected) -> None:
+    assert infer_column_type(values) == expected
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_streaming_load(workbook_path: Path, tmp_path: Path, workers: int) -> None:
+    sqlite_path = tmp_path / "legacy.db"
+    counts = excel_to_sqlite_streaming(
+        workbook_path, sqlite_path, chunk_size=3, workers=workers
+    )
+    assert counts == {"Janvier": 10, "Février": 1}
+
+    conn = sqlite3.connect(sqlite_path)
+    types = [(row[1], row[2]) for row in conn.execute('PRAGMA table_info("Janvier")')]
+    assert types == [
+        ("Date", "TIMESTAMP"),
+        ("Description", "TEXT"),
+        ("Amount", "INTEGER"),
+        ("Unnamed: 3", "INTEGER"),
+        ("Amount.1", "REAL"),
+    ]
+    assert conn.execute('SELECT * FROM "Janvier" LIMIT 1').fetchone() == (
+        "2025-01-01 00:00:00",
+        "Shop 1",
+        -1,
+        1,
+        0.5,
+    )
+    assert conn.execute('SELECT * FROM "Février"').fetchall() == [
+        ("2025-02-01 08:30:00", 3)
+    ]
+    conn.close()
+
+
+def test_streaming_load_replaces_tables(workbook_path: Path, tmp_path: Path) -> None:
+    sqlite_path = tmp_path / "legacy.db"
+    excel_to_sqlite_streaming(workbook_path, sqlite_path, workers=1)
+    excel_to_sqlite_streaming(workbook_path, sqlite_path, workers=1)
+    conn = sqlite3.connect(sqlite_path)
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master")]
+    assert sorted(tables) == ["Février", "Janvier"]
+    assert conn.execute('SELECT COUNT(*) FROM "Janvier"').fetchone()[0] == 10
+    conn.close()
@@ -0,0 +1,104 @@
+"""
+Unit tests for database_pkg.executor module.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+
+import anyio
+import pytest
+
+from database_pkg.config.settings import database_settings
+from database_pkg.executor import DatabaseBusyError, DatabaseExecutor
+from database_pkg.pool import ConnectionPool
+from database_pkg.utils import executor_workers
+
+
+def test_run_returns_result_from_worker_thread() -> None:
+    """Work should run off the event loop thread and return its result."""
+    executor_threads = []
+
+    def work(x: int) -> int:
+        executor_threads.append(threading.get_ident())
+        return x * 2
+
+    async def main() -> int:
+        executor = DatabaseExecutor(max_workers=1, queue_depth=0)
+        return await executor.run(work, 21)
+
+    assert anyio.run(main) == 42
+    assert executor_threads[0] != threading.get_ident()
+
+
+def test_event_loop_keeps_serving_during_blocking_work() -> None:
+    """A blocking call should not stall other coroutines."""
+    ticks = []
+
+    async def ticker() -> None:
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await anyio.sleep(0.01)
+
+    async def main() -> None:
+        executor = DatabaseExecutor(max_workers=1, queue_depth=0)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(executor.run, time.sleep, 0.2)
+            tg.start_soon(ticker)
+
+    start = time.monotonic()
+    anyio.run(main)
+    assert len(ticks) == 5
+    assert ticks[-1] - start < 0.2
+
+
+def test_saturated_executor_rejects_work() -> None:
+    """Calls beyond workers plus queue depth should be rejected."""
+
+    async def main() -> None:
+        executor = DatabaseExecutor(max_workers=1, queue_depth=1)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(executor.run, time.sleep, 0.1)
+            tg.start_soon(executor.run, time.sleep, 0.1)
+            await anyio.sleep(0.01)
+            assert executor.saturated
+            with pytest.raises(DatabaseBusyError):
+                await executor.run(time.sleep, 0)
+            # Callers that opt in to waiting are still accepted
+            await executor.run(time.sleep, 0, wait=True)
+
+    anyio.run(main)
+
+
+def test_waiting_for_a_connection_does_not_hold_a_worker(tmp_path) -> None:
+    """Requests waiting on the pool should leave the workers to its holder."""
+    pool = ConnectionPool(tmp_path / "test.db", size=1, timeout=5)
+
+    async def request() -> None:
+        conn = await executor.wait_for(pool.acquire)
+        try:
+            await anyio.sleep(0.01)
+            await executor.run(conn.execute, "SELECT 1")
+        finally:
+            pool.release(conn)
+
+    async def main() -> None:
+        async with anyio.create_task_group() as tg:
+            for _ in range(5):
+                tg.start_soon(request)
+
+    executor = DatabaseExecutor(max_workers=2, queue_depth=8)
+    start = time.monotonic()
+    anyio.run(main)
+    assert time.monotonic() - start < 1
+    pool.close()
+
+
+def test_executor_scales_with_reader_pool() -> None:
+    with (
+        patch.object(database_settings, "db_reader_pool_size", 12),
+        patch.object(database_settings, "job_workers", 2),
+    ):
+        assert executor_workers() == 14
+        with patch.object(database_settings, "db_executor_workers", 3):
+            assert executor_workers() == 3
@@ -0,0 +1,94 @@
+"""
+Unit tests for database_pkg.index_advisor module.
+"""
+
+import sqlite3
+from pathlib import Path
+
+from database_pkg.index_advisor import (
+    IndexAdvisor,
+    filter_columns,
+    full_scans,
+    index_terms,
+    list_indexes,
+)
+from database_pkg.schema import TRANSACTIONS_INDEXES, ensure_transactions_indexes
+
+
+def test_full_scans_ignore_index_lookups() -> None:
+    plan = [
+        "SCAN transactions",
+        "SCAN transactions USING COVERING INDEX transactions_currency",
+        "SEARCH t USING INDEX transactions_completed_date (Completed Date>?)",
+        "SEARCH u USING AUTOMATIC COVERING INDEX (QUI=?)",
+        "USE TEMP B-TREE FOR GROUP BY",
+    ]
+    assert full_scans(plan) == [plan[0], plan[3]]
+
+
+def test_filter_columns_in_clause_order() -> None:
+    query = (
+        'SELECT "Amount", Currency FROM transactions '
+        'WHERE qui = ? AND "Completed Date" >= ? ORDER BY "Amount"'
+    )
+    assert filter_columns(query) == ["QUI", "Completed Date", "Amount"]
+
+
+def test_advisor_reports_frequent_scans(transactions_db: Path) -> None:
+    conn = sqlite3.connect(transactions_db)
+    advisor = IndexAdvisor(max_queries=10)
+    scan = 'SELECT * FROM transactions WHERE "QUI" = ?'
+    lookup = "SELECT * FROM transactions WHERE rowid = ?"
+    for query in (scan, scan, 'SELECT *  FROM transactions\n WHERE "QUI" = ?', lookup):
+        if not advisor.record(query):
+            advisor.explain(conn, query, ["G"])
+    conn.close()
+
+    [report] = advisor.report()
+    assert report["query"] == scan
+    assert report["count"] == 3
+    assert report["scans"] == ["SCAN transactions"]
+    assert report["candidate_columns"] == ["QUI"]
+    assert advisor.report(min_count=4) == []
+    assert advisor.stats() == {"queries": 2, "with_scans": 1, "max_queries": 10}
+
+
+def test_advisor_keeps_most_recent_queries() -> None:
+    advisor = IndexAdvisor(max_queries=2)
+    for query in ("SELECT 1", "SELECT 2", "SELECT 1", "SELECT 3"):
+        advisor.record(query)
+    assert advisor.stats()["queries"] == 2
+    assert advisor.record("SELECT 1") is False
+    assert advisor.stats()["queries"] == 2
+
+
+def test_explain_errors_are_ignored(transactions_db: Path) -> None:
+    conn = sqlite3.connect(transactions_db)
+    advisor = IndexAdvisor(max_queries=10)
+    advisor.record("SELECT * FROM missing")
+    advisor.explain(conn, "SELECT * FROM missing", None)
+    conn.close()
+    assert advisor.report() == []
+
+
+def test_managed_indexes_are_created_once(transactions_db: Path) -> None:
+    conn = sqlite3.connect(transactions_db)
+    # This table predates the "Source" column, so its index is left out
+    created = ensure_transactions_indexes(conn)
+    assert set(created) == set(TRANSACTIONS_INDEXES) - {"transactions_source"}
+    assert ensure_transactions_indexes(conn) == []
+    indexes = {index["name"]: index["columns"] for index in list_indexes(conn)}
+    conn.close()
+    assert indexes["transactions_qui_completed_date"] == ["QUI", "Completed Date"]
+
+
+def test_index_terms_keep_expressions() -> None:
+    assert index_terms(
+        'CREATE INDEX "i" ON "t" ("a", datetime("b", \'unixepoch\') DESC, lower(c))'
+    ) == ['"a"', "datetime(\"b\", 'unixepoch')", "lower(c)"]
+
+
+def test_managed_indexes_need_a_table(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    assert ensure_transactions_indexes(conn) == []
+    conn.close()
@@ -0,0 +1,286 @@
+"""
+Unit tests for database_pkg.ingest module and the /ingest_file endpoint.
+"""
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+from openpyxl import Workbook
+
+from database_pkg.config.schemas import BankEnum, OwnerEnum
+from database_pkg.ingest import (
+    BANK_FORMATS,
+    ingest_statement,
+    parse_amount,
+    parse_date,
+    parse_statement,
+    parse_statement_file,
+    read_statement_rows,
+    replace_staged,
+    stage_rows,
+)
+
+REVOLUT_CSV = (
+    "Type,Product,Started Date,Completed Date,Description,Amount,Fee,Currency,State,Balance\n"
+    "CARD_PAYMENT,Current,2025-08-01 09:12:00,2025-08-02 10:00:00,Cafe,-3.50,0.00,EUR,COMPLETED,96.50\n"
+    "TOPUP,Current,2025-08-03 11:00:00,2025-08-03 11:00:05,Top-up,100.00,0.00,EUR,COMPLETED,196.50\n"
+)
+
+BNP_CSV = (
+    "Compte de cheques;****1234\n"
+    "\n"
+    "Date operation;Libelle court;Libelle operation;Montant operation\n"
+    "01/08/2025;CB;CARTE BOULANGERIE;-4,20\n"
+    "05/08/2025;VIR;VIREMENT SALAIRE;2 500,00\n"
+)
+
+BNC_CSV = (
+    "Date;Description;Categorie;Débit;Crédit;Solde\n"
+    "2025-08-01;EPICERIE;Alimentation;45.10;;954.90\n"
+    "2025-08-02;PAIE;Revenu;;1200.00;2154.90\n"
+)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("-12.5", -12.5),
+        ("2 500,00", 2500.0),
+        ("1.234,56", 1234.56),
+        ("1,234.56", 1234.56),
+        (7, 7.0),
+        ("", None),
+    ],
+)
+def test_parse_amount(value, expected) -> None:
+    assert parse_amount(value) == expected
+
+
+def test_parse_date() -> None:
+    assert parse_date("01/08/2025", ("%d/%m/%Y",)) == "2025-08-01 00:00:00"
+    assert parse_date(datetime(2025, 8, 1, 9, 30), ()) == "2025-08-01 09:30:00"
+    with pytest.raises(ValueError):
+        parse_date("August 1st", ("%d/%m/%Y",))
+
+
+def test_parse_revolut_csv(tmp_path: Path) -> None:
+    path = tmp_path / "N_Revolut.csv"
+    path.write_text(REVOLUT_CSV)
+    fmt = BANK_FORMATS[BankEnum.REVOLUT]
+
+    rows = list(parse_statement(read_statement_rows(path, fmt), fmt, "N", "src"))
+    assert rows[0] == (
+        "CARD_PAYMENT",
+        "Current",
+        "2025-08-01 09:12:00",
+        "2025-08-02 10:00:00",
+        "Cafe",
+        -3.5,
+        0.0,
+        "EUR",
+        "N",
+        None,
+        "src",
+    )
+    assert len(rows) == 2
+
+
+def test_parse_bnp_csv_skips_preamble(tmp_path: Path) -> None:
+    path = tmp_path / "G_BNP.csv"
+    path.write_bytes(BNP_CSV.encode("latin-1"))
+    fmt = BANK_FORMATS[BankEnum.BNP]
+
+    rows = list(parse_statement(read_statement_rows(path, fmt), fmt, "G", "src"))
+    assert [(r[3], r[4], r[5], r[7]) for r in rows] == [
+        ("2025-08-01 00:00:00", "CARTE BOULANGERIE", -4.2, "EUR"),
+        ("2025-08-05 00:00:00", "VIREMENT SALAIRE", 2500.0, "EUR"),
+    ]
+
+
+def test_parse_bnc_debit_credit_columns(tmp_path: Path) -> None:
+    path = tmp_path / "N_BNC.csv"
+    path.write_text(BNC_CSV)
+    fmt = BANK_FORMATS[BankEnum.BNC]
+
+    rows = list(parse_statement(read_statement_rows(path, fmt), fmt, "N", "src"))
+    assert [(r[0], r[5], r[7]) for r in rows] == [
+        ("DEBIT", -45.1, "CAD"),
+        ("CREDIT", 1200.0, "CAD"),
+    ]
+
+
+def test_ingest_xlsx_in_chunks_and_replace(tmp_path: Path) -> None:
+    path = tmp_path / "G_Revolut.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(
+        ["Type", "Product", "Started Date", "Completed Date", "Description"]
+        + ["Amount", "Fee", "Currency"]
+    )
+    for day in range(1, 11):
+        when = datetime(2025, 8, day, 12, 0)
+        sheet.append(
+            ["CARD_PAYMENT", "Current", when, when, f"Shop {day}", -1.0 * day, 0, "EUR"]
+        )
+    workbook.save(path)
+
+    conn = sqlite3.connect(tmp_path / "test.db")
+    result = ingest_statement(
+        conn, path, OwnerEnum.G, BankEnum.REVOLUT, "raw/2025/8/G_Revolut.xlsx", 3
+    )
+    assert result.rows_inserted == 10
+    assert result.rows_replaced == 0
+
+    result = ingest_statement(
+        conn, path, OwnerEnum.G, BankEnum.REVOLUT, "raw/2025/8/G_Revolut.xlsx", 3
+    )
+    assert result.rows_replaced == 10
+    count, total = conn.execute(
+        'SELECT COUNT(*), SUM("Amount") FROM transactions'
+    ).fetchone()
+    assert (count, total) == (10, -55.0)
+    conn.close()
+
+
+def test_parse_skips_text_footer(tmp_path: Path) -> None:
+    path = tmp_path / "G_BNP.csv"
+    path.write_bytes(
+        (BNP_CSV + "Total des operations;;;2 495,80\n;;;\n").encode("latin-1")
+    )
+    fmt = BANK_FORMATS[BankEnum.BNP]
+
+    rows = list(parse_statement(read_statement_rows(path, fmt), fmt, "G", "src"))
+    assert [r[4] for r in rows] == ["CARTE BOULANGERIE", "VIREMENT SALAIRE"]
+
+
+def test_reingest_keeps_edited_owner_and_comment(tmp_path: Path) -> None:
+    path = tmp_path / "N_Revolut.csv"
+    path.write_text(REVOLUT_CSV)
+    conn = sqlite3.connect(tmp_path / "test.db")
+    ingest_statement(conn, path, OwnerEnum.N, BankEnum.REVOLUT, "src", 10)
+    conn.execute(
+        'UPDATE "transactions" SET "QUI" = \'G\', "COMMENT" = \'shared\' '
+        "WHERE \"Description\" = 'Cafe'"
+    )
+    conn.commit()
+
+    path.write_text(
+        REVOLUT_CSV
+        + "CARD_PAYMENT,Current,2025-08-04 09:00:00,2025-08-04 09:00:00,Cafe,-3.50,0.00,EUR,COMPLETED,193.00\n"
+    )
+    result = ingest_statement(conn, path, OwnerEnum.N, BankEnum.REVOLUT, "src", 10)
+    assert result.rows_replaced == 2
+    assert conn.execute(
+        'SELECT "Completed Date", "QUI", "COMMENT" FROM "transactions" '
+        'WHERE "Description" = \'Cafe\' ORDER BY "Completed Date"'
+    ).fetchall() == [
+        ("2025-08-02 10:00:00", "G", "shared"),
+        ("2025-08-04 09:00:00", "N", None),
+    ]
+    conn.close()
+
+
+def test_failed_ingest_leaves_table_untouched(tmp_path: Path) -> None:
+    path = tmp_path / "N_Revolut.csv"
+    header, first, second = REVOLUT_CSV.splitlines(keepends=True)
+    # A line whose date does not parse, followed by a dated one
+    path.write_text(
+        header + first + "CARD_PAYMENT,Current,bad,bad,Oops,-1,0,EUR,,\n" + second
+    )
+    conn = sqlite3.connect(tmp_path / "test.db")
+    with pytest.raises(ValueError):
+        ingest_statement(conn, path, OwnerEnum.N, BankEnum.REVOLUT, "src", 1)
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'transactions'"
+    ).fetchone()[0]
+    assert exists == 0
+    conn.close()
+
+
+def test_staged_rows_are_swapped_in_at_once(tmp_path: Path) -> None:
+    path = tmp_path / "N_Revolut.csv"
+    path.write_text(REVOLUT_CSV)
+    rows = parse_statement_file(path, OwnerEnum.N, BankEnum.REVOLUT, "src")
+    conn = sqlite3.connect(tmp_path / "test.db")
+    for row in rows:
+        assert stage_rows(conn, "staged", [row]) == 1
+        conn.commit()
+    exists = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_master WHERE name = 'transactions'"
+    ).fetchone()[0]
+    assert exists == 0
+
+    result = replace_staged(conn, "staged", "src", 1)
+    conn.commit()
+    assert (result.rows_inserted, result.rows_replaced) == (2, 0)
+    assert conn.execute('SELECT COUNT(*) FROM "transactions"').fetchone()[0] == 2
+    staged = conn.execute(
+        "SELECT COUNT(*) FROM sqlite_temp_master WHERE name = 'staged'"
+    ).fetchone()[0]
+    assert staged == 0
+    conn.close()
+
+
+def test_ingest_file_endpoint(db_client, tmp_path: Path) -> None:
+    statement_dir = tmp_path / "blob" / "raw" / "2025" / "8"
+    statement_dir.mkdir(parents=True)
+    (statement_dir / "N_Revolut.csv").write_text(REVOLUT_CSV)
+    body = {"owner": "N", "year": 2025, "month": 8, "bank": "Revolut"}
+    with patch("database_pkg.app.database_settings") as mock_settings:
+        mock_settings.blob_path = tmp_path / "blob"
+        mock_settings.ingest_chunk_size = 100
+        response = db_client.post("/ingest_file", json=body)
+        missing = db_client.post("/ingest_file", json={**body, "bank": "BNP"})
+    assert response.status_code == 200
+    assert response.json()["rows_inserted"] == 2
+    assert missing.status_code == 404
+    rows = db_client.post(
+        "/execute_sql",
+        json={
+            "query": 'SELECT "Description" FROM transactions WHERE "Source" = ?',
+            "params": ["raw/2025/8/N_Revolut.csv"],
+        },
+    ).json()["result"]
+    assert rows == [{"Description": "Cafe"}, {"Description": "Top-up"}]
+
+    # The catalog records the ingested content: a second call is a no-op
+    with patch("database_pkg.app.database_settings") as mock_settings:
+        mock_settings.blob_path = tmp_path / "blob"
+        mock_settings.ingest_chunk_size = 100
+        again = db_client.post("/ingest_file", json=body).json()
+        forced = db_client.post("/ingest_file", json={**body, "force": True}).json()
+    assert (again["skipped"], again["rows_inserted"]) == (True, 0)
+    assert (forced["skipped"], forced["rows_replaced"]) == (False, 2)
+
+
+def test_failed_ingest_file_drops_its_staged_rows(db_client, tmp_path: Path) -> None:
+    statement_dir = tmp_path / "blob" / "raw" / "2025" / "8"
+    statement_dir.mkdir(parents=True)
+    header, first, second = REVOLUT_CSV.splitlines(keepends=True)
+    (statement_dir / "N_Revolut.csv").write_text(
+        header + first + "CARD_PAYMENT,Current,bad,bad,Oops,-1,0,EUR,,\n" + second
+    )
+    body = {"owner": "N", "year": 2025, "month": 8, "bank": "Revolut"}
+    with patch("database_pkg.app.database_settings") as mock_settings:
+        mock_settings.blob_path = tmp_path / "blob"
+        mock_settings.ingest_chunk_size = 1
+        response = db_client.post("/ingest_file", json=body)
+    assert response.status_code == 400
+    writer = db_client.app.state.db_writer
+    # The first row was staged before the bad line was parsed
+    assert writer.stats()["writes"] == 2
+    staged = writer.connection.execute(
+        "SELECT COUNT(*) FROM sqlite_temp_master WHERE type = 'table'"
+    ).fetchone()[0]
+    assert staged == 0
+    rows = db_client.post(
+        "/execute_sql",
+        json={
+            "query": 'SELECT COUNT(*) AS n FROM transactions WHERE "Source" = ?',
+            "params": ["raw/2025/8/N_Revolut.csv"],
+        },
+    ).json()["result"]
+    assert rows == [{"n": 0}]
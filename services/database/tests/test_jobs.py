@@ -0,0 +1,108 @@
+"""
+Unit tests for database_pkg.jobs module.
+"""
+
+import sqlite3
+from pathlib import Path
+from unittest.mock import patch
+
+import anyio
+
+from database_pkg.executor import DatabaseExecutor
+from database_pkg.jobs import (
+    JobQueue,
+    claim_job,
+    enqueue_job,
+    get_job,
+    requeue_running,
+)
+from database_pkg.writer import DatabaseWriter
+
+
+def test_claim_oldest_queued_job(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path)
+    assert claim_job(conn) is None
+    first = enqueue_job(conn, "ingest", {"n": 1})
+    second = enqueue_job(conn, "ingest", {"n": 2})
+
+    assert claim_job(conn) == {"id": first, "kind": "ingest", "payload": {"n": 1}}
+    assert get_job(conn, first)["status"] == "running"
+    assert claim_job(conn)["id"] == second
+    assert claim_job(conn) is None
+
+    # Jobs interrupted by a restart are queued again
+    assert requeue_running(conn) == 2
+    assert get_job(conn, first)["status"] == "queued"
+    assert get_job(conn, 999) is None
+    conn.close()
+
+
+def test_queue_runs_jobs_with_progress(db_path: Path) -> None:
+    def count_rows(conn, payload, progress):
+        for _ in range(payload["rows"]):
+            progress.rows_parsed += 1
+            progress.rows_inserted += 1
+        return {"counted": payload["rows"]}
+
+    def fail(conn, payload, progress):
+        raise ValueError("bad statement")
+
+    async def main():
+        executor = DatabaseExecutor(max_workers=2, queue_depth=8)
+        queue = JobQueue(db_path, executor, workers=2)
+        queue.handlers.update(count=count_rows, fail=fail)
+        writer = DatabaseWriter(db_path, max_batch=10, queue_depth=10)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(queue.run)
+            ok = await queue.submit(writer, "count", {"rows": 3})
+            bad = await queue.submit(writer, "fail", {})
+            unknown = await queue.submit(writer, "nope", {})
+            with anyio.fail_after(5):
+                while True:
+                    jobs = [await queue.get(conn, i) for i in (ok, bad, unknown)]
+                    if all(j["status"] in ("done", "failed") for j in jobs):
+                        break
+                    await anyio.sleep(0.01)
+            tg.cancel_scope.cancel()
+        queue.close()
+        writer.close()
+        conn.close()
+        return jobs
+
+    ok, bad, unknown = anyio.run(main)
+    assert (ok["status"], ok["rows_parsed"], ok["rows_inserted"]) == ("done", 3, 3)
+    assert ok["result"] == {"counted": 3}
+    assert ok["duration_seconds"] >= 0
+    assert (bad["status"], bad["error"]) == ("failed", "bad statement")
+    assert unknown["error"] == "Unknown job kind: nope"
+
+
+def test_worker_retries_a_failed_claim(db_path: Path) -> None:
+    claims = []
+
+    def flaky_claim(conn):
+        claims.append(None)
+        if len(claims) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return claim_job(conn)
+
+    async def main():
+        executor = DatabaseExecutor(max_workers=1, queue_depth=8)
+        queue = JobQueue(db_path, executor, workers=1)
+        queue.handlers.update(noop=lambda conn, payload, progress: None)
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        job_id = enqueue_job(conn, "noop", {})
+        with patch("database_pkg.jobs.claim_job", flaky_claim):
+            async with anyio.create_task_group() as tg:
+                tg.start_soon(queue.run)
+                # No submit wakes the worker up: it must retry on its own
+                with anyio.fail_after(5):
+                    while (await queue.get(conn, job_id))["status"] != "done":
+                        await anyio.sleep(0.01)
+                tg.cancel_scope.cancel()
+        queue.close()
+        conn.close()
+
+    anyio.run(main)
+    assert len(claims) >= 2
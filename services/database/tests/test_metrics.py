@@ -0,0 +1,59 @@
+"""
+Unit tests for database_pkg.metrics module.
+"""
+
+import anyio
+import pytest
+
+from database_pkg.metrics import MetricsMiddleware, MetricsRegistry
+
+
+@pytest.fixture
+def registry() -> MetricsRegistry:
+    return MetricsRegistry()
+
+
+def test_counter_and_gauge(registry: MetricsRegistry) -> None:
+    rows = registry.counter("rows_total", "Rows.", ("route",))
+    rows.inc(3, "/a")
+    rows.inc(2, "/a")
+    rows.inc(1, 'say "hi"')
+    in_flight = registry.gauge("in_flight", "In flight.")
+    in_flight.inc()
+    in_flight.inc()
+    in_flight.dec()
+    assert registry.render().splitlines() == [
+        "# HELP rows_total Rows.",
+        "# TYPE rows_total counter",
+        'rows_total{route="/a"} 5',
+        'rows_total{route="say \\"hi\\""} 1',
+        "# HELP in_flight In flight.",
+        "# TYPE in_flight gauge",
+        "in_flight 1",
+    ]
+
+
+def test_histogram_buckets_are_cumulative(registry: MetricsRegistry) -> None:
+    latency = registry.histogram("latency_seconds", "Latency.", ("phase",))
+    for value in (0.0001, 0.003, 0.003, 100):
+        latency.observe(value, "execute")
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{phase="execute",le="0.0005"} 1' in lines
+    assert 'latency_seconds_bucket{phase="execute",le="0.0025"} 1' in lines
+    assert 'latency_seconds_bucket{phase="execute",le="0.005"} 3' in lines
+    assert 'latency_seconds_bucket{phase="execute",le="30"} 3' in lines
+    assert 'latency_seconds_bucket{phase="execute",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{phase="execute"} 4' in lines
+    [total] = [line for line in lines if line.startswith("latency_seconds_sum")]
+    assert float(total.split()[-1]) == pytest.approx(100.0061)
+    assert latency.count("execute") == 4
+
+
+def test_middleware_ignores_other_protocols() -> None:
+    calls = []
+
+    async def app(scope, receive, send) -> None:
+        calls.append(scope["type"])
+
+    anyio.run(MetricsMiddleware(app), {"type": "lifespan"}, None, None)
+    assert calls == ["lifespan"]
@@ -0,0 +1,384 @@
+"""
+Unit tests for database_pkg.partitions module and the partitioned schema's views and triggers.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from database_pkg.index_advisor import list_indexes
+from database_pkg.partitions import (
+    close_partition,
+    group_years,
+    reopen_partition,
+    split_by_year,
+)
+from database_pkg.pool import connect
+from database_pkg.result_cache import ResultCache
+from database_pkg.schema import ROWID_BLOCK, ensure_transactions_table, list_partitions
+from database_pkg.search import rebuild_search_index, search_transactions
+from database_pkg.summary import monthly_totals, rebuild_summary
+
+
+@pytest.fixture
+def years_db(transactions_db: Path) -> Path:
+    """`transactions_db` plus transactions of 2023 and 2024, and one undated."""
+    conn = sqlite3.connect(transactions_db)
+    ensure_transactions_table(conn)
+    conn.executemany(
+        'INSERT INTO "transactions" ("Completed Date", "Description", "Amount", '
+        "\"Currency\", \"QUI\") VALUES (?, ?, ?, 'EUR', 'G')",
+        [
+            ("2023-06-01 12:00:00", "Librairie", -12.0),
+            ("2023-07-01 12:00:00", "Merchant 2023", -3.0),
+            ("2024-03-01 12:00:00", "Merchant 2024", -4.0),
+            (None, "Undated", -1.0),
+        ],
+    )
+    conn.commit()
+    conn.close()
+    return transactions_db
+
+
+@pytest.fixture
+def split_db(years_db: Path) -> Path:
+    """`years_db` split by year, before `db_client` opens any connection."""
+    split_by_year(years_db)
+    return years_db
+
+
+def all_rows(conn: sqlite3.Connection) -> list[tuple]:
+    rows = conn.execute(
+        'SELECT "Completed Date", "Description", "Amount", "QUI" FROM "transactions"'
+    )
+    return sorted((tuple(row) for row in rows), key=str)
+
+
+def test_group_years() -> None:
+    assert group_years([2023, 2024, 2025], 5) == [
+        (2023, 2023),
+        (2024, 2024),
+        (2025, 2025),
+    ]
+    assert group_years([2020, 2021, 2022, 2023, 2024], 3) == [
+        (2020, 2022),
+        (2023, 2023),
+        (2024, 2024),
+    ]
+    assert group_years([2024], 0) == []
+
+
+def test_split_keeps_rows_and_totals(years_db: Path) -> None:
+    conn = connect(years_db)
+    before = all_rows(conn)
+    totals = monthly_totals(conn)
+    conn.close()
+
+    created = split_by_year(years_db)
+
+    assert [p.name for p in created] == ["default", "2023", "2024", "2025"]
+    assert all(p.path(years_db).exists() for p in created)
+    conn = connect(years_db)
+    try:
+        assert all_rows(conn) == before
+        assert monthly_totals(conn) == totals
+        assert [
+            row[0]
+            for row in conn.execute(
+                'SELECT "Description" FROM "partition_default"."transactions"'
+            )
+        ] == ["Undated"]
+        assert (
+            conn.execute(
+                'SELECT min("rowid") FROM "partition_2024"."transactions"'
+            ).fetchone()[0]
+            == 2024 * ROWID_BLOCK + 1
+        )
+    finally:
+        conn.close()
+    assert split_by_year(years_db) == []
+
+
+def test_writes_are_routed_to_their_year(years_db: Path) -> None:
+    split_by_year(years_db)
+    conn = connect(years_db)
+    try:
+        conn.execute(
+            'INSERT INTO "transactions" ("Completed Date", "Description", "Amount") '
+            "VALUES ('2024-05-01 09:00:00', 'Routed', -7.0)"
+        )
+        rowid = conn.execute(
+            'SELECT "rowid" FROM "partition_2024"."transactions" '
+            "WHERE \"Description\" = 'Routed'"
+        ).fetchone()[0]
+        assert rowid == 2024 * ROWID_BLOCK + 2
+
+        # A row changing year moves to that year's partition
+        conn.execute(
+            'UPDATE "transactions" SET "Completed Date" = \'2023-05-01 09:00:00\' '
+            "WHERE \"Description\" = 'Routed'"
+        )
+        assert (
+            conn.execute(
+                'SELECT count(*) FROM "partition_2023"."transactions" '
+                "WHERE \"Description\" = 'Routed'"
+            ).fetchone()[0]
+            == 1
+        )
+        assert (
+            conn.execute(
+                'SELECT count(*) FROM "transactions" WHERE "Description" = \'Routed\''
+            ).fetchone()[0]
+            == 1
+        )
+
+        # Years without a partition go to the default one
+        conn.execute(
+            'INSERT INTO "transactions" ("Completed Date", "Description") '
+            "VALUES ('2031-01-01 00:00:00', 'Later')"
+        )
+        assert (
+            conn.execute(
+                'SELECT count(*) FROM "partition_default"."transactions"'
+            ).fetchone()[0]
+            == 2
+        )
+
+        conn.execute('DELETE FROM "transactions" WHERE "Description" = \'Routed\'')
+        assert monthly_totals(conn, year=2023, month=5) == []
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_views_keep_the_shape_of_the_table(years_db: Path) -> None:
+    conn = connect(years_db)
+    columns = [c[0] for c in conn.execute('SELECT * FROM "transactions"').description]
+    conn.close()
+    split_by_year(years_db)
+
+    conn = connect(years_db)
+    try:
+        cursor = conn.execute('SELECT * FROM "transactions"')
+        assert [c[0] for c in cursor.description] == columns
+        row = ("CARD_PAYMENT", "Current", None, "2024-05-01 09:00:00", "Twice")
+        for _ in range(2):
+            conn.execute(
+                'INSERT INTO "transactions" VALUES (?, ?, ?, ?, ?, -2.5, 0, '
+                "'EUR', 'G', NULL, NULL)",
+                row,
+            )
+        rowids = [
+            row[0]
+            for row in conn.execute(
+                'SELECT "rowid" FROM "transaction_rows" '
+                "WHERE \"Description\" = 'Twice'"
+            )
+        ]
+        assert rowids == [2024 * ROWID_BLOCK + 2, 2024 * ROWID_BLOCK + 3]
+
+        # Rows are found by their values, in the partition of their year
+        conn.execute(
+            'UPDATE "transactions" SET "Completed Date" = \'2023-05-01 09:00:00\' '
+            "WHERE \"Description\" = 'Twice'"
+        )
+        assert (
+            conn.execute(
+                'SELECT count(*) FROM "partition_2023"."transactions" '
+                "WHERE \"Description\" = 'Twice'"
+            ).fetchone()[0]
+            == 2
+        )
+        conn.execute(
+            'DELETE FROM "transaction_rows" WHERE "rowid" = '
+            '(SELECT max("rowid") FROM "transaction_rows" '
+            "WHERE \"Description\" = 'Twice')"
+        )
+        conn.execute('DELETE FROM "transactions" WHERE "Description" = \'Twice\'')
+        assert conn.execute('SELECT count(*) FROM "transactions"').fetchone()[0] == 29
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_date_queries_use_each_partition_index(years_db: Path) -> None:
+    split_by_year(years_db)
+    conn = connect(years_db)
+    try:
+        plan = [
+            row[3]
+            for row in conn.execute(
+                'EXPLAIN QUERY PLAN SELECT * FROM "transactions" '
+                'WHERE "Completed Date" >= ?',
+                ("2025-01-10",),
+            )
+        ]
+    finally:
+        conn.close()
+    assert all("SCAN" not in step for step in plan if "transactions" in step)
+    assert sum("INDEX" in step for step in plan) == 4
+
+
+def test_indexes_are_listed_for_each_partition(years_db: Path) -> None:
+    split_by_year(years_db)
+    conn = connect(years_db)
+    try:
+        indexes = list_indexes(conn)
+    finally:
+        conn.close()
+    assert {index["schema"] for index in indexes} == {
+        "partition_default",
+        "partition_2023",
+        "partition_2024",
+        "partition_2025",
+    }
+    assert {
+        "schema": "partition_2024",
+        "name": "transactions_completed_date",
+        "columns": ["Completed Date"],
+    } in indexes
+
+
+def test_closed_partitions_refuse_writes(years_db: Path) -> None:
+    split_by_year(years_db)
+    close_partition(years_db, 2023)
+
+    conn = connect(years_db)
+    try:
+        assert [p.name for p in list_partitions(conn) if p.closed] == ["2023"]
+        assert (
+            conn.execute(
+                'SELECT count(*) FROM "transactions" WHERE "Completed Date" < \'2024-01-01\''
+            ).fetchone()[0]
+            == 2
+        )
+        with pytest.raises(sqlite3.IntegrityError, match="2023 is closed"):
+            conn.execute(
+                'INSERT INTO "transactions" ("Completed Date") '
+                "VALUES ('2023-01-01 00:00:00')"
+            )
+        conn.rollback()
+    finally:
+        conn.close()
+
+    reopen_partition(years_db, 2023)
+    conn = connect(years_db)
+    try:
+        conn.execute(
+            'INSERT INTO "transactions" ("Completed Date") '
+            "VALUES ('2023-01-01 00:00:00')"
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def test_later_split_moves_new_years_out_of_the_default(years_db: Path) -> None:
+    split_by_year(years_db)
+    conn = connect(years_db)
+    conn.execute(
+        'INSERT INTO "transactions" ("Completed Date", "Description", "Amount", '
+        "\"Currency\", \"QUI\") VALUES ('2026-02-01 12:00:00', 'Merchant 2026', "
+        "-5.0, 'EUR', 'G')"
+    )
+    conn.commit()
+    before = all_rows(conn)
+    conn.close()
+
+    assert [p.name for p in split_by_year(years_db)] == ["2026"]
+
+    conn = connect(years_db)
+    try:
+        assert all_rows(conn) == before
+        assert (
+            conn.execute(
+                'SELECT count(*) FROM "partition_default"."transactions"'
+            ).fetchone()[0]
+            == 1
+        )
+        assert monthly_totals(conn, year=2026)[0]["Amount"] == -5.0
+        assert [
+            r["Description"] for r in search_transactions(conn, "2026")["rows"]
+        ] == ["Merchant 2026"]
+    finally:
+        conn.close()
+
+
+def test_search_and_rebuilds_span_partitions(years_db: Path) -> None:
+    split_by_year(years_db)
+    conn = connect(years_db)
+    try:
+        found = search_transactions(conn, "merchant", limit=100)["rows"]
+        assert len(found) == 27
+        assert {r["id"] // ROWID_BLOCK for r in found} == {2023, 2024, 2025}
+        assert search_transactions(conn, "librairie")["rows"][0]["Amount"] == -12.0
+
+        assert rebuild_search_index(conn) == 29
+        # One row per month and owner: 2 in 2023, 1 in 2024, 2 in 2025, 1 undated
+        assert rebuild_summary(conn) == 6
+    finally:
+        conn.close()
+
+
+def test_cache_sees_writes_to_partitions(years_db: Path) -> None:
+    split_by_year(years_db)
+    cache = ResultCache(years_db, max_bytes=1024)
+    try:
+        version = cache.data_version()
+        conn = connect(years_db)
+        conn.execute(
+            'UPDATE "transactions" SET "COMMENT" = \'seen\' '
+            "WHERE \"Description\" = 'Merchant 2024'"
+        )
+        conn.commit()
+        conn.close()
+        assert cache.data_version() != version
+    finally:
+        cache.close()
+
+
+def test_execute_sql_writes_through_the_view(split_db: Path, db_client) -> None:
+    response = db_client.post(
+        "/execute_sql",
+        json={
+            "query": 'INSERT INTO "transactions" ("Completed Date", "Description") '
+            "VALUES (?, ?)",
+            "params": ["2024-05-01 09:00:00", "Routed"],
+        },
+    )
+    assert response.status_code == 200
+    assert response.json() == {"result": {"rows_affected": 1}}
+
+    response = db_client.post(
+        "/execute_sql",
+        json={
+            "query": 'UPDATE "transactions" SET "COMMENT" = ? '
+            'WHERE "Completed Date" >= ?',
+            "params": ["recent", "2024-01-01"],
+        },
+    )
+    assert response.json() == {"result": {"rows_affected": 27}}
+
+    response = db_client.post(
+        "/execute_batch",
+        json={
+            "statements": [
+                {
+                    "query": 'DELETE FROM "transactions" WHERE "Description" = ?',
+                    "params": ["Routed"],
+                }
+            ]
+        },
+    )
+    assert response.json() == {"rowcounts": [1], "rows_affected": 1}
+
+    response = db_client.post(
+        "/execute_sql",
+        json={
+            "query": 'SELECT count(*) AS "n" FROM "transactions" WHERE "COMMENT" = ?',
+            "params": ["recent"],
+            "cache": False,
+        },
+    )
+    assert response.json() == {"result": [{"n": 26}]}
@@ -0,0 +1,91 @@
+"""
+Unit tests for database_pkg.pool module.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from database_pkg.pool import ConnectionPool, PoolClosedError, PoolTimeoutError
+
+
+def test_pragmas_applied(db_path: Path) -> None:
+    """Pooled connections should be opened in WAL mode with tuned PRAGMAs."""
+    pool = ConnectionPool(db_path, size=1, timeout=0.1)
+    with pool.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert conn.execute("PRAGMA temp_store").fetchone()[0] == 2
+        assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+    pool.close()
+
+
+def test_connections_are_reused(db_path: Path) -> None:
+    """Releasing a connection should make it available to the next caller."""
+    pool = ConnectionPool(db_path, size=2, timeout=0.1)
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        assert second is first
+    pool.close()
+
+
+def test_pool_is_bounded(db_path: Path) -> None:
+    """Acquiring beyond the pool size should time out."""
+    pool = ConnectionPool(db_path, size=1, timeout=0.05)
+    conn = pool.acquire()
+    with pytest.raises(PoolTimeoutError):
+        pool.acquire()
+    pool.release(conn)
+    pool.close()
+
+
+def test_release_rolls_back_open_transaction(db_path: Path) -> None:
+    """A connection returned mid-transaction should come back clean."""
+    pool = ConnectionPool(db_path, size=1, timeout=0.1)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+        conn.execute("INSERT INTO t VALUES (1)")
+        assert conn.in_transaction
+    with pool.connection() as conn:
+        assert not conn.in_transaction
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+    pool.close()
+
+
+def test_closed_pool_rejects_acquire(db_path: Path) -> None:
+    """A closed pool should refuse new checkouts."""
+    pool = ConnectionPool(db_path, size=1, timeout=0.1)
+    pool.close()
+    with pytest.raises(PoolClosedError):
+        pool.acquire()
+
+
+def test_statement_cache_stats(db_path: Path) -> None:
+    """Re-running the same statement text should count as a cache hit."""
+    pool = ConnectionPool(db_path, size=1, timeout=0.1)
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT ?", (1,))
+        cursor.execute("SELECT ?", (2,))
+        cursor.execute("SELECT ? + 1", (2,))
+    stats = pool.stats()["statement_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2
+    pool.close()
+
+
+def test_read_only_pool_refuses_writes(db_path: Path) -> None:
+    """Connections of a read-only pool should read but never write."""
+    writable = ConnectionPool(db_path, size=1, timeout=0.1)
+    with writable.connection() as conn:
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.commit()
+    pool = ConnectionPool(db_path, size=1, timeout=0.1, read_only=True)
+    with pool.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO t VALUES (1)")
+    pool.close()
+    writable.close()
@@ -0,0 +1,64 @@
+"""
+Unit tests for database_pkg.queries statement classification.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from database_pkg.config.schemas import SQLQuery
+from database_pkg.queries import StatementInfo, run_write, statement_info
+
+
+@pytest.fixture
+def conn(transactions_db: Path):
+    conn = sqlite3.connect(transactions_db, isolation_level=None)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        'SELECT * FROM "transactions"',
+        'SELECT DISTINCT "QUI" FROM "transactions" UNION SELECT \'X\'',
+        "WITH RECURSIVE n(i) AS (SELECT 1 UNION SELECT i + 1 FROM n WHERE i < 5) "
+        "SELECT * FROM n",
+        'PRAGMA table_info("transactions")',
+        "PRAGMA user_version",
+    ],
+)
+def test_read_only_statements(conn, query: str) -> None:
+    assert statement_info(conn, query) == StatementInfo(
+        read_only=True, transaction_control=False
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        'UPDATE "transactions" SET "QUI" = \'G\'',
+        'DELETE FROM "transactions" RETURNING "rowid"',
+        'WITH d AS (SELECT 1) DELETE FROM "transactions" WHERE rowid IN d',
+        "CREATE TABLE t (x)",
+        "PRAGMA user_version = 3",
+        "PRAGMA foreign_keys = on",
+        "VACUUM",
+    ],
+)
+def test_writes(conn, query: str) -> None:
+    assert statement_info(conn, query) == StatementInfo(
+        read_only=False, transaction_control=False
+    )
+
+
+@pytest.mark.parametrize("query", ["BEGIN", "COMMIT", "SAVEPOINT s", "RELEASE s"])
+def test_transaction_control(conn, query: str) -> None:
+    assert statement_info(conn, query).transaction_control
+
+
+def test_run_write_rejects_transaction_control(conn) -> None:
+    with pytest.raises(ValueError):
+        run_write(conn, SQLQuery(query="COMMIT"))
+    assert not conn.in_transaction
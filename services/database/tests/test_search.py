@@ -0,0 +1,109 @@
+"""
+Unit tests for database_pkg.search module and the full-text index triggers.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from database_pkg.schema import ensure_search_index
+from database_pkg.search import (
+    match_expression,
+    rebuild_search_index,
+    search_transactions,
+)
+
+
+@pytest.fixture
+def conn(transactions_db: Path):
+    conn = sqlite3.connect(transactions_db, isolation_level=None)
+    conn.executemany(
+        'INSERT INTO "transactions" ("Description", "COMMENT", "Completed Date", '
+        '"QUI") VALUES (?, ?, ?, ?)',
+        [
+            ("Café de Flore", None, "2025-02-01 09:00:00", "G"),
+            ("CARREFOUR CITY", "courses de la semaine", "2025-02-02 18:00:00", "N"),
+            ("Uber Eats", None, "2025-02-03 20:00:00", "G"),
+            ("Uber", "taxi pour le café", "2025-03-04 08:00:00", "G"),
+        ],
+    )
+    assert ensure_search_index(conn) is True
+    yield conn
+    conn.close()
+
+
+def descriptions(result: dict) -> list[str]:
+    return [row["Description"] for row in result["rows"]]
+
+
+def test_match_expression_quotes_words() -> None:
+    assert match_expression("  mc \"donald's ") == '"mc" """donald\'s"*'
+    with pytest.raises(ValueError):
+        match_expression("   ")
+
+
+def test_search_ignores_case_and_accents(conn) -> None:
+    assert sorted(descriptions(search_transactions(conn, "CAFE"))) == [
+        "Café de Flore",
+        "Uber",
+    ]
+    assert descriptions(search_transactions(conn, "carref")) == ["CARREFOUR CITY"]
+    assert descriptions(search_transactions(conn, "semaine")) == ["CARREFOUR CITY"]
+    assert search_transactions(conn, "merch")["rows"][0]["id"] > 0
+
+
+def test_search_filters(conn) -> None:
+    assert descriptions(search_transactions(conn, "uber", date_to="2025-02-03")) == [
+        "Uber Eats"
+    ]
+    assert descriptions(
+        search_transactions(conn, "uber", date_from="2025-03-01", owner="G")
+    ) == ["Uber"]
+    assert search_transactions(conn, "uber", owner="N")["rows"] == []
+    assert descriptions(search_transactions(conn, "uber NOT eats", raw=True)) == [
+        "Uber"
+    ]
+
+
+def test_search_pages(conn) -> None:
+    first = search_transactions(conn, "merchant", limit=10)
+    assert len(first["rows"]) == 10
+    assert first["next_offset"] == 10
+    last = search_transactions(conn, "merchant", limit=10, offset=20)
+    assert len(last["rows"]) == 5
+    assert last["next_offset"] is None
+    scores = [row["score"] for row in first["rows"]]
+    assert scores == sorted(scores)
+
+
+def test_triggers_follow_writes(conn) -> None:
+    conn.execute(
+        'UPDATE "transactions" SET "Description" = \'Monoprix\' '
+        "WHERE \"Description\" = 'CARREFOUR CITY'"
+    )
+    conn.execute('DELETE FROM "transactions" WHERE "Description" = \'Uber Eats\'')
+    assert search_transactions(conn, "carrefour")["rows"] == []
+    assert descriptions(search_transactions(conn, "monoprix")) == ["Monoprix"]
+    assert descriptions(search_transactions(conn, "eats")) == []
+    conn.execute(
+        'INSERT INTO "transactions_fts" ("transactions_fts") VALUES (\'integrity-check\')'
+    )
+
+
+def test_missing_trigger_triggers_a_rebuild(conn) -> None:
+    conn.execute('DROP TRIGGER "transactions_fts_insert"')
+    conn.execute('INSERT INTO "transactions" ("Description") VALUES (\'Picard\')')
+    assert search_transactions(conn, "picard")["rows"] == []
+    assert ensure_search_index(conn) is True
+    assert descriptions(search_transactions(conn, "picard")) == ["Picard"]
+    assert rebuild_search_index(conn) == 30
+
+
+def test_search_requires_the_index(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    with pytest.raises(ValueError):
+        search_transactions(conn, "uber")
+    with pytest.raises(ValueError):
+        rebuild_search_index(conn)
+    conn.close()
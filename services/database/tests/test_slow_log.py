@@ -0,0 +1,69 @@
+"""
+Unit tests for database_pkg.slow_log module.
+"""
+
+import json
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from database_pkg.slow_log import SlowQueryLog, percentile
+
+
+@pytest.fixture
+def conn(transactions_db: Path):
+    conn = sqlite3.connect(transactions_db)
+    yield conn
+    conn.close()
+
+
+def test_percentile() -> None:
+    values = [float(v) for v in range(1, 101)]
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile(values, 100) == 100
+    assert percentile([3.0], 95) == 3
+
+
+def test_record_explains_and_appends(conn, tmp_path: Path) -> None:
+    path = tmp_path / "slow.jsonl"
+    log = SlowQueryLog(threshold=0.5, max_entries=10, path=path)
+    assert not log.is_slow(0.1)
+    assert log.is_slow(0.5)
+    entry = log.record(
+        conn,
+        'SELECT *  FROM transactions WHERE "Description" LIKE ?;',
+        ["%1%"],
+        0.75,
+        12,
+    )
+    assert entry.query == 'SELECT * FROM transactions WHERE "Description" LIKE ?'
+    assert entry.plan == ["SCAN transactions"]
+    [line] = path.read_text().splitlines()
+    assert json.loads(line)["params"] == ["%1%"]
+    assert json.loads(line)["rows"] == 12
+
+
+def test_report_groups_by_fingerprint(conn) -> None:
+    log = SlowQueryLog(threshold=0.5, max_entries=3)
+    query = "SELECT * FROM transactions WHERE \"QUI\" = '{}'"
+    log.record(conn, query.format("G"), None, 1.0, 13)
+    log.record(conn, query.format("N"), None, 3.0, 12)
+    log.record(conn, "SELECT count(*) FROM transactions", None, 0.5, 1)
+    # The ring buffer drops the oldest entry
+    log.record(conn, query.format("X"), None, 2.0, 0)
+    first, second = log.report()
+    assert first["query"] == 'select * from transactions where "QUI" = ?'
+    assert first["count"] == 2
+    assert first["p50"] == 2.0
+    assert first["max"] == 3.0
+    assert first["total"] == 5.0
+    assert first["latest"]["query"].endswith("'X'")
+    assert second["count"] == 1
+    assert [e.rows for e in log.entries()] == [0, 1, 12]
+
+
+def test_unexplainable_query_is_still_logged(conn) -> None:
+    log = SlowQueryLog(threshold=0.5, max_entries=10)
+    assert log.record(conn, "SELECT * FROM missing", None, 1.0, None).plan == []
@@ -0,0 +1,43 @@
+"""
+Unit tests for database_pkg.sql_text module.
+"""
+
+from database_pkg.sql_text import fingerprint_id, fingerprint_sql, normalize_sql
+
+
+def test_whitespace_and_comments_are_collapsed() -> None:
+    query = """
+        SELECT  *   -- every column
+        FROM transactions /* all rows */
+        WHERE "QUI" = 'G' ;
+    """
+    assert normalize_sql(query) == "SELECT * FROM transactions WHERE \"QUI\" = 'G'"
+
+
+def test_quoted_text_is_preserved() -> None:
+    query = "SELECT 'a  --  b', \"Completed  Date\" FROM t WHERE x = 'it''s  here'"
+    assert normalize_sql(query) == query
+
+
+def test_fingerprint_replaces_literals() -> None:
+    first = fingerprint_sql(
+        "SELECT * FROM Transactions WHERE \"QUI\" = 'G' AND amount > -12.5 "
+        "AND rowid IN (1, 2, 3) LIMIT 10;"
+    )
+    second = fingerprint_sql(
+        "select *  from transactions where \"QUI\" = 'N' and AMOUNT > -3 "
+        "and ROWID in (4) limit 0x10"
+    )
+    assert first == second
+    assert first == (
+        'select * from transactions where "QUI" = ? and amount > -? '
+        "and rowid in (?) limit ?"
+    )
+    assert fingerprint_id(first) == fingerprint_id(second)
+
+
+def test_fingerprint_keeps_placeholders_and_names() -> None:
+    query = 'SELECT "Amount 2", t1.x FROM t1 WHERE y = ?1 AND z = :v2 AND w IN (?, ?)'
+    assert fingerprint_sql(query) == (
+        'select "Amount 2", t1.x from t1 where y = ?1 and z = :v2 and w in (?)'
+    )
@@ -0,0 +1,103 @@
+"""
+Unit tests for database_pkg.summary module and the monthly summary triggers.
+"""
+
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from database_pkg.schema import ensure_monthly_summary
+from database_pkg.summary import monthly_totals, rebuild_summary
+
+
+@pytest.fixture
+def conn(transactions_db: Path):
+    conn = sqlite3.connect(transactions_db, isolation_level=None)
+    assert ensure_monthly_summary(conn) is True
+    yield conn
+    conn.close()
+
+
+def summary_rows(conn: sqlite3.Connection) -> list[tuple]:
+    return conn.execute(
+        'SELECT * FROM "monthly_summary" ORDER BY 1, 2, 3, 4, 5'
+    ).fetchall()
+
+
+def test_summary_is_built_from_existing_rows(conn) -> None:
+    assert monthly_totals(conn) == [
+        {
+            "year": 2025,
+            "month": 1,
+            "QUI": "G",
+            "Currency": "EUR",
+            "Type": "CARD_PAYMENT",
+            "count": 13,
+            "Amount": -float(sum(range(1, 26, 2))),
+            "Fee": 0.0,
+        },
+        {
+            "year": 2025,
+            "month": 1,
+            "QUI": "N",
+            "Currency": "EUR",
+            "Type": "CARD_PAYMENT",
+            "count": 12,
+            "Amount": -float(sum(range(2, 26, 2))),
+            "Fee": 0.0,
+        },
+    ]
+    assert ensure_monthly_summary(conn) is False
+
+
+def test_triggers_follow_writes(conn) -> None:
+    conn.executemany(
+        'INSERT INTO "transactions" ("Type", "Completed Date", "Amount", "Fee", '
+        '"Currency", "QUI") VALUES (?, ?, ?, ?, ?, ?)',
+        [
+            ("TOPUP", "2025-02-01 09:00:00", 100.0, 1.0, "EUR", "G"),
+            ("TOPUP", "2025-02-03 09:00:00", 50.0, None, "EUR", "G"),
+            ("TOPUP", None, 5.0, 0.0, None, None),
+        ],
+    )
+    conn.execute(
+        'UPDATE "transactions" SET "QUI" = \'N\', "Amount" = -2.0 '
+        "WHERE \"Description\" = 'Merchant 1'"
+    )
+    conn.execute('DELETE FROM "transactions" WHERE "Description" = \'Merchant 3\'')
+    conn.execute('DELETE FROM "transactions" WHERE "Completed Date" IS NULL')
+    maintained = summary_rows(conn)
+
+    rebuild_summary(conn)
+    assert maintained == summary_rows(conn)
+    [february] = monthly_totals(conn, month=2)
+    assert (february["count"], february["Amount"], february["Fee"]) == (2, 150.0, 1.0)
+    assert monthly_totals(conn, year=0) == []
+
+
+def test_totals_across_types(conn) -> None:
+    conn.execute(
+        'INSERT INTO "transactions" ("Type", "Completed Date", "Amount", "Fee", '
+        "\"Currency\", \"QUI\") VALUES ('TOPUP', '2025-01-31', 500.0, 0.0, 'EUR', 'G')"
+    )
+    assert len(monthly_totals(conn, owner="G")) == 2
+    [total] = monthly_totals(conn, owner="G", by_type=False)
+    assert "Type" not in total
+    assert total["count"] == 14
+    assert total["Amount"] == 500.0 - sum(range(1, 26, 2))
+
+
+def test_missing_trigger_triggers_a_rebuild(conn) -> None:
+    conn.execute('DROP TRIGGER "monthly_summary_delete"')
+    conn.execute('DELETE FROM "transactions" WHERE "QUI" = \'N\'')
+    assert ensure_monthly_summary(conn) is True
+    assert [row["QUI"] for row in monthly_totals(conn)] == ["G"]
+
+
+def test_rebuild_requires_transactions(db_path: Path) -> None:
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    with pytest.raises(ValueError):
+        rebuild_summary(conn)
+    assert monthly_totals(conn) == []
+    conn.close()
@@ -0,0 +1,71 @@
+"""
+Unit tests for database_pkg.uploads module.
+"""
+
+import hashlib
+import io
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from database_pkg.config.settings import database_settings
+from database_pkg.uploads import (
+    UploadTooLargeError,
+    commit_upload,
+    discard_upload,
+    stage_upload,
+)
+
+
+class FailingReader(io.BytesIO):
+    """Simulates a client disconnecting halfway through an upload."""
+
+    def read(self, size: int = -1) -> bytes:
+        if self.tell() >= 4:
+            raise ConnectionError("client went away")
+        return super().read(size)
+
+
+@pytest.fixture(autouse=True)
+def small_chunks():
+    with patch.object(database_settings, "upload_chunk_size", 4):
+        yield
+
+
+def test_stage_and_commit_upload(tmp_path: Path) -> None:
+    content = b"%PDF-1.4 statement"
+    dest = tmp_path / "G_BNP.pdf"
+    dest.write_bytes(b"old")
+    staged = stage_upload(io.BytesIO(content), tmp_path)
+    assert staged.size == len(content)
+    assert staged.sha256 == hashlib.sha256(content).hexdigest()
+    assert staged.temp_path.parent == tmp_path
+    assert dest.read_bytes() == b"old"
+
+    commit_upload(staged, dest)
+    assert dest.read_bytes() == content
+    assert [p.name for p in tmp_path.iterdir()] == ["G_BNP.pdf"]
+
+
+def test_stage_upload_too_large(tmp_path: Path) -> None:
+    with patch.object(database_settings, "upload_max_bytes", 10):
+        with pytest.raises(UploadTooLargeError):
+            stage_upload(io.BytesIO(b"x" * 11), tmp_path)
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_upload_leaves_existing_file(tmp_path: Path) -> None:
+    dest = tmp_path / "G_BNP.pdf"
+    dest.write_bytes(b"old")
+    with pytest.raises(ConnectionError):
+        stage_upload(FailingReader(b"new content"), tmp_path)
+    assert [p.name for p in tmp_path.iterdir()] == ["G_BNP.pdf"]
+    assert dest.read_bytes() == b"old"
+
+
+def test_discard_upload(tmp_path: Path) -> None:
+    staged = stage_upload(io.BytesIO(b"abc"), tmp_path)
+    discard_upload(staged)
+    discard_upload(staged)
+    assert list(tmp_path.iterdir()) == []
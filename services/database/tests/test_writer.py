@@ -0,0 +1,197 @@
+"""
+Unit tests for database_pkg.writer module.
+"""
+
+import sqlite3
+import threading
+from pathlib import Path
+
+import anyio
+import pytest
+
+from database_pkg.executor import DatabaseBusyError
+from database_pkg.writer import DatabaseWriter, WriterClosedError
+
+
+def insert(conn: sqlite3.Connection, x: int) -> int:
+    return conn.execute("INSERT INTO t VALUES (?)", (x,)).rowcount
+
+
+def count(db_path: Path) -> int:
+    conn = sqlite3.connect(db_path)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM t").fetchone()[0]
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def writer(db_path: Path):
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE t (x INTEGER PRIMARY KEY)")
+    conn.close()
+    writer = DatabaseWriter(db_path, max_batch=100, queue_depth=100)
+    yield writer
+    writer.close()
+
+
+def test_writes_are_committed(writer: DatabaseWriter, db_path: Path) -> None:
+    """A write's result should come back once it is visible to others."""
+    assert anyio.run(writer.run, insert, 1) == 1
+    assert count(db_path) == 1
+    assert writer.stats()["commits"] == 1
+
+
+def test_queued_writes_share_a_commit(writer: DatabaseWriter, db_path: Path) -> None:
+    """Writes queued while one is being applied should be committed together."""
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(conn: sqlite3.Connection) -> None:
+        started.set()
+        release.wait()
+
+    async def main() -> None:
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(writer.run, blocking)
+            await anyio.to_thread.run_sync(started.wait)
+            for x in range(10):
+                tg.start_soon(writer.run, insert, x)
+            await anyio.sleep(0.05)
+            release.set()
+
+    anyio.run(main)
+    assert count(db_path) == 10
+    stats = writer.stats()
+    assert stats["commits"] == 2
+    assert stats["writes"] == 11
+    assert stats["writes_per_commit"] == pytest.approx(5.5)
+
+
+def test_write_alone_runs_between_batches(
+    writer: DatabaseWriter, db_path: Path
+) -> None:
+    """A write run alone should see the writes queued before it committed."""
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(conn: sqlite3.Connection) -> None:
+        started.set()
+        release.wait()
+
+    def maintenance(conn: sqlite3.Connection) -> tuple[bool, int]:
+        in_transaction = conn.in_transaction
+        conn.execute("BEGIN IMMEDIATE")
+        insert(conn, 100)
+        conn.commit()
+        return in_transaction, count(db_path)
+
+    async def main() -> tuple[bool, int]:
+        results = {}
+
+        async def alone() -> None:
+            results["alone"] = await writer.run_alone(maintenance)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(writer.run, blocking)
+            await anyio.to_thread.run_sync(started.wait)
+            for x in range(2):
+                tg.start_soon(writer.run, insert, x)
+            await anyio.sleep(0.01)
+            tg.start_soon(alone)
+            await anyio.sleep(0.01)
+            tg.start_soon(writer.run, insert, 2)
+            await anyio.sleep(0.05)
+            release.set()
+        return results["alone"]
+
+    assert anyio.run(main) == (False, 3)
+    assert count(db_path) == 4
+    assert (writer.stats()["commits"], writer.stats()["writes"]) == (3, 4)
+
+
+def test_failed_write_is_rolled_back_alone(
+    writer: DatabaseWriter, db_path: Path
+) -> None:
+    """A failing write should not take the writes batched with it down."""
+
+    def insert_twice(conn: sqlite3.Connection) -> None:
+        insert(conn, 7)
+        insert(conn, 7)
+
+    async def main() -> list:
+        results = []
+
+        async def run(fn, *args) -> None:
+            try:
+                results.append(await writer.run(fn, *args))
+            except sqlite3.IntegrityError as e:
+                results.append(e)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(run, insert, 1)
+            tg.start_soon(run, insert_twice)
+            tg.start_soon(run, insert, 2)
+        return results
+
+    results = anyio.run(main)
+    assert sum(isinstance(r, sqlite3.IntegrityError) for r in results) == 1
+    assert count(db_path) == 2
+
+
+def test_interrupted_write_keeps_the_others(
+    writer: DatabaseWriter, db_path: Path
+) -> None:
+    """An interrupted write rolls its transaction back: the others are redone."""
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(conn: sqlite3.Connection) -> int:
+        started.set()
+        release.wait()
+        return insert(conn, 1)
+
+    def interrupted(conn: sqlite3.Connection) -> None:
+        conn.set_progress_handler(lambda: 1, 1)
+        try:
+            insert(conn, 99)
+        finally:
+            conn.set_progress_handler(None, 0)
+
+    async def main() -> list:
+        results = []
+
+        async def run(fn, *args) -> None:
+            try:
+                results.append(await writer.run(fn, *args))
+            except sqlite3.OperationalError as e:
+                results.append(e)
+
+        async with anyio.create_task_group() as tg:
+            tg.start_soon(run, blocking)
+            await anyio.to_thread.run_sync(started.wait)
+            tg.start_soon(run, insert, 2)
+            await anyio.sleep(0.01)
+            tg.start_soon(run, interrupted)
+            await anyio.sleep(0.05)
+            release.set()
+        return results
+
+    results = anyio.run(main)
+    assert sum(isinstance(r, sqlite3.OperationalError) for r in results) == 1
+    assert count(db_path) == 2
+    assert writer.stats()["writes"] == 2
+
+
+def test_full_queue_is_busy(db_path: Path) -> None:
+    """Writes beyond the queue depth should be refused right away."""
+    writer = DatabaseWriter(db_path, max_batch=1, queue_depth=0)
+    with pytest.raises(DatabaseBusyError):
+        anyio.run(writer.run, insert, 1)
+    writer.close()
+
+
+def test_closed_writer_rejects_writes(writer: DatabaseWriter) -> None:
+    """A closed writer should refuse new writes and drop its connection."""
+    anyio.run(writer.run, insert, 1)
+    writer.close()
+    assert writer.connection is None
+    with pytest.raises(WriterClosedError):
+        anyio.run(writer.run, insert, 2)